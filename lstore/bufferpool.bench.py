@@ -0,0 +1,256 @@
+import tempfile
+import threading
+from time import perf_counter
+from random import randrange
+
+from config import *
+from diskmanager import DiskManager
+from pagerange import PageRange
+from table import Table
+from replacement import POLICIES
+from db import Database
+from query import Query
+
+### Bufferpool micro benchmarks ###
+# Run from the lstore folder: python bufferpool.bench.py
+# Builds page ranges directly in memory so no records have to be inserted
+
+POOL_SIZES = [200, 1000, 5000, 20000, 50000]
+NUM_GETS = 100000
+
+### Makes a table with enough resident base pages to fill a pool ###
+# :param num_pages:     #Number of pages to create
+# :param folder:        #Folder for the diskmanager
+# :param policy:        #Replacement policy name, see replacement.py
+def make_table(num_pages, folder, policy=None):
+    disk = DiskManager(folder, policy)
+    disk.make_table_folder('Bench')
+    table = Table('Bench', 5, 0, disk)
+
+    num_ranges = -(-num_pages // PAGE_RANGE_MAX_BASE_PAGES)
+    for _ in range(num_ranges):
+        page_range = PageRange()
+        while page_range.has_open_base_pages():
+            page_range.create_base_page()
+        table.page_ranges.append(page_range)
+
+    return table
+
+### Times get_page for a pool that holds every page ###
+# :param pool_size:     #Pool size and number of pages touched
+def bench_get_page(pool_size, folder):
+    table = make_table(pool_size, folder)
+    bp = table.bp.pool
+    bp.max_bytes = pool_size * PAGE_SIZE
+
+    pids = [(0, i % PAGE_RANGE_MAX_BASE_PAGES, i // PAGE_RANGE_MAX_BASE_PAGES) for i in range(pool_size)]
+
+    # Warm up so every page is in the pool
+    for pid in pids:
+        bp.get_page(table, pid)
+
+    picks = [pids[randrange(pool_size)] for _ in range(NUM_GETS)]
+
+    start = perf_counter()
+    for pid in picks:
+        bp.get_page(table, pid)
+    elapsed = perf_counter() - start
+
+    return elapsed / NUM_GETS
+
+### Hit ratio of a point lookup working set mixed with big scans ###
+# :param policy:        #Replacement policy name, see replacement.py
+# :brief    :           #A hot set of half the pool gets point reads, every 50 reads
+#                       #A scan walks 50 pages of a cold area four times the size of the pool
+def bench_policy(policy, folder, pool_size=200, num_reads=20000):
+    num_pages = pool_size * 5
+    table = make_table(num_pages, folder, policy)
+    bp = table.bp.pool
+    bp.max_bytes = pool_size * PAGE_SIZE
+
+    def pid(i):
+        return (0, i % PAGE_RANGE_MAX_BASE_PAGES, i // PAGE_RANGE_MAX_BASE_PAGES)
+
+    hot = pool_size // 2
+    scan_at = hot
+    for i in range(num_reads):
+        bp.get_page(table, pid(randrange(hot)))
+
+        if i % 50 == 0:
+            for _ in range(50):
+                bp.get_page(table, pid(scan_at))
+                scan_at = scan_at + 1 if scan_at + 1 < num_pages else hot
+
+    return bp.stats()
+
+### Point read latency while a bulk scan runs ###
+# :param ring_pages:    #Frames of the scan's ring, 0 sends the scan through the pool
+# :brief    :           #Same hot set and scan as bench_policy, the scan is in bulk access mode
+# :returns tuple:       #(hit ratio of the hot reads, p99 of hot get_page in seconds)
+def bench_bulk_scan(folder, ring_pages, pool_size=200, num_reads=20000):
+    num_pages = pool_size * 5
+    table = make_table(num_pages, folder)
+    bp = table.bp.pool
+    bp.max_bytes = pool_size * PAGE_SIZE
+
+    def pid(i):
+        return (0, i % PAGE_RANGE_MAX_BASE_PAGES, i // PAGE_RANGE_MAX_BASE_PAGES)
+
+    hot = pool_size // 2
+    for i in range(hot):
+        bp.get_page(table, pid(i))
+
+    scan_at = hot
+    hot_hits = 0
+    times = []
+    for i in range(num_reads):
+        hot_pid = pid(randrange(hot))
+        hot_hits += table.page_ranges[hot_pid[2]].get_page(hot_pid[1]).is_loaded
+
+        start = perf_counter()
+        bp.get_page(table, hot_pid)
+        times.append(perf_counter() - start)
+
+        if i % 50 == 0:
+            with bp.bulk_access(ring_pages):
+                for _ in range(50):
+                    bp.get_page(table, pid(scan_at))
+                    scan_at = scan_at + 1 if scan_at + 1 < num_pages else hot
+
+    times.sort()
+    return hot_hits / num_reads, times[int(len(times) * 0.99)]
+
+### Point reads on resident pages from several threads ###
+# :param num_threads:   #Number of reading threads
+# :brief    :           #Each thread pins and unpins random pages of a pool that holds every page
+# :returns tuple:       #(get_page calls per second over all threads, stripe lock waits)
+def bench_threads(folder, num_threads, num_pages=2000, gets_per_thread=20000):
+    table = make_table(num_pages, folder)
+    bp = table.bp.pool
+    bp.max_bytes = num_pages * 2 * PAGE_SIZE
+
+    pids = [(0, i % PAGE_RANGE_MAX_BASE_PAGES, i // PAGE_RANGE_MAX_BASE_PAGES) for i in range(num_pages)]
+    for pid in pids:
+        bp.get_page(table, pid)
+
+    def reader():
+        for _ in range(gets_per_thread):
+            pid = pids[randrange(num_pages)]
+            bp.get_page(table, pid, pin=True)
+            bp.unpin((table.name, pid[1], pid[2]))
+
+    threads = [threading.Thread(target=reader) for _ in range(num_threads)]
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - start
+
+    return num_threads * gets_per_thread / elapsed, bp.stats()['latch_wait_us']['count']
+
+### Peak memory of the pool under concurrent inserts ###
+# :param num_threads:   #Number of inserting threads
+# :brief    :           #A sampler thread records the largest pool size seen while the inserts run
+# :returns tuple:       #(peak bytes, budget in bytes, number of overshoot events)
+def bench_insert_peak(folder, num_threads=4, pool_size=50, inserts_per_thread=3000):
+    db = Database(pool_bytes=pool_size * PAGE_SIZE)
+    db.open(folder + '/inserts')
+    query = Query(db.create_table('Inserts', 5, 0))
+    bp = db.my_manager.bp
+
+    def inserter(thread_idx):
+        for i in range(inserts_per_thread):
+            key = thread_idx * inserts_per_thread + i
+            query.insert(key, i, i, i, i)
+
+    peak = [0]
+    done = threading.Event()
+    def sampler():
+        while not done.is_set():
+            peak[0] = max(peak[0], bp.num_bytes)
+
+    threads = [threading.Thread(target=inserter, args=(i,)) for i in range(num_threads)]
+    sampling = threading.Thread(target=sampler)
+    sampling.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    sampling.join()
+
+    stats = db.stats()
+    db.close()
+    return peak[0], stats['max_bytes'], stats['overshoots']
+
+### Memory use of one shared pool under many tables ###
+# :param num_tables:    #Number of tables sharing the pool
+# :brief    :           #One hot table is read all the time while the others get a burst each at the start
+def bench_shared_pool(folder, num_tables=10, pool_size=200, num_reads=20000):
+    disk = DiskManager(folder)
+    disk.bp.max_bytes = pool_size * PAGE_SIZE
+    tables = []
+    for i in range(num_tables):
+        name = 'Bench' + str(i)
+        disk.make_table_folder(name)
+        table = Table(name, 5, 0, disk)
+        for _ in range(pool_size // PAGE_RANGE_MAX_BASE_PAGES):
+            page_range = PageRange()
+            while page_range.has_open_base_pages():
+                page_range.create_base_page()
+            table.page_ranges.append(page_range)
+        tables.append(table)
+
+    def pid(i):
+        return (0, i % PAGE_RANGE_MAX_BASE_PAGES, i // PAGE_RANGE_MAX_BASE_PAGES)
+
+    num_table_pages = (pool_size // PAGE_RANGE_MAX_BASE_PAGES) * PAGE_RANGE_MAX_BASE_PAGES
+    for table in tables[1:]:
+        for i in range(num_table_pages):
+            table.bp.get_page(pid(i))
+
+    peak = 0
+    for _ in range(num_reads):
+        tables[0].bp.get_page(pid(randrange(num_table_pages)))
+        peak = max(peak, disk.bp.num_bytes)
+
+    return peak, disk.bp.stats()
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as folder:
+        print("get_page cost by pool size")
+        for pool_size in POOL_SIZES:
+            cost = bench_get_page(pool_size, folder)
+            print("MAX_POOL_PAGES = %6d:\t%.2f us per get_page" % (pool_size, cost * 1e6))
+
+        print("")
+        print("Hit ratio with a hot set and scans")
+        for policy in POLICIES:
+            stats = bench_policy(policy, folder)
+            print("%s:\t%.3f" % (policy, stats['hit_ratio']))
+
+        print("")
+        print("Hot reads mixed with scans, %s policy" % REPLACEMENT_POLICY)
+        for ring_pages in [0, BULK_RING_PAGES]:
+            hit_ratio, p99 = bench_bulk_scan(folder, ring_pages)
+            mode = 'ring of %d' % ring_pages if ring_pages else 'through pool'
+            print("%s:\thot hit ratio %.3f, p99 %.1f us" % (mode, hit_ratio, p99 * 1e6))
+
+        print("")
+        print("Concurrent point reads of resident pages")
+        for num_threads in [1, 2, 4, 8, 16]:
+            rate, waits = bench_threads(folder, num_threads)
+            print("%2d threads:\t%8.0f get_page/s, %d stripe lock waits" % (num_threads, rate, waits))
+
+        print("")
+        peak, budget, overshoots = bench_insert_peak(folder)
+        print("Concurrent inserts, budget %d bytes" % budget)
+        print("Peak bytes:\t%d, %d overshoot events" % (peak, overshoots))
+
+        print("")
+        peak, stats = bench_shared_pool(folder)
+        print("Shared pool with 10 tables, budget %d bytes" % stats['max_bytes'])
+        print("Peak bytes:\t%d" % peak)
+        print("Hot table hit ratio:\t%.3f" % stats['hit_ratio'])
+        print("Pages per table:\t%s" % stats['table_pages'])
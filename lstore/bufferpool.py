@@ -1,270 +1,1066 @@
 from contextlib import contextmanager
-none_context = contextmanager(lambda: iter([None]))
+from functools import partial
 
 from page import Page
 from pagerange import PageRange
 from config import *
-from collections import defaultdict
+from replacement import make_policy
+from flusher import Flusher
+from metrics import Histogram
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
+from time import perf_counter
+
+import heapq
 import logging
 import threading
-from queue import Queue
 
 ### BufferPool class handles which pages are in memory and on disk
+# One bufferpool is shared by every table of a database and is sized in bytes
+# Pages are kept under pool keys (table_name, page_idx, page_range_idx)
+# Tables talk to it through a TablePool (see for_table) which still takes page keys (page_idx, page_range_idx)
 class BufferPool:
     ### Initializer for bufferpool ###
     # :param disk:          #Diskmanager class that handles actually reading and writing to disk
-    # :param table:         #Table class whose pages the bufferpool will manage
+    # :param policy:        #Name of the page replacement policy (see replacement.py), defaults to REPLACEMENT_POLICY
+    # :param max_bytes:     #Budget of the pool in bytes, defaults to MAX_POOL_BYTES
     # :IV self.pins:        #Pins represent queries using the pages
-    # :IV self.pages:       #Manages pages in a list.
+    # :IV self.pages:       #Dict of pool_key -> page for every page in the pool
+    # :IV self.policy:      #Replacement policy that orders self.pages and picks which ones to evict
+    # :IV self.dirty:       #Pool keys of the dirty pages in self.pages, kept by the pages themselves (see _track)
     # :IV self.merge_pins   #Merge pins keep track whether pages are within a merge job
-    def __init__(self, table, disk):
-        self.max_pages = MAX_POOL_PAGES # from config file
+    # :IV self.tables:      #Table name -> table for every table using the pool
+    # :IV self.flusher:     #Background writer of dirty pages
+    # :IV self.prefetcher:  #Threads that load pages before they are asked for (see prefetch)
+    # :IV self.local:       #Per thread state, holds the BufferRing of a thread in bulk access mode
+    def __init__(self, disk, policy=None, max_bytes=MAX_POOL_BYTES, prefetch_window=PREFETCH_WINDOW, ring_pages=BULK_RING_PAGES):
+        self.max_bytes = max_bytes
         self.disk = disk # type : DiskManager
-        self.num_pool_pages = 0
-        self.pages = [] # todo: just pop random for now, later organize
+        self.pages = {}
+        self.table_pages = defaultdict(int) # table name -> number of pages in the pool
+        self.page_bytes = {} # pool_key -> bytes of the page when it was last touched, guarded by pool_lock
+        self.resident_bytes = 0 # sum of self.page_bytes, guarded by pool_lock
+        self.policy = make_policy(policy or REPLACEMENT_POLICY)
         self.merge_pins = defaultdict(int)
-        self.pins = defaultdict(int)
+        self.pins = {} # pool_key -> pin count, only pinned pages have an entry, guarded by pin_locks
         self.page_index = {}
         self.loaded_off_pool = []
 
-        self.table = table # type: Table
+        self.tables = {}
 
-        self.pop_locks = [threading.Lock() for _ in range(500)]
-        self.load_locks = [threading.Lock() for _ in range(500)]
+        # Stripe locks, pool keys are spread over them by self.hash
+        self.pop_locks = [threading.Lock() for _ in range(NUM_PAGE_LATCHES)]
+        self.load_locks = [threading.Lock() for _ in range(NUM_PAGE_LATCHES)]
+        self.pin_locks = [threading.Lock() for _ in range(NUM_PAGE_LATCHES)]
 
-        self.add_queue = Queue()
+        self.pool_lock = threading.Lock() # guards self.pages, self.table_pages and self.policy
+        self.evict_lock = threading.Lock() # one evicting thread at a time
+        self.admitting = 0 # pages admitted but not in self.pages yet, a full frame each, guarded by pool_lock
+        self.overshoots = 0 # times the pool went over its budget, guarded by pool_lock
 
-        threading.Thread(target=self._handle_add_pool).start()
+        self.flushing = {} # pool key -> (page, version) the flusher is writing, guarded by pool_lock
+        self.dirty = set() # guarded by dirty_lock, taken after pool_lock when both are needed
+        self.dirty_lock = threading.Lock()
+        self.flusher = Flusher(self)
 
-    ### Internal function to handle adding pages to the bufferpool ###
-    # :brief    :           #Gets which pages to add from the add_queue
-    #                       #Calls pop_pages to remove pages if bufferpool is full.
-    def _handle_add_pool(self):
-        while True:
-            pool_key = self.add_queue.get()
-            page_key, _ = pool_key
+        self.prefetch_window = prefetch_window
+        self.prefetcher = ThreadPoolExecutor(max_workers=PREFETCH_THREADS, thread_name_prefix='prefetch')
+        self.prefetching = set() # pool keys queued for prefetch, guarded by pool_lock
+        self.prefetched = set() # pool keys loaded by a prefetch and not used yet, guarded by pool_lock
+        self.last_miss = {} # (table_name, page_range_idx) -> page_idx of the last miss, guarded by pool_lock
+        self.prefetch_issued = 0
+        self.prefetch_useful = 0
+        self.prefetch_wasted = 0
 
-            logging.debug("%s: (%s) start: %s", threading.get_ident(), "_update_pool_get", page_key)
-            try:
-                idx = self.pages.index(pool_key)
-                self.pages.pop(idx)
-            except ValueError:
-                logging.debug("%s: (%s) page not in pool: %s", threading.get_ident(), "_update_pool_get", page_key)
-                self.num_pool_pages += 1
+        self.ring_pages = ring_pages
+        self.local = threading.local()
+        self.bulk_loads = 0
+
+        self.stats_lock = threading.Lock() # guards the get_page counters
+        self.handle_pins = 0 # pins held by open PageHandles, guarded by stats_lock
+        self.get_hits = 0
+        self.get_misses = 0
+        self.evictions = 0
+        self.load_latency = Histogram(1e-6) # microseconds
+        self.write_latency = Histogram(1e-6)
+        self.latch_wait = Histogram(1e-6) # only stripe locks that were taken by another thread
+        self.evict_batch = Histogram() # pages
+
+    ### Gets the view of the pool used by a table ###
+    # :param table:         #Table whose pages will go through the pool
+    # :returns TablePool:   #Object with the per table bufferpool interface
+    def for_table(self, table):
+        self.tables[table.name] = table
+        return TablePool(self, table)
 
-            logging.debug("%s: (%s) adding to bufferpool pagekey: %s", threading.get_ident(), "_update_pool_get", page_key)
-            self.pages.append(pool_key)
-            logging.debug("%s: (%s) added to bufferpool pagekey: %s", threading.get_ident(), "_update_pool_get", page_key)
+    # Number of pages currently in the pool
+    @property
+    def num_pool_pages(self):
+        return len(self.pages)
 
-            if self.num_pool_pages > MAX_POOL_PAGES:
-                self._pop_pages()
+    # Number of bytes held by the pages in the pool, encoded pages take less than a full page
+    @property
+    def num_bytes(self):
+        return self.resident_bytes
 
-    ### Updates which pages need to be added ###
-    # :param page_key:      #Consists of a tuple in the form of (page_idx, page_range_idx)
+    # Number of full pages that fit in the byte budget
+    @property
+    def max_pages(self):
+        return self.max_bytes // PAGE_SIZE
+
+    ### Records an access to a page ###
+    # :param pool_key:      #Consists of a tuple in the form of (table_name, page_idx, page_range_idx)
     # :param page:          #Page to be added
-    def _update_pool_get(self, page_key, page):
-        pool_key = (page_key, page)
-        self.add_queue.put(pool_key)
+    # :brief    :           #Caller must hold the page's stripe lock
+    #                       #Adds the page to the pool and lets the replacement policy reorder it
+    # :param prefetch: bool #The page was loaded by a prefetch, not asked for by a query
+    def _touch(self, pool_key, page, prefetch=False):
+        with self.pool_lock:
+            if pool_key not in self.pages:
+                self.table_pages[pool_key[0]] += 1
+            self._track(pool_key, page)
+            self.pages[pool_key] = page
+            self.policy.touch(pool_key)
+
+            # The page may have been encoded or decoded since it was last touched
+            num_bytes = page.num_bytes
+            self.resident_bytes += num_bytes - self.page_bytes.get(pool_key, 0)
+            self.page_bytes[pool_key] = num_bytes
+
+            if prefetch:
+                self.prefetched.add(pool_key)
+            elif pool_key in self.prefetched:
+                self.prefetched.discard(pool_key)
+                self.prefetch_useful += 1
+
+    ### Puts an eviction victim back into the pool ###
+    # :param pool_key:      #Consists of a tuple in the form of (table_name, page_idx, page_range_idx)
+    # :param page:          #Page that was picked
+    # :brief    :           #Caller must hold the page's stripe lock
+    #                       #For victims that got pinned or are being flushed before they could leave the pool
+    #                       #Unlike _touch it is not an access, the policy keeps the page where the next victim is taken from
+    def _reinstate(self, pool_key, page):
+        with self.pool_lock:
+            if pool_key not in self.pages:
+                self.table_pages[pool_key[0]] += 1
+            self._track(pool_key, page)
+            self.pages[pool_key] = page
+            self.policy.reinstate(pool_key)
+
+            num_bytes = page.num_bytes
+            self.resident_bytes += num_bytes - self.page_bytes.get(pool_key, 0)
+            self.page_bytes[pool_key] = num_bytes
+
+    ### Starts keeping self.dirty for a page that goes into the pool ###
+    # :param pool_key:      #Consists of a tuple in the form of (table_name, page_idx, page_range_idx)
+    # :param page:          #Page about to be put in self.pages
+    # :brief    :           #Caller must hold pool_lock
+    #                       #The page calls its hook when a write makes it dirty or a flush makes it clean
+    #                       #The hook is set before is_dirty is read so no write can slip in between
+    def _track(self, pool_key, page):
+        resident = self.pages.get(pool_key)
+        if resident is page:
+            return
+        if resident is not None:
+            resident.dirty_hook = None
+
+        page.dirty_hook = partial(self._dirty_hook, pool_key)
+        if page.is_dirty:
+            with self.dirty_lock:
+                self.dirty.add(pool_key)
+
+    ### Stops keeping self.dirty for a page that left the pool ###
+    # :brief    :           #Caller must hold pool_lock
+    def _untrack(self, pool_key, page):
+        page.dirty_hook = None
+        with self.dirty_lock:
+            self.dirty.discard(pool_key)
+
+    # Called by a pooled page that turned dirty or clean, see Page.dirty_hook
+    def _dirty_hook(self, pool_key, is_dirty):
+        with self.dirty_lock:
+            if is_dirty:
+                self.dirty.add(pool_key)
+            else:
+                self.dirty.discard(pool_key)
+
+    # Number of dirty pages in the pool, read without pool_lock so it can be a little off
+    @property
+    def num_dirty(self):
+        return len(self.dirty)
+
+    ### Recounts the bytes of a page whose data was swapped ###
+    # :param pool_key:      #Consists of a tuple in the form of (table_name, page_idx, page_range_idx)
+    # :param page:          #Page that was encoded or decoded
+    # :brief    :           #Does nothing if the page is not in the pool
+    def resized(self, pool_key, page):
+        with self.pool_lock:
+            if self.pages.get(pool_key) is not page:
+                return
+
+            num_bytes = page.num_bytes
+            self.resident_bytes += num_bytes - self.page_bytes.get(pool_key, 0)
+            self.page_bytes[pool_key] = num_bytes
+
+    ### Snapshot of the bufferpool counters ###
+    # :returns dict:        #Replacement policy hits and misses, memory use, get_page hits and misses,
+    #                       #Evictions, prefetch and flusher counters, and histograms (see metrics.py)
+    #                       #Of load and write latency, stripe lock waits and eviction batch sizes
+    def stats(self):
+        with self.pool_lock:
+            stats = self.policy.stats()
+            stats['num_bytes'] = self.num_bytes
+            stats['max_bytes'] = self.max_bytes
+            stats['table_pages'] = dict(self.table_pages)
+            stats['num_pages'] = len(self.pages)
+            stats['prefetch_issued'] = self.prefetch_issued
+            stats['prefetch_useful'] = self.prefetch_useful
+            stats['prefetch_wasted'] = self.prefetch_wasted
+            stats['bulk_loads'] = self.bulk_loads
+            stats['evictions'] = self.evictions
+            stats['overshoots'] = self.overshoots
+            stats['loaded_off_pool'] = len(self.loaded_off_pool)
+            stats['prefetch_queue'] = len(self.prefetching)
+        with self.stats_lock:
+            stats['get_hits'] = self.get_hits
+            stats['get_misses'] = self.get_misses
+        stats['pinned_pages'] = len(self.pins)
+        stats['leaked_pins'] = self.leaked_pins()
+        stats['load_latency_us'] = self.load_latency.snapshot()
+        stats['write_latency_us'] = self.write_latency.snapshot()
+        stats['latch_wait_us'] = self.latch_wait.snapshot()
+        stats['evict_batch_pages'] = self.evict_batch.snapshot()
+        stats.update(self.flusher.stats())
+        stats.update(self.disk.io_stats())
+        return stats
+
+    # Pool keys of the pages in the pool, the next to be evicted first
+    def resident_pages(self):
+        with self.pool_lock:
+            return self.policy.eviction_order()
+
+    ### Dirty pages of the pool ###
+    # :param num:           #Max number of pages to return, None for all of them
+    # :returns list:        #Tuples of (pool_key, page), the page closest to eviction first
+    # :brief    :           #Only the keys in self.dirty are looked at and ordered, not every resident page
+    #                       #A hook can race with the page leaving the pool or its flush, those keys are dropped here
+    #                       #A write after is_dirty is read calls its hook once dirty_lock is free, so it can't be lost
+    #                       #Ranks are taken under pool_lock and sorted after it is released
+    def dirty_pages(self, num=None):
+        with self.pool_lock:
+            with self.dirty_lock:
+                self.dirty = {pool_key for pool_key in self.dirty if pool_key in self.pages and self.pages[pool_key].is_dirty}
+                pool_keys = list(self.dirty)
+
+            ranked = [(self.policy.rank(pool_key), pool_key) for pool_key in pool_keys]
+            pages = {pool_key: self.pages[pool_key] for _, pool_key in ranked}
+
+        if num is None:
+            ranked.sort()
+        else:
+            ranked = heapq.nsmallest(num, ranked)
+        return [(pool_key, pages[pool_key]) for _, pool_key in ranked]
+
+    ### Takes what the flusher has to write for a page ###
+    # :param pool_key:      #Consists of a tuple in the form of (table_name, page_idx, page_range_idx)
+    # :param page:          #Dirty page
+    # :returns tuple:       #(segment, offset in the segment file, bytes to write), None if the page is gone or clean
+    # :brief    :           #Holds the stripe lock so the page can't be unloaded while it is encoded
+    #                       #Remembers the page version, flush_done only marks that version clean
+    #                       #So a write that comes in while the flusher is writing keeps the page dirty
+    def snapshot_for_flush(self, pool_key, page):
+        hashed = self.hash(pool_key, len(self.load_locks))
+        with self.pop_locks[hashed]:
+            if self.pages.get(pool_key) is not page or not page.is_loaded or not page.is_dirty:
+                return None
+
+            table_name, page_idx, page_range_idx = pool_key
+
+            version = page.version
+            with self.pool_lock:
+                self.flushing[pool_key] = (page, version)
+
+            return self.disk.prepare_write(page, (page_idx, page_range_idx), table_name)
+
+    ### Called by the flusher once its writes landed ###
+    # :param pool_keys:     #Keys that were given to snapshot_for_flush
+    # :param written: bool  #False if the writes failed, the pages then stay dirty
+    def flush_done(self, pool_keys, written=True):
+        with self.pool_lock:
+            for pool_key in pool_keys:
+                page, version = self.flushing.pop(pool_key)
+                if written:
+                    page.mark_clean(version)
+
+    # True if the flusher is writing the page, it must stay loaded until the write lands
+    def _is_flushing(self, pool_key):
+        with self.pool_lock:
+            return pool_key in self.flushing
+
+    ### Evicts pages if the pool is over its budget ###
+    # :brief    :           #Must be called without holding any stripe lock
+    #                       #Only one thread evicts at a time, others carry on
+    #                       #Pages are admitted under the budget (see _admit), so this only runs
+    #                       #For pages that had to go over it
+    def _maybe_evict(self):
+        if self.num_bytes <= self.max_bytes:
+            return
+
+        with self.pool_lock:
+            self.overshoots += 1
+        self.flusher.signal()
+
+        if not self.evict_lock.acquire(False):
+            return
+
+        try:
+            self._pop_pages()
+        finally:
+            self.evict_lock.release()
+
+    ### Makes room for a page before it goes into the pool ###
+    # :brief    :           #Must be called without holding any stripe lock
+    #                       #Reserves a full frame if the pool has room, otherwise waits for the thread that
+    #                       #Is evicting or evicts itself, so the pool never holds more than max_bytes
+    #                       #If every page is pinned nothing can be evicted, the page is let in anyway
+    #                       #And counted as an overshoot
+    #                       #Every call must be followed by one call to _admitted
+    def _admit(self):
+        while True:
+            with self.pool_lock:
+                if self._has_room():
+                    self.admitting += 1
+                    return
+
+            self.flusher.signal()
+            with self.evict_lock:
+                with self.pool_lock:
+                    if self._has_room():
+                        continue
+
+                if self._pop_pages() == 0:
+                    with self.pool_lock:
+                        self.admitting += 1
+                        self.overshoots += 1
+                    return
+
+    # True if one more full frame fits in the budget, caller must hold pool_lock
+    def _has_room(self):
+        return self.resident_bytes + (self.admitting + 1) * PAGE_SIZE <= self.max_bytes
+
+    # Releases the frame reserved by _admit once the page is in self.pages (or was not added)
+    def _admitted(self):
+        with self.pool_lock:
+            self.admitting -= 1
 
     ### Gets a page ###
+    # :param table:         #Table that owns the page
     # :param pid:           #Consists of a tuple in the form of (inner_page_idx, page_idx, page_range_idx)
     # :param pin:           #If the the page is to be pinned or not
     # :brief    :           #Creates a lock on the page with hash function
     #                       #Will create a lock and call self.add_page
     # :return   :           #Page that was retrieved
 
-    def get_page(self, pid, pin=False):
+    def get_page(self, table, pid, pin=False):
         _, page_idx, page_range_idx = pid
-        page_range = self.table.page_ranges[page_range_idx] # type: PageRange
+        page_range = table.page_ranges[page_range_idx] # type: PageRange
         page = page_range.get_page(page_idx) # type: Page
-        page_key = (pid[1], pid[2])
+        pool_key = (table.name, page_idx, page_range_idx)
 
-        hashed = self.hash(page_key, len(self.load_locks))
+        hashed = self.hash(pool_key, len(self.load_locks))
         lock = self.pop_locks[hashed]
 
-        with lock:
-            logging.debug("%s: (%s) start: %s", threading.get_ident(), "get_page", pid)
+        ring = getattr(self.local, 'ring', None) # type: BufferRing
+        over = []
+
+        # Unlocked check, a page that is in the pool needs no frame
+        admit = ring is None and pool_key not in self.pages
+        if admit:
+            self._admit()
+
+        self._acquire(lock)
+        try:
+            logging.debug("%s: (%s) start: %s", threading.get_ident(), "get_page", pool_key)
             
             if pin:
-                self.pin(page_key)
+                self.pin(pool_key, hashed)
 
-            self.add_page(pid, page, have_lock=True)
-            
-            return page
+            missed = not page.is_loaded
+            if ring is None:
+                self.add_page(table, pid, page, have_lock=True)
+            elif missed:
+                self._load_from_disk(pool_key, page)
+                over = ring.add(pool_key, page)
+        finally:
+            lock.release()
+            if admit:
+                self._admitted()
+
+        with self.stats_lock:
+            if missed:
+                self.get_misses += 1
+            else:
+                self.get_hits += 1
+
+        if ring is not None:
+            # A bulk hit leaves the page where it is without promoting it
+            self._bulk_used(pool_key, missed)
+            self._drop_ring_frames(over)
+
+        if missed:
+            self._read_ahead(table, pool_key)
+
+        if ring is None:
+            self._maybe_evict()
+
+        return page
+
+    ### Takes a stripe lock ###
+    # :param lock:          #Lock from self.pop_locks
+    # :brief    :           #Records how long the thread waited if another thread held the lock
+    #                       #Caller releases the lock
+    def _acquire(self, lock):
+        if lock.acquire(False):
+            return
+
+        start = perf_counter()
+        lock.acquire()
+        self.latch_wait.record(perf_counter() - start)
+
+    ### Bulk access mode ###
+    # :param ring_pages: int    #Number of frames of the ring, defaults to self.ring_pages
+    # :brief    :               #Within the block, pages this thread gets that are not in the pool are
+    #                           #Loaded into a small private ring of frames instead of the pool
+    #                           #And pages that are in the pool are read without being promoted
+    #                           #So merges and range sums cycle through a few frames and leave the
+    #                           #Working set of point queries alone
+    #                           #The ring frames are outside the pool budget, ring_pages 0 turns the mode off
+    @contextmanager
+    def bulk_access(self, ring_pages=None):
+        ring_pages = self.ring_pages if ring_pages is None else ring_pages
+        if ring_pages <= 0 or getattr(self.local, 'ring', None) is not None:
+            yield None
+            return
+
+        ring = BufferRing(ring_pages)
+        self.local.ring = ring
+        try:
+            yield ring
+        finally:
+            self.local.ring = None
+            self._drop_ring_frames(ring.drain())
+
+    ### Counts a page read in bulk access mode ###
+    # :param pool_key:      #Consists of a tuple in the form of (table_name, page_idx, page_range_idx)
+    # :param missed: bool   #The page had to be loaded
+    def _bulk_used(self, pool_key, missed):
+        if not missed and pool_key not in self.prefetched:
+            return
+
+        with self.pool_lock:
+            if missed:
+                self.bulk_loads += 1
+            elif pool_key in self.prefetched:
+                self.prefetched.discard(pool_key)
+                self.prefetch_useful += 1
+
+    ### Drops frames that fell out of a ring ###
+    # :param frames:        #List of (pool_key, page)
+    # :brief    :           #Pages that went into the pool in the meantime are left alone
+    #                       #Pinned pages are handed to the pool, merge pinned ones to loaded_off_pool
+    #                       #The rest are written to disk if dirty and unloaded
+    def _drop_ring_frames(self, frames):
+        for pool_key, page in frames:
+            hashed = self.hash(pool_key, len(self.load_locks))
+            with self.pop_locks[hashed]:
+                if pool_key in self.pages or not page.is_loaded:
+                    continue
+
+                if self.pins.get(pool_key, 0) > 0:
+                    self._touch(pool_key, page)
+                    continue
+
+                if self.merge_pins[pool_key] > 0:
+                    self.loaded_off_pool.append((pool_key, page))
+                    continue
+
+                with self.pool_lock:
+                    if pool_key in self.prefetched:
+                        self.prefetched.discard(pool_key)
+                        self.prefetch_wasted += 1
+
+                with page.latch:
+                    if page.is_dirty:
+                        self._write_to_disk(pool_key, page)
+                    page.unload()
+
+        if frames:
+            self._maybe_evict()
+
+    ### Loads pages in the background before they are asked for ###
+    # :param table:         #Table that owns the pages
+    # :param page_keys:     #Iterable of (page_idx, page_range_idx) the caller is about to read
+    # :returns int:         #Number of page loads that were queued
+    # :brief    :           #Pages that are already loaded or queued are skipped
+    #                       #Prefetched pages go into the pool like any other page and are not pinned
+    def prefetch(self, table, page_keys):
+        # Unlocked check first so queries on loaded pages don't take the pool lock
+        page_keys = [page_key for page_key in page_keys
+            if not table.page_ranges[page_key[1]].get_page(page_key[0]).is_loaded]
+        if not page_keys:
+            return 0
+
+        to_load = []
+        with self.pool_lock:
+            for page_idx, page_range_idx in page_keys:
+                pool_key = (table.name, page_idx, page_range_idx)
+                if pool_key in self.pages or pool_key in self.prefetching:
+                    continue
+
+                self.prefetching.add(pool_key)
+                to_load.append(pool_key)
+
+            self.prefetch_issued += len(to_load)
+
+        ring = getattr(self.local, 'ring', None)
+        for pool_key in to_load:
+            try:
+                self.prefetcher.submit(self._prefetch_page, table, pool_key, ring)
+            except RuntimeError: # prefetcher was shut down
+                with self.pool_lock:
+                    self.prefetching.discard(pool_key)
+
+        return len(to_load)
+
+    ### Loads one prefetched page, runs on a prefetch thread ###
+    # :param table:         #Table that owns the page
+    # :param pool_key:      #Consists of a tuple in the form of (table_name, page_idx, page_range_idx)
+    # :param ring:          #BufferRing of the thread that asked for the prefetch, None to load into the pool
+    def _prefetch_page(self, table, pool_key, ring=None):
+        _, page_idx, page_range_idx = pool_key
+        over = []
+        admit = ring is None
+        if admit:
+            self._admit()
+
+        try:
+            page = table.page_ranges[page_range_idx].get_page(page_idx)
+
+            hashed = self.hash(pool_key, len(self.load_locks))
+            with self.pop_locks[hashed]:
+                if page.is_loaded:
+                    return
+
+                # The page was reclaimed while the prefetch was queued (see drop_page), nothing to load
+                if page is not table.page_ranges[page_range_idx].get_page(page_idx):
+                    return
+
+                self._load_from_disk(pool_key, page)
+                if not page.is_loaded:
+                    return
+
+                if ring is None:
+                    self._touch(pool_key, page, prefetch=True)
+                else:
+                    with self.pool_lock:
+                        self.prefetched.add(pool_key)
+                    over = ring.add(pool_key, page)
+        except Exception:
+            logging.exception("%s: (%s) prefetch of %s failed", threading.get_ident(), "_prefetch_page", pool_key)
+            return
+        finally:
+            if admit:
+                self._admitted()
+            # Frames that fell out of the ring are unloaded before the page stops counting as prefetching
+            self._drop_ring_frames(over)
+            with self.pool_lock:
+                self.prefetching.discard(pool_key)
+
+        if ring is None:
+            self._maybe_evict()
+
+    ### Sequential read-ahead ###
+    # :param table:         #Table that owns the page
+    # :param pool_key:      #Page that just missed
+    # :brief    :           #Two misses on neighbouring pages of a pagerange start a read-ahead
+    #                       #Of the next prefetch_window pages of the same pagerange
+    #                       #Base and tail pages are read ahead separately
+    def _read_ahead(self, table, pool_key):
+        if self.prefetch_window <= 0:
+            return
+
+        table_name, page_idx, page_range_idx = pool_key
+        with self.pool_lock:
+            last = self.last_miss.get((table_name, page_range_idx))
+            self.last_miss[(table_name, page_range_idx)] = page_idx
+
+        if last is None or page_idx != last + 1:
+            return
+
+        page_range = table.page_ranges[page_range_idx] # type: PageRange
+        if page_idx < PAGE_RANGE_MAX_BASE_PAGES:
+            end = page_range.base_page_count
+        else:
+            end = PAGE_RANGE_MAX_BASE_PAGES + page_range.tail_page_count
+
+        ahead = range(page_idx + 1, min(end, page_idx + 1 + self.prefetch_window))
+        self.prefetch(table, [(ahead_idx, page_range_idx) for ahead_idx in ahead])
+
+    # Waits for queued prefetches and stops the prefetch threads
+    def stop_prefetch(self):
+        self.prefetcher.shutdown(wait=True)
 
     ### Adds a page to the bufferpool ###
+    # :param table:         #Table that owns the page
     # :param pid:           #Consists of a tuple in the form of (inner_page_idx, page_idx, page_range_idx)
     # :param pin:           #Flag if the page is to be pinned or not
     # :param lock:          #Flag if the page is locked
     # :brief    :           #Creates a lock on the page if have_lock=False
     #                       #Will call self._load_from_disk if page is not loaded in memory
-    #                       #Calls self._update_pool_get to update which pages to add to bufferpool
+    #                       #Calls self._touch to mark the page as most recently used
 
-    def add_page(self, pid, page, pin=False, have_lock=False):
+    def add_page(self, table, pid, page, pin=False, have_lock=False):
         logging.debug("%s: (%s) start pid: %s", threading.get_ident(), "add_page", pid)
         
-        page_key = (pid[1], pid[2])
-        logging.debug("%s: (%s) start: %s", threading.get_ident(), "get_page", pid)
+        pool_key = (table.name, pid[1], pid[2])
         
+        admit = False
         if have_lock:
             lock = None
         else:
-            hashed = self.hash(page_key, len(self.load_locks))
+            admit = pool_key not in self.pages
+            if admit:
+                self._admit()
+
+            hashed = self.hash(pool_key, len(self.load_locks))
             lock = self.pop_locks[hashed]
+            self._acquire(lock)
 
-        with (lock if lock is not None else none_context()):
+        try:
             if pin:
-                self.pin(page_key)
+                self.pin(pool_key)
 
             if not page.is_loaded:
                 logging.debug("%s: (%s) load from disk pid: %s", threading.get_ident(), "get_page", pid)
-                self._load_from_disk(page_key, page)
+                self._load_from_disk(pool_key, page)
+
+            self._touch(pool_key, page)
+        finally:
+            if lock is not None:
+                lock.release()
+            if admit:
+                self._admitted()
 
-            self._update_pool_get(page_key, page)
+        if not have_lock:
+            self._maybe_evict()
 
     ### Removes pages from bufferfool ###
-    # :brief    :           #Removes the least recently used (LRU) pages from bufferpool
+    # :brief    :           #Asks the replacement policy for pages to remove from the bufferpool
     #                       #Will remove a quarter of the bufferpool at a time for faster page refresh times
-    #                       #Marks pages with 0 pins as good for removal
+    #                       #Pages with pins are never picked
+    #                       #To be fair across tables, a table is not drained below POOL_TABLE_FLOOR of its
+    #                       #Equal share of the pool unless nothing else can be removed
     #                       #For each page that is removed, will lock before removal and
-    #                       #Checks if the page was possibly pinned in another thread or is in a mergejob
+    #                       #Checks if the page was pinned or touched again in another thread or is in a mergejob
     #                       #Calls function to write to disk if page is dirty
     #                       #Unloads the page to be removes through page class function
 
-    def _pop_pages(self) -> Page:
+    def _pop_pages(self) -> int:
         '''
-        Pops page and decides via ? method (LRU/MRU)
+        Pops pages chosen by the replacement policy, returns the number of pages that left the pool
         '''
 
         logging.debug("{}: {}".format(threading.get_ident(), "bp._pop_page"))
 
-        i = 0
+        with self.pool_lock:
+            num_pages_to_remove = max(1, len(self.pages)//4)
+            table_floor = int(self.max_pages / max(1, len(self.table_pages)) * POOL_TABLE_FLOOR)
+            picked = defaultdict(int)
 
-        pages_to_remove = []
-        num_pages_to_remove = self.num_pool_pages//4
+            # The policy removes every page this returns True for
+            # Pages the flusher is writing stay until the write lands
+            def is_evictable_fair(pool_key):
+                if self.pins.get(pool_key, 0) > 0 or pool_key in self.flushing:
+                    return False
 
-        while i < self.num_pool_pages and len(pages_to_remove) < num_pages_to_remove:
+                table_name = pool_key[0]
+                if self.table_pages[table_name] - picked[table_name] <= table_floor:
+                    return False
 
-            page_key, page_to_pop = self.pages[i]
+                picked[table_name] += 1
+                return True
 
-            if self.pins[page_key] <= 0:
-                pages_to_remove.append(self.pages.pop(i))
-                self.num_pool_pages -= 1
+            def is_evictable(pool_key):
+                return self.pins.get(pool_key, 0) <= 0 and pool_key not in self.flushing
 
-            if i >= self.num_pool_pages:
-                i = 0
-            else:
-                i += 1
+            victims = self.policy.victims(num_pages_to_remove, self.max_pages, is_evictable_fair)
+            if len(victims) < num_pages_to_remove:
+                victims += self.policy.victims(num_pages_to_remove - len(victims), self.max_pages, is_evictable)
+
+            self.evictions += len(victims)
+            self.evict_batch.record(len(victims))
+
+            pages_to_remove = []
+            for pool_key in victims:
+                page = self.pages.pop(pool_key)
+                self._untrack(pool_key, page)
+                pages_to_remove.append((pool_key, page))
+                self.table_pages[pool_key[0]] -= 1
+                self.resident_bytes -= self.page_bytes.pop(pool_key, 0)
 
-        for page in pages_to_remove:
+                # Prefetched but never read
+                if pool_key in self.prefetched:
+                    self.prefetched.discard(pool_key)
+                    self.prefetch_wasted += 1
 
-            page_key, page_to_pop = page
-            hashed = self.hash(page_key, len(self.load_locks))
+        num_removed = 0
+        for pool_key, page_to_pop in pages_to_remove:
+
+            hashed = self.hash(pool_key, len(self.load_locks))
             lock = self.pop_locks[hashed]
             with lock:
-                if self.pins[page] > 0:
-                    raise Exception("Trying to remove page that is pinned")
+                # Touched again since it was picked, leave it alone
+                if pool_key in self.pages:
+                    continue
+
+                # Pinned or being flushed since it was picked, put it back in the pool
+                if self.pins.get(pool_key, 0) > 0 or self._is_flushing(pool_key):
+                    self._reinstate(pool_key, page_to_pop)
+                    continue
 
-                if self.merge_pins[page_key] == 1:
-                    logging.debug("%s: (%s) wanted to unload page pid: %s but ", threading.get_ident(), "_pop_page", page_key)
-                    self.loaded_off_pool.append((page_key, page_to_pop))
+                num_removed += 1
+                if self.merge_pins[pool_key] == 1:
+                    logging.debug("%s: (%s) wanted to unload page pid: %s but ", threading.get_ident(), "_pop_page", pool_key)
+                    self.loaded_off_pool.append((pool_key, page_to_pop))
                 else:
                     if page_to_pop.is_dirty:
-                        self._write_to_disk(page_key, page_to_pop)
+                        self._write_to_disk(pool_key, page_to_pop)
 
-                    logging.debug("%s: (%s) unloading page pid: %s", threading.get_ident(), "_pop_page", page_key)
+                    logging.debug("%s: (%s) unloading page pid: %s", threading.get_ident(), "_pop_page", pool_key)
                     page_to_pop.unload()
-                    logging.debug("%s: (%s) unloaded page pid: %s", threading.get_ident(), "_pop_page", page_key)
+                    logging.debug("%s: (%s) unloaded page pid: %s", threading.get_ident(), "_pop_page", pool_key)
 
-    ### Calls on diskmanager to create a new pagerange in disk ###
-    # :param page_range:    #new page_range class with to write to disk
-    # :param num:           #page_range number       
-    def write_new_page_range(self, page_range, num):
-        self.disk.write_page_range(page_range, num, self.table.name)
+        return num_removed
+
+    ### Drops a tail page no record points to anymore ###
+    # :param table:         #Table that owns the page
+    # :param pool_key:      #Consists of a tuple in the form of (table_name, page_idx, page_range_idx)
+    # :returns tuple:       #(bytes the page held in memory, bytes of its extent), None if the page stays
+    # :brief    :           #A page that is pinned, being flushed or being prefetched stays, a later merge drops it
+    #                       #Otherwise it leaves the pool without being written and is unloaded
+    #                       #Its extent is freed (see DiskManager.free_page) and its slot too (see PageRange.free_tail_page)
+    #                       #All under the page's stripe lock, so a ring or prefetch that still has the page object loads nothing
+    def drop_page(self, table, pool_key):
+        table_name, page_idx, page_range_idx = pool_key
+        page_range = table.page_ranges[page_range_idx] # type: PageRange
+        page = page_range.get_page(page_idx) # type: Page
+
+        hashed = self.hash(pool_key, len(self.load_locks))
+        with self.pop_locks[hashed]:
+            if self.pins.get(pool_key, 0) > 0 or self.merge_pins.get(pool_key, 0) > 0:
+                return None
+
+            with self.pool_lock:
+                if pool_key in self.flushing or pool_key in self.prefetching:
+                    return None
+
+                resident = self.pages.pop(pool_key, None)
+                if resident is not None:
+                    self._untrack(pool_key, resident)
+                    self.table_pages[table_name] -= 1
+                    self.policy.remove(pool_key)
+                self.resident_bytes -= self.page_bytes.pop(pool_key, 0)
+                self.prefetched.discard(pool_key)
+                self.loaded_off_pool = [item for item in self.loaded_off_pool if item[0] != pool_key]
+
+            with page.latch:
+                memory_bytes = page.num_bytes
+                page.is_dirty = False
+                page.unload()
+
+            disk_bytes = self.disk.free_page(table_name, (page_idx, page_range_idx))
+            page_range.free_tail_page(page_idx)
+
+        return memory_bytes, disk_bytes
 
     ### Creates a hash for a page ###
-    # :param page_key:      #Consists of a tuple in the form of (page_idx, page_range_idx)
-    def hash(self, page_key, num):
-        to_hash = page_key[0] + (100 * (page_key[1] +1))
-        hashed = to_hash % num
-        return hashed
+    # :param pool_key:      #Consists of a tuple in the form of (table_name, page_idx, page_range_idx)
+    # :param num:           #Number of stripes
+    # :brief    :           #Tuple hashing mixes all three parts, so pages of nearby pageranges
+    #                       #Or of different tables don't land on the same stripe
+    def hash(self, pool_key, num):
+        return hash(pool_key) % num
 
     ### Calls on diskmanager to load page from disk ###
-    # :param page_key:      #Consists of a tuple in the form of (page_idx, page_range_idx)
+    # :param pool_key:      #Consists of a tuple in the form of (table_name, page_idx, page_range_idx)
     # :param page:          #Page to be added
-    def _load_from_disk(self, page_key, page):
-        hashed = self.hash(page_key, len(self.load_locks))
+    def _load_from_disk(self, pool_key, page):
+        hashed = self.hash(pool_key, len(self.load_locks))
         lock = self.load_locks[hashed]
+        table_name, page_idx, page_range_idx = pool_key
 
         with lock:
             if not page.is_loaded:
-                self.disk.import_page(page, page_key, self.table, self.table.name)
+                start = perf_counter()
+                self.disk.import_page(page, (page_idx, page_range_idx), self.tables[table_name], table_name)
+                self.load_latency.record(perf_counter() - start)
                 
             return page
     
     ### Calls on diskmanager to write page to disk ###
-    # :param page_key:      #Consists of a tuple in the form of (page_idx, page_range_idx)
+    # :param pool_key:      #Consists of a tuple in the form of (table_name, page_idx, page_range_idx)
     # :param page:          #Page to be added
-    def _write_to_disk(self, page_key, page):
-        self.disk.write_page(page, page_key, self.table, self.table.name)
-        page.is_dirty = False
+    def _write_to_disk(self, pool_key, page):
+        table_name, page_idx, page_range_idx = pool_key
+        version = page.version
+        start = perf_counter()
+        self.disk.write_page(page, (page_idx, page_range_idx), self.tables[table_name], table_name)
+        self.write_latency.record(perf_counter() - start)
+        page.mark_clean(version)
 
     ### Adds a pin to a page ###
-    # :param page_key:      #Consists of a tuple in the form of (page_idx, page_range_idx)
-    def pin(self, page_key):
-        self.pins[page_key] += 1
+    # :param pool_key:      #Consists of a tuple in the form of (table_name, page_idx, page_range_idx)
+    # :param hashed:        #Stripe of the pool key if the caller already has it
+    def pin(self, pool_key, hashed=None):
+        if hashed is None:
+            hashed = self.hash(pool_key, len(self.pin_locks))
 
-        logging.debug("{}: {} {} {}".format(threading.get_ident(), "bp.pin", page_key, self.pins[page_key]))
+        with self.pin_locks[hashed]:
+            pins = self.pins.get(pool_key, 0) + 1
+            self.pins[pool_key] = pins
+
+        logging.debug("{}: {} {} {}".format(threading.get_ident(), "bp.pin", pool_key, pins))
 
     ### Removes a pin to a page ###
-    # :param page_key:      #Consists of a tuple in the form of (page_idx, page_range_idx)
-    def unpin(self, page_key):
-        if self.pins[page_key] != 0:
-            self.pins[page_key] -= 1
+    # :param pool_key:      #Consists of a tuple in the form of (table_name, page_idx, page_range_idx)
+    def unpin(self, pool_key):
+        with self.pin_locks[self.hash(pool_key, len(self.pin_locks))]:
+            pins = self.pins.get(pool_key, 0) - 1
+            if pins > 0:
+                self.pins[pool_key] = pins
+            else:
+                self.pins.pop(pool_key, None)
 
-        logging.debug("{}: {} {} {}".format(threading.get_ident(), "bp.unpin", page_key, self.pins[page_key]))
+        logging.debug("{}: {} {} {}".format(threading.get_ident(), "bp.unpin", pool_key, max(pins, 0)))
+
+    ### Counts pins that no open PageHandles holds ###
+    # :returns int:         #Pins taken with get_page(pin=True) or pin and never released
+    # :brief    :           #Pins of inserts and updates that are running also count while they run
+    #                       #So the number is only exact when the database is idle
+    def leaked_pins(self):
+        total = sum(list(self.pins.values()))
+        with self.stats_lock:
+            return max(0, total - self.handle_pins)
 
     ### Adds a merge pin to a page ###
-    # :param page_key:      #Consists of a tuple in the form of (page_idx, page_range_idx)
-    def pin_merge(self, page_key):
-        logging.debug("%s: %s %s", threading.get_ident(), "start bp.pin_merge", page_key)
+    # :param pool_key:      #Consists of a tuple in the form of (table_name, page_idx, page_range_idx)
+    def pin_merge(self, pool_key):
+        logging.debug("%s: %s %s", threading.get_ident(), "start bp.pin_merge", pool_key)
 
-        if page_key in self.merge_pins:
-            self.merge_pins[page_key] += 1
+        if pool_key in self.merge_pins:
+            self.merge_pins[pool_key] += 1
         else:
-            self.merge_pins[page_key] = 1
+            self.merge_pins[pool_key] = 1
 
-        logging.debug("{}: {} {} {}".format(threading.get_ident(), "bp.pin_merge", page_key, self.merge_pins[page_key]))
+        logging.debug("{}: {} {} {}".format(threading.get_ident(), "bp.pin_merge", pool_key, self.merge_pins[pool_key]))
 
     ### Removes a merge pin to a page ###
-    # :param page_key:      #Consists of a tuple in the form of (page_idx, page_range_idx)
-    def unpin_merge(self, page_key):
-        logging.debug("%s: %s %s", threading.get_ident(), "start bp.unpin_merge", page_key)
-        if self.merge_pins[page_key] != 0:
-            self.merge_pins[page_key] -= 1
+    # :param pool_key:      #Consists of a tuple in the form of (table_name, page_idx, page_range_idx)
+    def unpin_merge(self, pool_key):
+        logging.debug("%s: %s %s", threading.get_ident(), "start bp.unpin_merge", pool_key)
+        if self.merge_pins[pool_key] != 0:
+            self.merge_pins[pool_key] -= 1
 
-        logging.debug("{}: {} {} {}".format(threading.get_ident(), "end bp.unpin_merge", page_key, self.merge_pins[page_key]))
+        logging.debug("{}: {} {} {}".format(threading.get_ident(), "end bp.unpin_merge", pool_key, self.merge_pins[pool_key]))
 
     ### Unloads pages that were in a mergejob ###
-    # :brief    :       #All pages marked for removal by _pop_pages that couldn't be removed since they were being merged
-                        #Are removed if the are not pinned and written to disk if dirty
-    def flush_unpooled(self):
+    # :param table_name:    #Only flush the pages of this table
+    # :brief    :           #All pages marked for removal by _pop_pages that couldn't be removed since they were being merged
+    #                       #Are removed if the are not pinned and written to disk if dirty
+    #                       #Pages that went back into the pool in the meantime are left alone
+    def flush_unpooled(self, table_name):
         logging.debug("%s: %s", threading.get_ident(), "start bp.flush_unpooled")
-        while self.loaded_off_pool:
-            page_key, page_to_pop = self.loaded_off_pool.pop()
-            logging.debug("%s: %s %s", threading.get_ident(), "considering bp.flush_unpooled", page_key)
 
-            if self.pins[page_key] > 0:
-                logging.debug("%s: Was about to flush a page that was pinned", threading.get_ident())
-                continue
+        with self.pool_lock:
+            to_flush = [item for item in self.loaded_off_pool if item[0][0] == table_name]
+            self.loaded_off_pool = [item for item in self.loaded_off_pool if item[0][0] != table_name]
+
+        for pool_key, page_to_pop in to_flush:
+            logging.debug("%s: %s %s", threading.get_ident(), "considering bp.flush_unpooled", pool_key)
+
+            hashed = self.hash(pool_key, len(self.load_locks))
+            with self.pop_locks[hashed]:
+                if pool_key in self.pages:
+                    continue
+
+                if self.pins.get(pool_key, 0) > 0 or self._is_flushing(pool_key):
+                    logging.debug("%s: Was about to flush a page that was pinned", threading.get_ident())
+                    self._reinstate(pool_key, page_to_pop)
+                    continue
+
+                with page_to_pop.latch:
+                    if page_to_pop.is_dirty:
+                        self._write_to_disk(pool_key, page_to_pop)
+
+                    page_to_pop.unload()
+
+                logging.debug("{}: {} {} {}".format(threading.get_ident(), "bp.flush_unpooled unloaded item", pool_key, self.pins.get(pool_key, 0)))
+
+
+### Private frames of a thread in bulk access mode ###
+# Ordered oldest first, once the ring is full the oldest frames fall out
+# Frames can be added by the prefetch threads so the ring has its own lock
+# A prefetch can land after the thread left bulk access mode, the ring is drained by then
+class BufferRing:
+
+    ### Initializer for the ring ###
+    # :param size: int      #Number of frames
+    def __init__(self, size):
+        self.size = size
+        self.frames = OrderedDict() # pool_key -> page
+        self.lock = threading.Lock()
+        self.drained = False
 
-            with page_to_pop.latch:
-                if page_to_pop.is_dirty:
-                    self._write_to_disk(page_key, page_to_pop)
+    ### Adds a frame ###
+    # :param pool_key:      #Consists of a tuple in the form of (table_name, page_idx, page_range_idx)
+    # :param page:          #Page that was loaded into the frame
+    # :returns list:        #(pool_key, page) of the frames that fell out of the ring
+    #                       #Once the ring is drained that is the frame itself, nobody would drop it later
+    def add(self, pool_key, page):
+        with self.lock:
+            if self.drained:
+                return [(pool_key, page)]
 
-                page_to_pop.unload()
-                if (page_key, page_to_pop) in self.pages:
-                    raise Exception("%s: (%s) flushed page that is in bufferpool", threading.get_ident(), "flush_unpooled")
+            self.frames[pool_key] = page
+            self.frames.move_to_end(pool_key)
 
-                logging.debug("{}: {} {} {} {}".format(threading.get_ident(), "bp.flush_unpooled unloaded item", page_key, self.pins[page_key], self.pins[page_key]))
\ No newline at end of file
+            over = []
+            while len(self.frames) > self.size:
+                over.append(self.frames.popitem(last=False))
+            return over
+
+    # Empties the ring for good and returns its (pool_key, page) frames
+    def drain(self):
+        with self.lock:
+            self.drained = True
+            frames = list(self.frames.items())
+            self.frames.clear()
+            return frames
+
+
+### Pins pages for the length of a query ###
+# Each page is resolved through the pool and pinned once, later reads of it skip the pool
+# Every pin is released when the block exits, even if the query raises
+# Pins only keep pages loaded, they don't order a query against a merge copying the same pages
+# For that update_row holds the table's update_row_lock shared and MergeJob.copy_data holds it exclusive
+#   with table.bp.handles() as pages:
+#       value = pages.read(pid)
+class PageHandles:
+
+    ### Initializer for the handles ###
+    # :param pool:          #TablePool of the table the pages belong to
+    def __init__(self, pool):
+        self.pool = pool # type: TablePool
+        self.pages = {} # page_key -> pinned page
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+        return False
+
+    ### Gets a pinned page ###
+    # :param pid: tuple     #Tuple of three (cell_idx, page_idx, page_range_idx)
+    # :returns Page:        #Page that stays loaded until the handles are released
+    def get(self, pid):
+        page_key = (pid[1], pid[2])
+        page = self.pages.get(page_key)
+        if page is None:
+            page = self.pool.get_page(pid, pin=True)
+            self.pages[page_key] = page
+
+            pool = self.pool.pool
+            with pool.stats_lock:
+                pool.handle_pins += 1
+
+        return page
+
+    ### Reads a cell ###
+    # :param pid: tuple     #Tuple of three (cell_idx, page_idx, page_range_idx)
+    # :returns bytes:       #Bytes of the cell
+    def read(self, pid):
+        return self.get(pid).read(pid[0])
+
+    # Unpins every page, the handles can be used again afterwards
+    def release(self):
+        for page_key in self.pages:
+            self.pool.unpin(page_key)
+
+        pool = self.pool.pool
+        with pool.stats_lock:
+            pool.handle_pins -= len(self.pages)
+        self.pages = {}
+
+
+### Per table view of the shared bufferpool ###
+# Keeps the interface tables use, taking page keys (page_idx, page_range_idx)
+# And turns them into pool keys (table_name, page_idx, page_range_idx)
+class TablePool:
+
+    ### Initializer for the table view ###
+    # :param pool:          #Shared BufferPool
+    # :param table:         #Table using the view
+    def __init__(self, pool, table):
+        self.pool = pool # type: BufferPool
+        self.table = table # type: Table
+
+    def _pool_key(self, page_key):
+        return (self.table.name, page_key[0], page_key[1])
+
+    def get_page(self, pid, pin=False):
+        return self.pool.get_page(self.table, pid, pin)
+
+    def add_page(self, pid, page, pin=False):
+        self.pool.add_page(self.table, pid, page, pin)
+
+    def pin(self, page_key):
+        self.pool.pin(self._pool_key(page_key))
+
+    def unpin(self, page_key):
+        self.pool.unpin(self._pool_key(page_key))
+
+    def pin_merge(self, page_key):
+        self.pool.pin_merge(self._pool_key(page_key))
+
+    def unpin_merge(self, page_key):
+        self.pool.unpin_merge(self._pool_key(page_key))
+
+    def flush_unpooled(self):
+        self.pool.flush_unpooled(self.table.name)
+
+    def resized(self, page_key, page):
+        self.pool.resized(self._pool_key(page_key), page)
+
+    def drop_page(self, page_key):
+        return self.pool.drop_page(self.table, self._pool_key(page_key))
+
+    def prefetch(self, page_keys):
+        return self.pool.prefetch(self.table, page_keys)
+
+    def bulk_access(self, ring_pages=None):
+        return self.pool.bulk_access(ring_pages)
+
+    # Page handles for one query, see PageHandles
+    def handles(self):
+        return PageHandles(self)
+
+    def stats(self):
+        return self.pool.stats()
+
+    ### Calls on diskmanager to create a new pagerange in disk ###
+    # :param page_range:    #new page_range class with to write to disk
+    # :param num:           #page_range number       
+    def write_new_page_range(self, page_range, num):
+        self.pool.disk.write_page_range(page_range, num, self.table.name)
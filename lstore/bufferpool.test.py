@@ -0,0 +1,480 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+from bufferpool import BufferRing
+from config import *
+from db import Database
+from metrics import Histogram
+from query import Query
+from time import sleep
+from util import int_from_bytes, int_to_bytes
+
+### Bufferpool behaviour on a small pool ###
+# Run from the lstore folder: python bufferpool.test.py
+# Each check is True if the pool did what it should have, the script exits 1 if one isn't
+
+POOL_PAGES = 16
+NUM_ROWS = CELLS_PER_PAGE * 6
+
+### Opens a database with a small pool and fills a table ###
+# :param folder:        #Folder of the database files
+# :param name:          #Name of the table
+# :param kwargs:        #Passed to Database
+# :returns tuple:       #(db, table, query)
+def open_filled(folder, name='Grades', num_rows=NUM_ROWS, **kwargs):
+    kwargs.setdefault('pool_bytes', POOL_PAGES * PAGE_SIZE)
+    kwargs.setdefault('warm_restart', False)
+    db = Database(**kwargs)
+    db.open(folder)
+    table = db.create_table(name, 5, 0)
+    query = Query(table)
+    for key in range(num_rows):
+        query.insert(key, key, key, key, key)
+    return db, table, query
+
+### Pids of the first cell of every base page of a table ###
+# :returns list:        #One pid (cell_idx, page_idx, page_range_idx) per page, in page order
+def base_page_pids(table):
+    pids = {}
+    for rid in range(1, table.prev_rid + 1, CELLS_PER_PAGE):
+        for col in range(table.num_total_cols):
+            pid = table.page_directory.pid(rid, col)
+            if pid is not None:
+                pids.setdefault((pid[1], pid[2]), pid)
+    return [pids[page_key] for page_key in sorted(pids, key=lambda page_key: (page_key[1], page_key[0]))]
+
+def pool_key(table, pid):
+    return (table.name, pid[1], pid[2])
+
+### Opens a database again, no page is loaded until it is asked for ###
+# :returns tuple:       #(db, table, query)
+def reopen(folder, name='Grades', **kwargs):
+    kwargs.setdefault('pool_bytes', POOL_PAGES * PAGE_SIZE)
+    kwargs.setdefault('warm_restart', False)
+    db = Database(**kwargs)
+    db.open(folder)
+    table = db.get_table(name)
+    return db, table, Query(table)
+
+# Waits until the prefetch threads loaded every page queued so far
+def wait_prefetch(pool):
+    while pool.prefetching:
+        sleep(0.01)
+
+results = {}
+
+### LRU (user-001) ###
+# A page read between every other read stays, pages read once leave oldest first
+# A pinned page stays however many pages are read after it
+folder = tempfile.mkdtemp()
+db, table, query = open_filled(folder)
+pool = db.my_manager.bp
+pool.prefetch_window = 0 # no read-ahead, only the pages read here go into the pool
+pids = base_page_pids(table)
+hot, pinned, cold = pids[0], pids[1], pids[2:]
+
+pool.get_page(table, pinned, pin=True)
+peak = 0
+for pid in cold:
+    pool.get_page(table, pid)
+    pool.get_page(table, hot)
+    peak = max(peak, pool.num_bytes)
+
+resident = pool.resident_pages()
+results['lru hot page stays'] = resident[-1] == pool_key(table, hot)
+results['lru pinned page stays'] = pool_key(table, pinned) in pool.pages
+results['lru oldest pages left'] = pool_key(table, cold[0]) not in pool.pages and pool_key(table, cold[-1]) in pool.pages
+cold_keys = [pool_key(table, pid) for pid in cold]
+cold_resident = [page_key for page_key in resident if page_key in cold_keys]
+results['lru resident in read order'] = cold_resident == cold_keys[len(cold_keys) - len(cold_resident):]
+results['lru within budget'] = peak <= pool.max_bytes
+
+pool.unpin(pool_key(table, pinned))
+db.close()
+shutil.rmtree(folder)
+
+### Replacement policies (user-002) ###
+# Every policy keeps a hot page through a scan of the table and stays within the budget
+for policy in ['lru', 'clock', '2q', 'arc']:
+    folder = tempfile.mkdtemp()
+    db, table, query = open_filled(folder, policy=policy)
+    pool = db.my_manager.bp
+    pids = base_page_pids(table)
+
+    peak = 0
+    for pid in pids[1:]:
+        pool.get_page(table, pids[0])
+        pool.get_page(table, pid)
+        peak = max(peak, pool.num_bytes)
+
+    stats = pool.stats()
+    results[policy + ' keeps hot page'] = pool_key(table, pids[0]) in pool.pages
+    results[policy + ' pool within budget'] = peak <= pool.max_bytes
+    results[policy + ' stats'] = stats['policy'] == policy and stats['hits'] > 0 and stats['misses'] > 0
+    db.close()
+    shutil.rmtree(folder)
+
+### Shared pool (user-003) ###
+# Two tables share one pool and its byte budget, each page is kept under its own table's key
+# Scanning one table leaves the other at least its floor of the pool
+folder = tempfile.mkdtemp()
+db, grades, query = open_filled(folder)
+pool = db.my_manager.bp
+pool.prefetch_window = 0
+other = db.create_table('Other', 5, 0)
+other_query = Query(other)
+for key in range(NUM_ROWS):
+    other_query.insert(key, key, key, key, key)
+
+results['shared one pool'] = grades.bp.pool is pool and other.bp.pool is pool and pool.max_bytes == POOL_PAGES * PAGE_SIZE
+
+first = base_page_pids(grades)[0]
+pool.get_page(grades, first)
+pool.get_page(other, first)
+results['shared keys per table'] = pool_key(grades, first) in pool.pages and pool_key(other, first) in pool.pages
+
+for pid in base_page_pids(other)[:POOL_PAGES // 2]:
+    pool.get_page(other, pid)
+
+peak = 0
+for _ in range(2):
+    for pid in base_page_pids(grades):
+        pool.get_page(grades, pid)
+        peak = max(peak, pool.num_bytes)
+
+floor = int(pool.max_pages / 2 * POOL_TABLE_FLOOR)
+table_pages = pool.stats()['table_pages']
+results['shared within budget'] = peak <= pool.max_bytes and pool.num_bytes == sum(pool.page_bytes.values())
+results['shared table floor'] = table_pages['Other'] >= floor and table_pages['Grades'] + table_pages['Other'] == len(pool.pages)
+db.close()
+shutil.rmtree(folder)
+
+### Background flusher (user-006) ###
+# The pool knows its dirty pages without looking at every page, nearest to eviction first
+# A flush takes them down to the low water mark, a forced one writes them all
+# Writes of adjacent extents of a segment are coalesced into one call
+folder = tempfile.mkdtemp()
+db, table, query = open_filled(folder, num_rows=CELLS_PER_PAGE * 3)
+pool = db.my_manager.bp
+flusher = pool.flusher
+flusher.stop() # flushes only when called below
+flushed_before = flusher.flushed_pages
+for key in range(CELLS_PER_PAGE * 3, CELLS_PER_PAGE * 5):
+    query.insert(key, key, key, key, key)
+
+dirty = [pool_key for pool_key in pool.resident_pages() if pool.pages[pool_key].is_dirty]
+results['flusher dirty set'] = pool.num_dirty == len(dirty) > flusher.high_water * pool.max_pages
+results['flusher dirty order'] = [pool_key for pool_key, _ in pool.dirty_pages()] == dirty
+results['flusher dirty nearest'] = [pool_key for pool_key, _ in pool.dirty_pages(2)] == dirty[:2]
+
+flushed = flusher.flush()
+results['flusher low water'] = flushed > 0 and pool.num_dirty == int(flusher.low_water * pool.max_pages)
+results['flusher wrote nearest'] = not any(pool.pages[pool_key].is_dirty for pool_key in dirty[:flushed])
+results['flusher under high water'] = flusher.flush() == 0
+
+flusher.flush(force=True)
+results['flusher force'] = pool.num_dirty == 0 and not pool.flushing and flusher.stats()['flushed_pages'] - flushed_before == len(dirty)
+
+disk = db.my_manager
+disk.make_table_folder('Scratch')
+writes = [(128, b'c' * 64), (0, b'a' * 64), (64, b'b' * 64), (512, b'd' * 64)]
+results['flusher coalesced'] = disk.write_page_batch('Scratch', 0, writes) == 2
+with open(disk.segment_path('Scratch', 0), 'rb') as segment_file:
+    data = segment_file.read(576)
+results['flusher coalesced data'] = data[:192] == b'a' * 64 + b'b' * 64 + b'c' * 64 and data[512:] == b'd' * 64
+db.close()
+shutil.rmtree(folder)
+
+### Dirty tracking (user-007) ###
+# Once everything is written, evicting pages that were only read writes nothing
+# A page written to is the only one written back when it leaves the pool
+folder = tempfile.mkdtemp()
+db, table, query = open_filled(folder)
+pool = db.my_manager.bp
+pool.prefetch_window = 0
+pool.flusher.stop()
+pool.flusher.flush(force=True)
+pids = base_page_pids(table)
+
+written = db.my_manager.io_stats()['pages_written']
+for pid in pids:
+    pool.get_page(table, pid)
+results['dirty read only writes nothing'] = db.my_manager.io_stats()['pages_written'] == written and pool.num_dirty == 0
+
+page = pool.get_page(table, pids[0])
+page.write_to_cell(int_to_bytes(7), 0)
+results['dirty one page'] = pool.dirty == {pool_key(table, pids[0])}
+
+for pid in pids[1:]:
+    pool.get_page(table, pid)
+results['dirty evicted page written'] = db.my_manager.io_stats()['pages_written'] == written + 1 and not page.is_dirty
+db.close()
+shutil.rmtree(folder)
+
+### Prefetch (user-008) ###
+# Queued pages are loaded in the background and count as useful once read
+# Two misses on neighbouring pages read the next pages of the pagerange ahead
+# Point reads don't prefetch, sums do
+folder = tempfile.mkdtemp()
+db, table, query = open_filled(folder)
+db.close()
+
+db, table, query = reopen(folder)
+pool = db.my_manager.bp
+pids = base_page_pids(table)
+page_keys = [(pid[1], pid[2]) for pid in pids[:4]]
+queued = pool.prefetch(table, page_keys)
+wait_prefetch(pool)
+results['prefetch loads'] = queued == 4 and all(pool_key(table, pid) in pool.pages for pid in pids[:4])
+results['prefetch skips loaded'] = pool.prefetch(table, page_keys) == 0
+
+for pid in pids[:4]:
+    pool.get_page(table, pid)
+stats = pool.stats()
+results['prefetch useful'] = stats['prefetch_issued'] == 4 and stats['prefetch_useful'] == 4 and stats['get_misses'] == 0
+
+# Pids are in page order, the two misses are neighbours in the first pagerange
+pool.get_page(table, pids[4])
+pool.get_page(table, pids[5])
+wait_prefetch(pool)
+ahead = [pid for pid in pids[6:6 + pool.prefetch_window] if pid[2] == pids[5][2]]
+results['prefetch read ahead'] = len(ahead) > 0 and all(pool_key(table, pid) in pool.pages for pid in ahead)
+
+prefetches = []
+prefetch_records = table.prefetch_records
+table.prefetch_records = lambda *args: prefetches.append(args) or prefetch_records(*args)
+for key in range(0, NUM_ROWS, 97):
+    query.select(key, 0, [1, 1, 1, 1, 1])
+    query.update(key, None, key + 1, None, None, None)
+results['prefetch not on point reads'] = prefetches == []
+
+query.sum(0, NUM_ROWS - 1, 2)
+results['prefetch on sums'] = len(prefetches) > 0
+db.close()
+shutil.rmtree(folder)
+
+### Buffer ring (user-009) ###
+# A ring keeps its newest frames, a sum in bulk access mode goes through one
+# The pages a sum reads leave the pool as it was and are unloaded once the ring drops them
+ring = BufferRing(2)
+fallen = [ring.add(page_key, None) for page_key in ['a', 'b', 'c']]
+results['ring oldest falls out'] = fallen == [[], [], [('a', None)]] and [page_key for page_key, _ in ring.drain()] == ['b', 'c']
+results['ring drained'] = ring.add('d', None) == [('d', None)] and ring.drain() == []
+
+folder = tempfile.mkdtemp()
+db, table, query = open_filled(folder)
+db.close()
+
+db, table, query = reopen(folder)
+pool = db.my_manager.bp
+pool.prefetch_window = 0
+hot = base_page_pids(table)[:6]
+for pid in hot:
+    pool.get_page(table, pid)
+resident = pool.resident_pages()
+
+pages_read = db.my_manager.io_stats()['pages_read']
+total = query.sum(0, NUM_ROWS - 1, 2)
+wait_prefetch(pool) # the last batch the sum prefetched can land after it returned
+loaded = [(page_idx, page_range_idx) for page_range_idx, page_range in enumerate(table.page_ranges)
+    for page_idx in range(page_range.base_page_count) if page_range.get_page(page_idx).is_loaded]
+results['ring sum'] = total == sum(range(NUM_ROWS)) and db.my_manager.io_stats()['pages_read'] > pages_read
+results['ring pool untouched'] = pool.resident_pages() == resident
+results['ring frames unloaded'] = sorted(loaded) == sorted(page_key[1:] for page_key in resident)
+
+with pool.bulk_access() as outer, pool.bulk_access() as inner:
+    results['ring not nested'] = outer is not None and inner is None
+with pool.bulk_access(ring_pages=0) as off:
+    pool.get_page(table, base_page_pids(table)[-1])
+results['ring off uses pool'] = off is None and pool_key(table, base_page_pids(table)[-1]) in pool.pages
+db.close()
+shutil.rmtree(folder)
+
+### Warm restart (user-010) ###
+# The pages resident at close are loaded again on open before any query asks for them
+# Prefetch threads load them side by side, so their order in the pool can differ a little
+# Entries of a table that no longer exists are skipped
+folder = tempfile.mkdtemp()
+db, table, query = open_filled(folder)
+db.close()
+
+db, table, query = reopen(folder)
+pool = db.my_manager.bp
+pool.prefetch_window = 0
+hot = base_page_pids(table)[::5]
+for pid in hot:
+    pool.get_page(table, pid)
+resident = pool.resident_pages()
+db.close()
+
+hot_pages_path = os.path.join(folder, 'Hot_Pages')
+with open(hot_pages_path, 'r+b') as hot_pages_file:
+    num_pages = int_from_bytes(hot_pages_file.read(CELL_SIZE_BYTES))
+    hot_pages_file.seek(0)
+    hot_pages_file.write(int_to_bytes(num_pages + 1))
+    hot_pages_file.seek(0, os.SEEK_END)
+    hot_pages_file.write(int_to_bytes(4) + b'Gone' + int_to_bytes(0) + int_to_bytes(0))
+
+db, table, query = reopen(folder, warm_restart=True)
+pool = db.my_manager.bp
+wait_prefetch(pool)
+results['warm same pages'] = sorted(pool.resident_pages()) == sorted(resident) and len(resident) == len(hot)
+for pid in hot:
+    pool.get_page(table, pid)
+results['warm no misses'] = pool.stats()['get_misses'] == 0
+db.close()
+
+db, table, query = reopen(folder, warm_restart=False)
+pool = db.my_manager.bp
+wait_prefetch(pool)
+results['warm off'] = pool.resident_pages() == []
+db.close()
+shutil.rmtree(folder)
+
+### Counters and histograms (user-011) ###
+# Histograms count values in power of two buckets keyed by their upper bound
+histogram = Histogram()
+for value in [0.5, 1, 3, 3, 100]:
+    histogram.record(value)
+snapshot = histogram.snapshot()
+results['stats histogram'] = snapshot['buckets'] == {1: 1, 2: 1, 4: 2, 128: 1} and \
+    (snapshot['count'], snapshot['mean'], snapshot['max'], snapshot['p50'], snapshot['p99']) == (5, 21.5, 100, 4, 128)
+results['stats empty histogram'] = Histogram(1e-6).snapshot()['p99'] == 0
+
+# Every get_page is a hit or a miss, every miss is one timed load, every eviction is in a batch
+folder = tempfile.mkdtemp()
+db, table, query = open_filled(folder)
+db.close()
+
+db, table, query = reopen(folder)
+pool = db.my_manager.bp
+pool.prefetch_window = 0
+pids = base_page_pids(table)
+for pid in pids + pids[-4:]:
+    pool.get_page(table, pid)
+pool.get_page(table, pids[-1], pin=True)
+
+stats = db.stats()
+results['stats hits and misses'] = (stats['get_misses'], stats['get_hits']) == (len(pids), 5)
+results['stats load latency'] = stats['load_latency_us']['count'] == len(pids) == stats['pages_read']
+results['stats evictions'] = stats['evictions'] == len(pids) - stats['num_pages'] and stats['evict_batch_pages']['count'] > 0
+results['stats pins'] = (stats['pinned_pages'], stats['leaked_pins']) == (1, 1) and stats['open_files'] == 1
+pool.unpin(pool_key(table, pids[-1]))
+db.close()
+shutil.rmtree(folder)
+
+### Stripe locks and pins (user-012) ###
+# Pool keys spread over the stripes, pageranges five apart no longer share one
+# Pins taken and dropped by many threads at once add up
+folder = tempfile.mkdtemp()
+db = Database(pool_bytes=POOL_PAGES * PAGE_SIZE, warm_restart=False)
+db.open(folder)
+pool = db.my_manager.bp
+pool_keys = [(name, page_idx, page_range_idx) for name in ['Grades', 'Other'] for page_idx in range(16) for page_range_idx in range(32)]
+stripes = {pool.hash(pool_key, NUM_PAGE_LATCHES) for pool_key in pool_keys}
+results['latch spread'] = len(stripes) > 0.8 * len(pool_keys)
+collisions = sum(1 for _, page_idx, page_range_idx in pool_keys
+    if pool.hash(('Grades', page_idx, page_range_idx), NUM_PAGE_LATCHES) == pool.hash(('Grades', page_idx, page_range_idx + 5), NUM_PAGE_LATCHES))
+results['latch ranges apart'] = collisions < 0.05 * len(pool_keys)
+
+NUM_PINS = 5000
+held = []
+def pin_unpin(keep):
+    for _ in range(NUM_PINS):
+        pool.pin(('Grades', 0, 0))
+        pool.unpin(('Grades', 0, 0))
+    for _ in range(keep):
+        pool.pin(('Grades', 0, 0))
+
+threads = [threading.Thread(target=pin_unpin, args=(keep,)) for keep in range(8)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+results['latch pins add up'] = pool.pins == {('Grades', 0, 0): sum(range(8))}
+for _ in range(sum(range(8))):
+    pool.unpin(('Grades', 0, 0))
+results['latch pins dropped'] = pool.pins == {}
+db.close()
+shutil.rmtree(folder)
+
+### Page handles (user-013) ###
+# A query pins each page once however often it reads it, and every pin is let go even if the query raises
+folder = tempfile.mkdtemp()
+db, table, query = open_filled(folder, num_rows=CELLS_PER_PAGE)
+pool = db.my_manager.bp
+pid = table.page_directory.pid(1, START_USER_DATA_COLUMN + 1)
+with table.bp.handles() as pages:
+    values = [int_from_bytes(pages.read(table.page_directory.pid(rid, START_USER_DATA_COLUMN + 1))) for rid in range(1, 11)]
+    results['handles pin once'] = pool.pins == {pool_key(table, pid): 1} and pool.handle_pins == 1 and pool.leaked_pins() == 0
+results['handles read'] = values == list(range(10))
+results['handles released'] = pool.pins == {} and pool.handle_pins == 0
+
+try:
+    with table.bp.handles() as pages:
+        pages.get(pid)
+        raise KeyError
+except KeyError:
+    pass
+results['handles released on raise'] = pool.pins == {} and pool.handle_pins == 0
+db.close()
+shutil.rmtree(folder)
+
+### Admission (user-014) ###
+# Threads inserting at once never take the pool over its budget
+# Only a page that comes in while every page is pinned goes over it, and is counted
+# It is then the only page that can be evicted, which takes the pool back under its budget
+folder = tempfile.mkdtemp()
+db = Database(pool_bytes=POOL_PAGES * PAGE_SIZE, warm_restart=False)
+db.open(folder)
+pool = db.my_manager.bp
+table = db.create_table('Grades', 5, 0)
+query = Query(table)
+
+peak = [0]
+done = threading.Event()
+def watch():
+    while not done.is_set():
+        with pool.pool_lock: # a page moves from admitting to num_bytes under it
+            peak[0] = max(peak[0], pool.num_bytes + pool.admitting * PAGE_SIZE)
+
+def insert(seed):
+    for key in range(seed, NUM_ROWS, 4):
+        query.insert(key, key, key, key, key)
+
+watcher = threading.Thread(target=watch)
+watcher.start()
+threads = [threading.Thread(target=insert, args=(seed,)) for seed in range(4)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+done.set()
+watcher.join()
+results['admit within budget'] = peak[0] <= pool.max_bytes and pool.stats()['overshoots'] == 0
+
+pool.prefetch_window = 0
+pids = base_page_pids(table)
+resident = [pid for pid in pids if pool_key(table, pid) in pool.pages]
+for pid in resident:
+    pool.pin(pool_key(table, pid))
+for pid in pids:
+    if len(pool.pages) >= pool.max_pages:
+        break
+    if pool_key(table, pid) not in pool.pages:
+        pool.get_page(table, pid, pin=True)
+        resident.append(pid)
+outside = [pid for pid in pids if pool_key(table, pid) not in pool.pages][0]
+pool.get_page(table, outside)
+results['admit all pinned'] = pool.stats()['overshoots'] > 0 and pool_key(table, outside) not in pool.pages and \
+    pool.num_bytes <= pool.max_bytes and all(pool_key(table, pid) in pool.pages for pid in resident)
+for pid in resident:
+    pool.unpin(pool_key(table, pid))
+db.close()
+shutil.rmtree(folder)
+
+print(results)
+sys.exit(0 if all(results.values()) else 1)
@@ -0,0 +1,57 @@
+from config import *
+
+import zlib
+
+### Codecs of pages compressed on disk ###
+# The data of a page (plain or encoded, see encoding.py) is compressed when the page is written to disk
+# And decompressed into the page when it is loaded, pages in the bufferpool are never compressed
+# The page header keeps the codec id and the compressed size (see page_rw_utils.page_header)
+# Codec 0 means the data is stored as is, which is also used when compressing doesn't make the data smaller
+# Other codecs can be added with register, their ids are stored on disk so they must not change
+
+NONE = 0
+
+CODECS = {} # id -> (name, compress, decompress)
+IDS = {} # name -> id
+
+### Adds a codec ###
+# :param codec_id: int      #Id stored in page headers, 1 to 255
+# :param name: string       #Name used in PAGE_COMPRESSION and Database(compression=...)
+# :param compress:          #Function from bytes to compressed bytes
+# :param decompress:        #Function from compressed bytes back to bytes
+def register(codec_id, name, compress, decompress):
+    if not 0 < codec_id < 256:
+        raise Exception('Codec id does not fit the page header', codec_id)
+    CODECS[codec_id] = (name, compress, decompress)
+    IDS[name] = codec_id
+
+register(1, 'zlib', lambda data: zlib.compress(data, ZLIB_LEVEL), zlib.decompress)
+
+### Compresses the data of a page ###
+# :param data:              #Data of the page
+# :param name: string       #Codec name, None to store the data as is
+# :returns tuple:           #(codec id, bytes to store), NONE and the data itself if compressing doesn't save space
+def compress(data, name):
+    if name is None:
+        return NONE, data
+
+    try:
+        codec_id = IDS[name]
+    except KeyError:
+        raise Exception('Unknown page codec', name)
+
+    compressed = CODECS[codec_id][1](bytes(data))
+    if len(compressed) >= len(data):
+        return NONE, data
+    return codec_id, compressed
+
+### Decompresses the data of a page ###
+# :param data:              #Bytes stored on disk
+# :param codec_id: int      #Codec id from the page header
+# :returns bytearray:       #Data of the page
+def decompress(data, codec_id):
+    try:
+        decompress = CODECS[codec_id][2]
+    except KeyError:
+        raise Exception('Unknown page codec', codec_id)
+    return bytearray(decompress(bytes(data)))
@@ -9,6 +9,8 @@ BLOCKS_PER_PAGE = 512
 CELLS_PER_PAGE = BLOCKS_PER_PAGE - 1
 PAGE_SIZE = 4096
 CELL_SIZE_BYTES = 4096 // BLOCKS_PER_PAGE
+COLUMN_TYPES = (8, 16, 32, 64) # bits a user column can be declared with, base pages of a narrow column hold more cells
+CELL_TYPECODES = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'} # array typecode of each cell size in bytes
 
 # Meta columns
 INDIRECTION_COLUMN = 0
@@ -21,9 +23,41 @@ RESERVED_TID = 2**64 - 1
 
 # Bufferpool
 MAX_POOL_PAGES = 200
+MAX_POOL_BYTES = MAX_POOL_PAGES * PAGE_SIZE # one pool shared by all tables of a database
+POOL_TABLE_FLOOR = 0.25 # eviction leaves a table at least this fraction of an equal share of the pool
+REPLACEMENT_POLICY = 'lru' # 'lru', 'clock', '2q' or 'arc'
+FLUSH_HIGH_WATER = 0.5 # background flusher starts once this fraction of the pool is dirty
+FLUSH_LOW_WATER = 0.25 # and stops once it is down to this fraction
+FLUSH_INTERVAL = 0.1 # seconds between flusher checks
+PREFETCH_WINDOW = 8 # pages read ahead once a pagerange is read sequentially, 0 turns read-ahead off
+PREFETCH_THREADS = 4 # threads loading prefetched pages
+BULK_RING_PAGES = 32 # frames of the private ring used by merges and range sums, 0 sends them through the pool
+NUM_PAGE_LATCHES = 4096 # stripe locks of the bufferpool, pages are spread over them by a hash of their pool key
+
+# Disk
+MAX_OPEN_FILES = 64 # segment files kept open by the diskmanager
+USE_MMAP = False # load pages as views of memory mapped segment files instead of copies
+WARM_RESTART = True # reload the pages that were in the pool at close when a database is opened
+ENCODE_MERGED_PAGES = True # merges store full base data pages with a compact encoding, see encoding.py
+PAGE_COMPRESSION = None # codec pages are compressed with when written to disk, 'zlib' or None, see compression.py
+ZLIB_LEVEL = 1 # fastest level, pages are small and written often
+
+# Segments
+SEGMENT_SIZE = 1 << 30 # a table's pages are packed into segment files of at most this many bytes, see segments.py
+SEGMENT_GROWTH = 1 << 20 # segment files grow by preallocating at least this many bytes, doubling their size
+SEGMENT_MAX_GROWTH = 64 << 20 # up to this many bytes at once
+EXTENT_ALIGN = 64 # size of page extents are rounded up to a multiple of this
+
+# Page directory
+PID_CELL_BITS = 16 # a pid is packed into one 64 bit int: cell index | inner page index | pagerange index, see pagedirectory.py
+PID_PAGE_BITS = 24 # the pagerange index gets the remaining 24 bits
 
 # Encoding
-SIZE_ENCODED_PAGE = 8 + PAGE_SIZE
+PAGE_HEADER_SIZE = 40 # header, zone map min, max and count, tail page columns, see page_rw_utils.encode_page_header
+SIZE_ENCODED_PAGE = PAGE_HEADER_SIZE + PAGE_SIZE
+ENCODED_SIZE_SHIFT = 32 # the page header keeps the data size of an encoded page above the number of records
+CELL_SIZE_SHIFT = 48 # and the cell size of a narrow page above that
+CODEC_SHIFT = 56 # and the codec of a compressed page above that, the data size is then the compressed size
 
 PR_META_OFFSETS = [
     0, # BP_NUM
@@ -31,4 +65,6 @@ PR_META_OFFSETS = [
     16, # END
 ]
 
-NUM_UPDATES_TRIGGER_MERGE = 250
\ No newline at end of file
+NUM_UPDATES_TRIGGER_MERGE = 250
+SCANS_BEFORE_INDEX = 2 # selects on a column without an index scan it this many times, the next one builds its index
+CUMULATIVE_UPDATES = False # tail records carry every column updated since the last merge, reads then need one tail hop
\ No newline at end of file
@@ -8,9 +8,14 @@ from diskmanager import DiskManager
 class Database():
 
     # Initialized with a diskmanager class which handles reading and writing files from and to disk
-    def __init__(self):
+    # :param policy: string         #Page replacement policy of the bufferpool, see replacement.py
+    # :param pool_bytes: int        #Size in bytes of the bufferpool shared by all tables
+    # :param use_mmap: bool         #Load pages as views of memory mapped files instead of copies
+    # :param warm_restart: bool     #Reload the pages that were in the bufferpool when the database was closed
+    # :param compression: string    #Codec pages are compressed with on disk ('zlib'), None to store them as is
+    def __init__(self, policy=REPLACEMENT_POLICY, pool_bytes=MAX_POOL_BYTES, use_mmap=USE_MMAP, warm_restart=WARM_RESTART, compression=PAGE_COMPRESSION):
         self.tables = {}
-        self.my_manager = DiskManager()
+        self.my_manager = DiskManager(policy=policy, max_bytes=pool_bytes, use_mmap=use_mmap, warm_restart=warm_restart, compression=compression)
         self.my_manager.my_database = self
         pass
     
@@ -21,6 +26,11 @@ class Database():
         self.my_manager.open_db()
         pass
     
+    ### Snapshot of the database counters ###
+    # :returns dict:            #Bufferpool, flusher and disk counters and histograms, see BufferPool.stats
+    def stats(self):
+        return self.my_manager.stats()
+
     ### Closes a database
     def close(self):
         self.my_manager.close_db()
@@ -31,9 +41,13 @@ class Database():
     # :param name: string         #Table name
     # :param num_columns: int     #Number of Columns: all columns are integer
     # :param key: int             #Index of table key in columns
+    # :param column_types: list   #Bits of each column (8, 16, 32 or 64), all 64 if None
+    #                             #Base pages of narrower columns hold more records
+    # :param cumulative: bool     #Tail records carry every column updated since the last merge
+    #                             #So a select reads at most one tail record, for bigger tail pages
 
-    def create_table(self, name, num_columns, key):
-        table = Table(name, num_columns, key, self.my_manager)
+    def create_table(self, name, num_columns, key, column_types=None, cumulative=CUMULATIVE_UPDATES):
+        table = Table(name, num_columns, key, self.my_manager, column_types, cumulative)
         self.tables[name] = table
         self.my_manager.make_table_folder(name)
         return table
@@ -4,11 +4,18 @@ from page_rw_utils import *
 from table import MetaRecord, Table
 from pagerange import PageRange
 from page import Page
+from bufferpool import BufferPool
+from filepool import FilePool
+from segments import PageLocations
+import compression
+import logging
 import os
+import threading
 
 PAGE_OFFSET = 1
 PAGE_RANGE_OFFSET = 2
 NUMBER_OF_DEXS = 3
+MAX_IOV = os.sysconf('SC_IOV_MAX') if hasattr(os, 'sysconf') else 1024
 
 ### Diskmanger Class ###
 # This class manages reading and writing data from and to disk
@@ -18,14 +25,35 @@ class DiskManager:
 
     ### Initizier Function ###
     # :param dir: string        #Path to the directory of the database files. Default is "database_files"
+    # :param policy: string     #Page replacement policy of the bufferpool, see replacement.py
+    # :param max_bytes: int     #Size in bytes of the bufferpool
+    # :param use_mmap: bool     #Load pages as views of memory mapped segment files
+    # :param warm_restart: bool #Reload the pages listed in the Hot_Pages file when the database is opened
+    # :param compression:       #Codec pages are compressed with when written, None to write them as is, see compression.py
     # :IV self.my_database: db  #Reference to the database using the diskmanager object
     #                           #When db class is initialized it will create a diskmanager object
     #                           #And set self.my_database equal to itself
+    # :IV self.bp: BufferPool   #Bufferpool shared by every table of the database
+    # :IV self.files: FilePool  #Open segment files
+    # :IV self.locations:       #Where each page of each table is in its segment files, see segments.py
     # :brief    :               #Has a refernce to all the pageranges to allow
     #                           #Loading and Unloading pages to correct location in disk
-    def __init__(self,  dir = "database_files"):
+    def __init__(self,  dir = "database_files", policy=None, max_bytes=MAX_POOL_BYTES, use_mmap=USE_MMAP, warm_restart=WARM_RESTART, compression=PAGE_COMPRESSION):
         self.my_database = None # type : db
         self.page_ranges = []
+        self.bp = BufferPool(self, policy, max_bytes)
+        self.files = FilePool()
+        self.use_mmap = use_mmap
+        self.warm_restart = warm_restart
+        self.compression = compression
+
+        self.io_lock = threading.Lock()
+        self.pages_written = 0
+        self.bytes_written = 0
+        self.pages_read = 0
+        self.bytes_read = 0
+
+        self.locations = {} # table folder -> PageLocations
 
         if(dir[-1] != '/'):
             dir += '/'
@@ -44,6 +72,64 @@ class DiskManager:
             path_list[0] = os.getenv('HOME')
         self.database_folder = '/'.join(path_list)
 
+    ### Counts page data written to disk ###
+    # :param num_pages: int     #Number of pages written
+    # :param num_bytes: int     #Number of bytes written
+    def _count_written(self, num_pages, num_bytes):
+        with self.io_lock:
+            self.pages_written += num_pages
+            self.bytes_written += num_bytes
+
+    ### Counts page data read from disk ###
+    # :param num_bytes: int     #Number of bytes read for one page
+    def _count_read(self, num_bytes):
+        with self.io_lock:
+            self.pages_read += 1
+            self.bytes_read += num_bytes
+
+    # Pages and bytes written to and read from segment files so far
+    def io_stats(self):
+        with self.io_lock:
+            return {
+                'pages_written': self.pages_written,
+                'bytes_written': self.bytes_written,
+                'pages_read': self.pages_read,
+                'bytes_read': self.bytes_read,
+            }
+
+    # Bufferpool stats plus the number of open segment files
+    def stats(self):
+        stats = self.bp.stats()
+        with self.files.lock:
+            stats['open_files'] = len(self.files.files)
+        return stats
+
+    ### Path of a segment file ###
+    # :param table_name: string     #Name of table that owns the segment
+    # :param segment: int           #Number of the segment in table, see segments.py
+    def segment_path(self, table_name, segment):
+        return self.database_folder + sanitize(table_name) + "/" + "segment_" + str(segment)
+
+    ### Borrows the open descriptor of a segment file ###
+    # :param table_name: string     #Name of table that owns the segment
+    # :param segment: int           #Number of the segment in table
+    # :param create: bool           #Create the file if it doesn't exist
+    def open_segment(self, table_name, segment, create=False):
+        key = (sanitize(table_name), segment)
+        return self.files.open(key, self.segment_path(table_name, segment), create)
+
+    # Page locations of a table, see segments.py
+    def table_locations(self, table_name):
+        with self.io_lock:
+            return self.locations.setdefault(sanitize(table_name), PageLocations())
+
+    ### Frees the disk space of a page that is gone ###
+    # :param table_name: string     #Name of table that owns the page
+    # :param page_key: tuple        #(inner_page_index, pagerange_index)
+    # :returns int:                 #Bytes freed in the segment files, reused by the next pages written (see PageLocations.release)
+    def free_page(self, table_name, page_key):
+        return self.table_locations(table_name).release(page_key)
+
     ### Creates a table folder ###
     # :param table_name: string        #Name of table to create folder for
     # :brief                    #Creates a folder for table files and makes name directory safe
@@ -108,22 +194,88 @@ class DiskManager:
             table_name = database_directory_file.read(table_name_len).decode('utf-8')
             key_col = int_from_bytes(database_directory_file.read(CELL_SIZE_BYTES))
             num_columns = int_from_bytes(database_directory_file.read(CELL_SIZE_BYTES))
+            column_types = list(database_directory_file.read(num_columns))
+            cumulative = bool(database_directory_file.read(1)[0])
 
-            new_table = Table(table_name,num_columns,key_col, self)
+            new_table = Table(table_name,num_columns,key_col, self, column_types, cumulative)
 
             num_page_ranges = int_from_bytes(database_directory_file.read(CELL_SIZE_BYTES))
-            new_table.page_ranges = [None]*num_page_ranges
-
-            for i in range(num_page_ranges):
-                new_table.page_ranges[i] = self.import_page_ranges(i, table_name)
+            new_table.page_ranges = self.import_page_ranges(table_name)
+            if len(new_table.page_ranges) != num_page_ranges:
+                raise Exception('Page locations do not match the database directory', table_name)
 
             self.my_database.tables[table_name] = new_table
             print(database_directory_file.read(CELL_SIZE_BYTES).decode('utf-8'))
         
         database_directory_file.close()
 
+        if self.warm_restart:
+            self.warm_pool()
+
         return True
 
+    ### Writes the pages that are in the bufferpool to the Hot_Pages file ###
+    #       --- Hot_Pages file format ---
+    #
+    #       Every piece of info is in 8 bytes (except table name).
+    #       Pages are in the order the bufferpool would evict them, hottest last
+    #       - Number of pages
+    #       For each page
+    #       - Length of table name
+    #       - Table Name (utf-8 encoded)
+    #       - Page index in pagerange
+    #       - Pagerange index
+    def write_hot_pages(self):
+        data = bytearray()
+
+        pool_keys = self.bp.resident_pages()
+        data += int_to_bytes(len(pool_keys))
+        for table_name, page_idx, page_range_idx in pool_keys:
+            data += int_to_bytes(len(table_name.encode('utf-8'))) + table_name.encode('utf-8')
+            data += int_to_bytes(page_idx)
+            data += int_to_bytes(page_range_idx)
+
+        with open(self.database_folder + "Hot_Pages", 'w+b') as binary_file:
+            binary_file.write(data)
+
+    ### Reloads the pages listed in the Hot_Pages file ###
+    # :returns int:     #Number of page loads that were queued
+    # :brief    :       #Only the hottest pages that fit in the bufferpool are loaded
+    #                   #The loads go through the prefetch threads, so open_db doesn't wait for them
+    #                   #Pages of tables or pageranges that no longer exist are skipped
+    def warm_pool(self):
+        try:
+            hot_pages_file = open(self.database_folder + "Hot_Pages", 'r+b')
+        except FileNotFoundError:
+            return 0
+
+        pool_keys = []
+        with hot_pages_file:
+            num_pages = int_from_bytes(hot_pages_file.read(CELL_SIZE_BYTES))
+            for _ in range(num_pages):
+                table_name_len = int_from_bytes(hot_pages_file.read(CELL_SIZE_BYTES))
+                table_name = hot_pages_file.read(table_name_len).decode('utf-8')
+                page_idx = int_from_bytes(hot_pages_file.read(CELL_SIZE_BYTES))
+                page_range_idx = int_from_bytes(hot_pages_file.read(CELL_SIZE_BYTES))
+                pool_keys.append((table_name, page_idx, page_range_idx))
+
+        num_queued = 0
+        # Coldest first, so the hottest pages end up most recently used
+        for table_name, page_idx, page_range_idx in pool_keys[-self.bp.max_pages:]:
+            table = self.my_database.tables.get(table_name)
+            if table is None or page_range_idx >= len(table.page_ranges):
+                continue
+
+            page_range = table.page_ranges[page_range_idx] # type: PageRange
+            if page_idx >= PAGE_RANGE_MAX_BASE_PAGES + page_range.tail_page_count:
+                continue
+            if page_idx < PAGE_RANGE_MAX_BASE_PAGES and page_idx >= page_range.base_page_count:
+                continue
+
+            num_queued += self.bp.prefetch(table, [(page_idx, page_range_idx)])
+
+        return num_queued
+
     ### Writes a database directory files ###
     #       --- db_directory_file format ---
     #
@@ -135,6 +287,8 @@ class DiskManager:
     #       - Table Name (utf-8 encoded)
     #       - Key Column (which column contains the primary key colunm)
     #       - Number of columns if the table
+    #       - Bits of each column (1 byte per column)
+    #       - Cumulative tail records (1 byte)
     #       - Number of pageranges in the table
     def write_db_directory(self):
         binary_file = open(self.database_folder + "Database_Directory", 'w+b')
@@ -148,6 +302,8 @@ class DiskManager:
             data += int_to_bytes(len(name.encode('utf-8'))) + name.encode('utf-8')
             data += int_to_bytes(table.key_col)
             data += int_to_bytes(table.num_columns)
+            data += bytes(table.column_types)
+            data += bytes([table.cumulative])
             data += int_to_bytes(len(table.page_ranges))
             data += self.separator
 
@@ -155,12 +311,24 @@ class DiskManager:
         binary_file.close()
 
     ### Closes a database and writes the data to disk ###
-    # :brief    :       #Writes a db directory files
+    # :brief    :       #Stops the prefetch threads and the background flusher
+    #                   #Warns about pins that were never released
+    #                   #Writes a db directory files
+    #                   #Writes the list of pages in the bufferpool for the next open
     #                   #Writes a table meta file for each table
-    #                   #Writes the page ranges of each table
+    #                   #Writes the page ranges of each table and where their pages are
+    #                   #Closes the open segment files
     #                   #Deletes the database from RAM
     def close_db(self):
+        self.bp.stop_prefetch()
+        self.bp.flusher.stop()
+
+        leaked_pins = self.bp.leaked_pins()
+        if leaked_pins:
+            logging.warning("%s: (%s) %d bufferpool pins were never released", threading.get_ident(), "close_db", leaked_pins)
+
         self.write_db_directory()
+        self.write_hot_pages()
 
 
         for table_name, table in self.my_database.tables.items():
@@ -168,6 +336,10 @@ class DiskManager:
 
             for i, pagerange in enumerate(table.page_ranges):
                 self.write_page_range(pagerange, i, table_name)
+
+            self.write_page_locations(table_name)
+
+        self.files.close_all()
         del self.my_database
         
     # Todo
@@ -197,10 +369,9 @@ class DiskManager:
     #   - Columns
     #   - Special code indicating end of deleted records or no deleted records
     # - MetaRecords
-    #   - BaseRecords
+    #   - BaseRecords, their columns follow from the rid (see BaseLayout.pid)
     #       - Rid
     #       - Key
-    #       - Columns
     #
     #   - TailRecords
     #       - Rid
@@ -221,6 +392,9 @@ class DiskManager:
 
         data = bytearray()
 
+        # The deleted records have their own section, they are not counted with the others
+        deleted_records = table.page_directory.pop(0, None)
+
         # Write some globals
         data += int_to_bytes(table.prev_rid) # rid
         data += int_to_bytes(table.prev_tid) # tid
@@ -228,12 +402,10 @@ class DiskManager:
         data += int_to_bytes(table.num_rows)
 
         # Writing deleted records with special key d0000000
-        if 0 in table.page_directory:
+        if deleted_records is not None:
             # print("Writing deleted records")
 
             data += 'bdeleted'.encode('utf-8')
-            
-            deleted_records = table.page_directory.pop(0)
 
             data += int_to_bytes(len(deleted_records)) # num deleted records
             key = 'd0000000'.encode('utf-8')
@@ -267,18 +439,11 @@ class DiskManager:
 
         # key is the rid and value are the metarecords
         # columns point to the location in data
-        num_of_rids = len(table.page_directory)
-        rids = list(table.page_directory.keys()) # type : dict
-        metarecords = list(table.page_directory.values())
-        
+        # MetaRecords are made one at a time from the packed directory
         tail_flag = False
-        counter = 0
 
         # Write all Meta records
-        while counter < num_of_rids:
-
-            current_rid = rids[counter]
-            current_record = metarecords[counter]
+        for current_rid, current_record in table.page_directory.items():
 
             tail_flag = current_rid > table.prev_rid
 
@@ -286,16 +451,9 @@ class DiskManager:
             data += int_to_bytes(current_rid)
             data += int_to_bytes(current_record.key)
 
-            # Write columns of base record
-            if not tail_flag:
-
-                for column in current_record.columns:
-
-                    for dex in column:
-                        data += int_to_bytes(dex)
-
+            # The columns of a base record follow from its RID, see BaseLayout.pid
             # Write columns of tail record
-            else:
+            if tail_flag:
                 the_columns = bytearray()
                 schema = 0
 
@@ -315,8 +473,6 @@ class DiskManager:
 
                 data += schema + the_columns
 
-            counter += 1
-        
         binary_file.write(data)
         binary_file.close()
 
@@ -388,20 +544,10 @@ class DiskManager:
             columns = [None for _ in range(table.num_total_cols)]
             
             # print('tail flag', tail_flag)
-            # Read columns of base record
-
-            if not tail_flag:
-                for i in range(table.num_total_cols):          
-                    column = []
-
-                    for j in range(NUMBER_OF_DEXS):
-                        val = int_from_bytes(meta_file.read(CELL_SIZE_BYTES))
-                        column.append(val)
-
-                    columns[i] = column
+            # Base records only have their rid and key, see write_table_meta
 
             # Read columns of tail record
-            else:
+            if tail_flag:
 
                 # Tells which columnbs to skip
                 schema = int_from_bytes(meta_file.read(CELL_SIZE_BYTES))
@@ -429,8 +575,13 @@ class DiskManager:
                     table.page_directory[rid].append(metarecord)
                 else:
                     table.page_directory[rid] = [metarecord]
-            else:
+            elif tail_flag:
                 table.page_directory[rid] = metarecord
+            else:
+                table.page_directory.set_base(rid, key)
+
+        # Cuts off the slots of the tail records merges reclaimed before the database was closed
+        table.page_directory.compact_tails(table.prev_tid)
 
         meta_file.close()
         return table
@@ -442,138 +593,221 @@ class DiskManager:
     # :param pagerange_num: #Number of the pagerange in table
     # :param table_name:    #Name of table that owns pagerange
     # :return bool:         #True if page range was written succesfully
-    # :brief    :           #Opens or creates a pagerange file on disk
-    #                       #Writes num of base and taile pages in pagerange
-    #                       #Then writes the base pages, and then tail pages
+    # :brief    :           #Writes the dirty base and tail pages to the table's segments, clean pages are already on disk
+    #                       #The number of pages of the pagerange is kept in the locations file, see write_page_locations
     def write_page_range(self, pr, pagerange_num, table_name):
-        # print("Here")
-        try:
-            binary_file = open(self.database_folder + "/" + sanitize(table_name) + "/" + "pagerange_" + str(pagerange_num), "r+b")
-        except FileNotFoundError:
-            binary_file = open(self.database_folder + "/" + sanitize(table_name) + "/" + "pagerange_" + str(pagerange_num), "w+b")
-
-        # data = encode_pagerange(pagerange)
+        locations = self.table_locations(table_name)
 
-        # Write Meta
-        binary_file.write(int_to_bytes(pr.base_page_count))
-        binary_file.write(int_to_bytes(pr.tail_page_count))
-
-        # Write Base Pages
-        for i in range(pr.base_page_count):
-            page = pr.base_pages[i]
+        pages = pr.base_pages[:pr.base_page_count] + pr.tail_pages[:pr.tail_page_count]
+        inner_idxs = list(range(pr.base_page_count)) + [PAGE_RANGE_MAX_BASE_PAGES + i for i in range(pr.tail_page_count)]
+        for inner_idx, page in zip(inner_idxs, pages):
+            page_key = (inner_idx, pagerange_num)
             if page.is_dirty:
-                binary_file.write(encode_page(page))  # 8 + PAGE_SIZE
-            else:
-                binary_file.seek(SIZE_ENCODED_PAGE, 1)
-
-        # Write Tail Pages
-        for i in range(pr.tail_page_count):
-            page = pr.tail_pages[i]
-            if page.is_dirty:
-                binary_file.write(encode_page(page))  # 8 + PAGE_SIZE
-            else:
-                binary_file.seek(SIZE_ENCODED_PAGE, 1)
-
-        binary_file.close()
+                version = page.version
+                page.zone_dirty = False
+                self.write_page(page, page_key, None, table_name)
+                page.mark_clean(version)
+            elif page.zone_dirty:
+                # Updates widen the zone map of a base page without writing to it
+                page.zone_dirty = False
+                segment, offset, _ = locations.locate(page_key)
+                encoded = encode_page_zone(page)
+                with self.open_segment(table_name, segment) as fd:
+                    os.pwrite(fd, encoded, offset + CELL_SIZE_BYTES)
+                self._count_written(0, len(encoded))
 
         return True
 
-    ### Helper function to find start of page data in pagerange file ###
-    # :param page_key: tuple    #Tuple of two consisting of (inner page index, pagerange index)
-    # :param num_base_pages:    #Number of the base pages in pagerange
-    # :returns int:             #Length of need offset from start of pagerange file
-    def get_page_offset_in_pr(self, page_key, num_base_pages):
-        inner_idx, pagerange_idx = page_key
-        
-        idx = inner_idx
-        if inner_idx >= PAGE_RANGE_MAX_BASE_PAGES:
-            idx = num_base_pages
-            idx += inner_idx - PAGE_RANGE_MAX_BASE_PAGES
-
-        # Skip meta
-        offset = PR_META_OFFSETS[-1]
-
-        # Go to actual offset
-        offset += SIZE_ENCODED_PAGE * idx
-
-        return offset
+    ### Writes where the pages of a table are ###
+    # :param table_name:    #Name of table
+    #
+    #       --- Locations file format ---
+    #
+    #       Every piece of info is 8 bytes.
+    #       - Number of pageranges
+    #       - For each pagerange: number of base pages, number of tail pages
+    #       - Page locations, see PageLocations.encode
+    def write_page_locations(self, table_name):
+        table = self.my_database.tables[table_name]
 
+        data = bytearray()
+        data += int_to_bytes(len(table.page_ranges))
+        for pr in table.page_ranges:
+            data += int_to_bytes(pr.base_page_count)
+            data += int_to_bytes(pr.tail_page_count)
+        data += self.table_locations(table_name).encode()
+
+        with open(self.locations_path(table_name), 'w+b') as binary_file:
+            binary_file.write(data)
+
+    # Path of the locations file of a table
+    def locations_path(self, table_name):
+        return self.database_folder + sanitize(table_name) + '/' + sanitize(table_name) + '_locations'
+
+    ### Encodes a page and picks where it goes ###
+    # :param page:              #Loaded page
+    # :param page_key:          #Tuple of two (inner_page_index, pagerange_index)
+    # :param table_folder:      #Table folder of the table
+    # :returns tuple:           #(segment, offset, bytes to write there), see encode_for_write and PageLocations.place
+    def prepare_write(self, page, page_key, table_folder):
+        encoded = self.encode_for_write(page)
+        segment, offset, _ = self.table_locations(table_folder).place(page_key, PAGE_HEADER_SIZE + page.stored_bytes)
+        return segment, offset, encoded
 
     ### Write page to disk ###
     # :param page:              #Page whose data will be written to disk
     # :param page_key:          #Page_key is a tuple of two (Inner_page_index, pagerange_index)
     # :param table:             #Table the owns the page
     # :param table_folder:      #Table folder of the table
-    # :param num_base_pages:    #Number of base pages in pagerange the contains page
-    def write_page(self, page, page_key, table, table_folder, num_base_pages = None):
+    def write_page(self, page, page_key, table, table_folder):
         if page._data == None:
             raise Exception("Page not loaded")
-        
-        inner_idx, pr_idx = page_key
-        filepath = self.database_folder + table_folder + "/" + "pagerange_" + str(pr_idx)
-        try:
-            binary_file = open(filepath, "r+b")
-        except:
-            binary_file = open(filepath, "w+b")
 
-        if num_base_pages == None:
-            num_base_pages = table.page_ranges[pr_idx].base_page_count
+        segment, offset, encoded = self.prepare_write(page, page_key, table_folder)
+        self.write_page_batch(table_folder, segment, [(offset, encoded)])
 
-        offset = self.get_page_offset_in_pr(page_key, num_base_pages)
-        binary_file.seek(offset)
-        
-        # What to write
+    ### Bytes to write at the start of a page's extent ###
+    # :param page:              #Loaded page
+    # :brief    :               #A memory mapped page only needs its header, the data is already in the mapping
+    #                           #Other pages are compressed with the diskmanager's codec
+    #                           #The size of the data in the extent is kept so the next load reads only that much
+    def encode_for_write(self, page):
+        if self.is_mapped(page):
+            page.stored_bytes = page.num_bytes
+            return encode_page_header(page)
 
-        encoded = encode_page(page)
-        binary_file.write(encoded)
+        encoded = encode_page(page, self.compression)
+        page.stored_bytes = len(encoded) - PAGE_HEADER_SIZE
+        return encoded
 
-        binary_file.close()
+    ### Writes several pages of one segment file ###
+    # :param table_folder:      #Table folder of the table
+    # :param segment:           #Number of the segment in table
+    # :param writes: list       #Tuples of (offset, bytes), see prepare_write
+    # :returns int:             #Number of write calls made
+    # :brief    :               #Preallocates the segment up to the extents (see PageLocations.grow)
+    #                           #Then sorts the writes by offset and writes runs of adjacent ones with one os.pwritev
+    def write_page_batch(self, table_folder, segment, writes):
+        writes = sorted(writes, key=lambda write: write[0])
+        num_calls = 0
+
+        with self.open_segment(table_folder, segment, create=True) as fd:
+            self.table_locations(table_folder).grow(segment, fd)
+            run_offset = None
+            run = []
+            run_end = None
+
+            for offset, data in writes:
+                if run and offset == run_end and len(run) < MAX_IOV:
+                    run.append(data)
+                    run_end += len(data)
+                    continue
+
+                if run:
+                    os.pwritev(fd, run, run_offset)
+                    num_calls += 1
+
+                run_offset = offset
+                run = [data]
+                run_end = offset + len(data)
+
+            if run:
+                os.pwritev(fd, run, run_offset)
+                num_calls += 1
+
+        self._count_written(len(writes), sum(len(data) for _, data in writes))
+        return num_calls
+
+    # True if the page data is a view of a memory mapped segment file
+    def is_mapped(self, page):
+        return isinstance(page._data, memoryview)
 
     ### Imports a page from disk ###
+    # :brief    :               #With use_mmap the page data is a view of the mapped file, no copy is made
+    #                           #Unless the page is compressed, see compression.py
     # :param page:              #Page whose data will be loaded from disk, if not given makes blank object
     # :param page_key:          #Page_key is a tuple of two (Inner_page_index, pagerange_index)
     # :param table:             #Table the owns the page
     # :param table_folder:      #Table folder of the table
-    # :param num_base_pages:    #Number of base pages in pagerange the contains page
-    def import_page(self, page: Page, page_key, table, table_folder, num_base_pages = None):
-        inner_idx, pr_idx = page_key
+    def import_page(self, page: Page, page_key, table, table_folder):
+        extent = self.table_locations(table_folder).locate(page_key)
+        if extent is None:
+            return False
+        segment, offset, size = extent
 
         try:
-            binary_file = open(self.database_folder + "/" + table_folder + "/" + "pagerange_" + str(pr_idx), 'rb')
+            encoded = None
+            if self.use_mmap:
+                key = (sanitize(table_folder), segment)
+                mapping = self.files.map(key, self.segment_path(table_folder, segment), offset + size)
+                if mapping is not None:
+                    encoded = memoryview(mapping)[offset:offset + size]
+
+            # Not mapping, or the page is past the end of the file
+            if encoded is None:
+                with self.open_segment(table_folder, segment) as fd:
+                    encoded = os.pread(fd, size, offset)
         except FileNotFoundError:
             return False
-
-        if num_base_pages == None:
-            num_base_pages = table.page_ranges[pr_idx].base_page_count
-
-        offset = self.get_page_offset_in_pr(page_key, num_base_pages)
         
-        # Read num_records
-        binary_file.seek(offset)
-        num_records = ifb(binary_file.read(8))
+        # Read num_records, the size of the data if the page is encoded or compressed, the cell size and the codec
+        # The zone map in memory is never older than the one on disk, so it is left as is
+        num_records, num_bytes, page.cell_size, codec_id = split_page_header(ifb(encoded[:8]))
+        page.stored_bytes = num_bytes
+        self._count_read(size)
         
-        # Read data
-        data = bytearray(binary_file.read(PAGE_SIZE))
+        # Read data, a mapped page is used in place, a compressed one is decompressed into the page
+        if codec_id != compression.NONE:
+            data = compression.decompress(encoded[PAGE_HEADER_SIZE:PAGE_HEADER_SIZE + num_bytes], codec_id)
+        elif isinstance(encoded, memoryview):
+            data = encoded[PAGE_HEADER_SIZE:PAGE_HEADER_SIZE + num_bytes]
+        else:
+            data = bytearray(encoded[PAGE_HEADER_SIZE:PAGE_HEADER_SIZE + num_bytes])
 
         page.num_records = num_records
         page.load(data, num_records)
         # todo: is_dirty, pinning
 
-        binary_file.close()
-
-
-    ### Imports pagerange of table ###
-    # :param pagerangenum:  #Number of pagerange in table
-    # :param table_folder:  #Folder of table that owns pagerange
-    # :brief                #Loads pagerange info, but does not load pages
-    def import_page_ranges(self, pagerange_num, table_folder):
 
+    ### Imports the pageranges of a table ###
+    # :param table_folder:  #Folder of table that owns the pageranges
+    # :returns list:        #Pageranges of the table
+    # :brief                #Reads the locations file (see write_page_locations), but does not load pages
+    #                       #Only the header of each page is read (number of records, cell size, zone map, tail columns)
+    #                       #A tail page without extent was reclaimed by a merge, its slot is free (see PageRange.free_tail_page)
+    def import_page_ranges(self, table_folder):
         try:
-            binary_file = open(self.database_folder + sanitize(table_folder) + "/" + "pagerange_" + str(pagerange_num), "r+b")
+            with open(self.locations_path(table_folder), 'rb') as locations_file:
+                data = locations_file.read()
         except FileNotFoundError:
-            raise Exception('Pagerange file not found', sanitize(table_folder), pagerange_num)
-
-        return decode_pagerange(binary_file.read())
+            raise Exception('Locations file not found', sanitize(table_folder))
+
+        num_page_ranges = int_from_bytes(data[0:CELL_SIZE_BYTES])
+        page_counts_end = CELL_SIZE_BYTES * (1 + 2 * num_page_ranges)
+        locations = PageLocations().decode(data[page_counts_end:])
+        with self.io_lock:
+            self.locations[sanitize(table_folder)] = locations
+
+        page_ranges = []
+        for pr_idx in range(num_page_ranges):
+            counts = data[CELL_SIZE_BYTES * (1 + 2 * pr_idx):CELL_SIZE_BYTES * (3 + 2 * pr_idx)]
+            pr = decode_pagerange_meta(counts)
+
+            inner_idxs = list(range(pr.base_page_count)) + [PAGE_RANGE_MAX_BASE_PAGES + i for i in range(pr.tail_page_count)]
+            for inner_idx, page in zip(inner_idxs, pr.base_pages[:pr.base_page_count] + pr.tail_pages):
+                extent = locations.locate((inner_idx, pr_idx))
+                if extent is None:
+                    pr.free_tail_pages.append(inner_idx)
+                    continue
+
+                segment, offset, _ = extent
+                with self.open_segment(table_folder, segment) as fd:
+                    decode_page_header(page, os.pread(fd, PAGE_HEADER_SIZE, offset))
+
+            pr.rebuild_tail_chains()
+            page_ranges.append(pr)
+
+        return page_ranges
         
     # Test stuff
     def rw_test(self):
@@ -583,10 +817,10 @@ class DiskManager:
         og_page.write(itb(222))
         og_page.write(itb(333))
 
-        self.write_page(og_page, (0,0), None, 'Grades', 16)
+        self.write_page(og_page, (0,0), None, 'Grades')
 
-        new_page = Page()
-        self.import_page(new_page, (0,0), None, 'Grades', 16)
+        new_page = Page(True)
+        self.import_page(new_page, (0,0), None, 'Grades')
 
         results = compare_pages(og_page, new_page)
         print(results)
@@ -0,0 +1,224 @@
+from config import *
+from array import array
+from bisect import bisect_right
+
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+### Compact encodings of full base pages ###
+# A plain page is PAGE_SIZE bytes, the tps followed by one 8 byte cell per record
+# An encoded page is shorter than PAGE_SIZE, so the length of its data tells the two apart
+# Its data is the tps, one byte with the encoding, then the encoded cells:
+#   FOR:    base (8) | width (1) | (value - base) packed in width bytes per cell, width 0 means every value is base
+#   DICT:   number of values (2) | width (1) | distinct values (8 each) | index into the values, width bytes per cell
+#   RLE:    number of runs (2) | end of each run (2 each) | value of each run (8 each)
+# Widths are whole bytes so cells decode with array/numpy casts instead of bit shifts
+# Only pages that are no longer written to are encoded (see MergeJob), a write decodes the page first
+
+PLAIN = 0
+FOR = 1 # frame of reference
+DICT = 2 # dictionary
+RLE = 3 # run length
+
+NAMES = {PLAIN: 'plain', FOR: 'for', DICT: 'dict', RLE: 'rle'}
+
+HEADER = CELL_SIZE_BYTES + 1 # tps and encoding byte
+
+# Smallest whole byte width that holds a value, None if it needs a full cell
+def byte_width(value):
+    bits = value.bit_length()
+    if bits == 0:
+        return 0
+    for width in (1, 2, 4):
+        if bits <= width * 8:
+            return width
+    return None
+
+# Unsigned ints of a given byte width in a buffer, as an array or numpy view
+def _unpack(buffer, width, count, offset):
+    if numpy is not None:
+        return numpy.frombuffer(buffer, dtype='<u%d' % width, count=count, offset=offset)
+
+    values = array(CELL_TYPECODES[width])
+    values.frombytes(buffer[offset:offset + count * width])
+    if sys.byteorder != BYTE_ORDER:
+        values.byteswap()
+    return values
+
+# Packs ints in a given byte width
+def _pack(values, width):
+    packed = array(CELL_TYPECODES[width], values)
+    if sys.byteorder != BYTE_ORDER:
+        packed.byteswap()
+    return packed.tobytes()
+
+# Reads one unsigned int of a given byte width
+def _read_int(buffer, offset, width):
+    return int.from_bytes(buffer[offset:offset + width], BYTE_ORDER)
+
+### Picks the smallest encoding for the values of a page ###
+# :param values:        #Cell values of the page, see Page.read_all
+# :param cell_size:     #Bytes per cell of the plain page
+# :returns tuple:       #(encoding, size in bytes of the encoded cells), PLAIN if nothing beats the plain cells
+# :brief    :           #Sizes are computed from the min, max, distinct values and runs, only the winner is built
+def choose(values, cell_size=CELL_SIZE_BYTES):
+    count = len(values)
+    if count == 0:
+        return PLAIN, 0
+
+    low = min(values)
+    high = max(values)
+    distinct = set(values)
+    runs = 1
+    for i in range(1, count):
+        if values[i] != values[i - 1]:
+            runs += 1
+
+    sizes = {PLAIN: count * cell_size}
+
+    width = byte_width(int(high) - int(low))
+    if width is not None:
+        sizes[FOR] = 9 + count * width
+
+    code_width = byte_width(len(distinct) - 1)
+    if code_width is not None and code_width <= 2 and len(distinct) < 2**16:
+        sizes[DICT] = 3 + len(distinct) * CELL_SIZE_BYTES + count * code_width
+
+    if runs < 2**16:
+        sizes[RLE] = 2 + runs * (2 + CELL_SIZE_BYTES)
+
+    encoding = min(sizes, key=lambda encoding: (sizes[encoding], encoding))
+    return encoding, sizes[encoding]
+
+### Encodes the values of a page ###
+# :param values:        #Cell values of the page, see Page.read_all
+# :param encoding:      #One of FOR, DICT, RLE
+# :returns bytes:       #Encoded cells, without the tps and encoding byte
+def encode(values, encoding):
+    values = [int(value) for value in values]
+
+    if encoding == FOR:
+        low = min(values)
+        width = byte_width(max(values) - low)
+        out = low.to_bytes(CELL_SIZE_BYTES, BYTE_ORDER) + bytes([width])
+        if width:
+            out += _pack([value - low for value in values], width)
+        return out
+
+    if encoding == DICT:
+        dictionary = sorted(set(values))
+        codes = {value: code for code, value in enumerate(dictionary)}
+        width = max(1, byte_width(len(dictionary) - 1))
+        out = len(dictionary).to_bytes(2, BYTE_ORDER) + bytes([width])
+        out += b''.join(value.to_bytes(CELL_SIZE_BYTES, BYTE_ORDER) for value in dictionary)
+        out += _pack([codes[value] for value in values], width)
+        return out
+
+    if encoding == RLE:
+        ends = []
+        run_values = []
+        for i, value in enumerate(values):
+            if run_values and run_values[-1] == value:
+                ends[-1] = i + 1
+            else:
+                ends.append(i + 1)
+                run_values.append(value)
+        out = len(ends).to_bytes(2, BYTE_ORDER)
+        out += _pack(ends, 2)
+        out += b''.join(value.to_bytes(CELL_SIZE_BYTES, BYTE_ORDER) for value in run_values)
+        return out
+
+    raise Exception('Unknown page encoding', encoding)
+
+### Reads one cell of an encoded page ###
+# :param data:          #Data of the page, starting with the tps
+# :param cell_idx:      #Index of the cell
+# :returns int:         #Value of the cell
+def read_cell(data, cell_idx):
+    encoding = data[CELL_SIZE_BYTES]
+
+    if encoding == FOR:
+        low = _read_int(data, HEADER, CELL_SIZE_BYTES)
+        width = data[HEADER + CELL_SIZE_BYTES]
+        if width == 0:
+            return low
+        return low + _read_int(data, HEADER + 9 + cell_idx * width, width)
+
+    if encoding == DICT:
+        num_values = _read_int(data, HEADER, 2)
+        width = data[HEADER + 2]
+        code = _read_int(data, HEADER + 3 + num_values * CELL_SIZE_BYTES + cell_idx * width, width)
+        return _read_int(data, HEADER + 3 + code * CELL_SIZE_BYTES, CELL_SIZE_BYTES)
+
+    if encoding == RLE:
+        num_runs = _read_int(data, HEADER, 2)
+        ends = _unpack(data, 2, num_runs, HEADER + 2)
+        run = bisect_right(ends, cell_idx)
+        return _read_int(data, HEADER + 2 + num_runs * 2 + run * CELL_SIZE_BYTES, CELL_SIZE_BYTES)
+
+    raise Exception('Unknown page encoding', encoding)
+
+### Decodes a range of cells of an encoded page ###
+# :param data:          #Data of the page, starting with the tps
+# :param start: int     #Index of the first cell
+# :param end: int       #Index after the last cell
+# :returns:             #Unsigned 64 bit values, numpy array or array('Q') like Page.read_range
+def read_range(data, start, end):
+    encoding = data[CELL_SIZE_BYTES]
+    count = end - start
+
+    if encoding == FOR:
+        low = _read_int(data, HEADER, CELL_SIZE_BYTES)
+        width = data[HEADER + CELL_SIZE_BYTES]
+        if width == 0:
+            if numpy is not None:
+                return numpy.full(count, low, dtype='<u8')
+            return array('Q', [low]) * count
+
+        offsets = _unpack(data, width, count, HEADER + 9 + start * width)
+        if numpy is not None:
+            return offsets.astype('<u8') + numpy.uint64(low)
+        if low == 0:
+            return array('Q', offsets)
+        return array('Q', [low + offset for offset in offsets])
+
+    if encoding == DICT:
+        num_values = _read_int(data, HEADER, 2)
+        width = data[HEADER + 2]
+        dictionary = _unpack_cells(data, num_values, HEADER + 3)
+        codes = _unpack(data, width, count, HEADER + 3 + num_values * CELL_SIZE_BYTES + start * width)
+        if numpy is not None:
+            return dictionary[codes]
+        return array('Q', [dictionary[code] for code in codes])
+
+    if encoding == RLE:
+        num_runs = _read_int(data, HEADER, 2)
+        ends = _unpack(data, 2, num_runs, HEADER + 2)
+        run_values = _unpack_cells(data, num_runs, HEADER + 2 + num_runs * 2)
+        if numpy is not None:
+            lengths = numpy.diff(ends, prepend=0)
+            return numpy.repeat(run_values, lengths)[start:end]
+
+        cells = array('Q')
+        run_start = 0
+        for run_end, value in zip(ends, run_values):
+            cells.extend(array('Q', [value]) * (run_end - run_start))
+            run_start = run_end
+        return cells[start:end]
+
+    raise Exception('Unknown page encoding', encoding)
+
+# 8 byte cells in a buffer, see _unpack
+def _unpack_cells(buffer, count, offset):
+    if numpy is not None:
+        return numpy.frombuffer(buffer, dtype='<u8', count=count, offset=offset)
+
+    cells = array('Q')
+    cells.frombytes(buffer[offset:offset + count * CELL_SIZE_BYTES])
+    if sys.byteorder != BYTE_ORDER:
+        cells.byteswap()
+    return cells
@@ -0,0 +1,46 @@
+from collections import defaultdict
+from contextlib import contextmanager
+
+import threading
+
+### EpochManager class tells when no query can still see data that was unlinked ###
+# Queries enter the current epoch for as long as they may follow RIDs and pids (see reader)
+# A thread that unlinks data, like a merge reclaiming tail records, then calls synchronize
+# Which moves to a new epoch and waits for the queries of the older ones to leave
+# Queries that start afterwards can't reach the unlinked data, so it can be freed
+class EpochManager:
+
+    ### Initializer for the epoch manager ###
+    # :IV self.epoch:       #Epoch queries enter
+    # :IV self.readers:     #Dict of epoch -> number of queries in it, only epochs with queries have an entry
+    def __init__(self):
+        self.epoch = 0
+        self.readers = defaultdict(int)
+        self.cond = threading.Condition()
+
+    ### Enters the current epoch for the length of a block ###
+    # :brief    :       #Blocks can nest, each is counted on its own
+    #                   #A thread in a block must not call synchronize, it would wait for itself
+    @contextmanager
+    def reader(self):
+        with self.cond:
+            epoch = self.epoch
+            self.readers[epoch] += 1
+
+        try:
+            yield epoch
+        finally:
+            with self.cond:
+                self.readers[epoch] -= 1
+                if self.readers[epoch] == 0:
+                    del self.readers[epoch]
+                    self.cond.notify_all()
+
+    ### Waits for every query that started before the call ###
+    # :returns int:     #The epoch that ended
+    def synchronize(self):
+        with self.cond:
+            ended = self.epoch
+            self.epoch += 1
+            self.cond.wait_for(lambda: not any(epoch <= ended for epoch in self.readers))
+            return ended
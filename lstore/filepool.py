@@ -0,0 +1,119 @@
+from config import *
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import mmap
+import os
+import threading
+
+### FilePool class keeps segment files open between page transfers ###
+# Bounded LRU cache of raw file descriptors keyed by (table_folder, segment)
+# Callers use positional reads and writes (os.pread / os.pwrite) on the descriptors
+# So threads never share a seek position
+# Can also memory map files, mappings stay alive until close_all since pages keep views of them
+class FilePool:
+
+    ### Initializer for the file pool ###
+    # :param max_files: int     #Max number of descriptors kept open, defaults to MAX_OPEN_FILES
+    # :IV self.files:           #Ordered dict of key -> [fd, number of users], least recently used first
+    # :IV self.maps:            #Dict of key -> latest mmap of the file
+    # :IV self.retired_maps:    #Older, smaller mmaps of files that grew, pages may still have views of them
+    def __init__(self, max_files=MAX_OPEN_FILES):
+        self.max_files = max_files
+        self.files = OrderedDict()
+        self.maps = {}
+        self.retired_maps = []
+        self.lock = threading.Lock()
+
+    ### Borrows the descriptor of a file ###
+    # :param key: tuple         #(table_folder, segment)
+    # :param path: string       #Path of the file, used when it has to be opened
+    # :param create: bool       #Create the file if it doesn't exist, otherwise raises FileNotFoundError
+    # :brief    :               #Yields an open fd, the fd is never closed while it is borrowed
+    @contextmanager
+    def open(self, key, path, create=False):
+        with self.lock:
+            entry = self.files.get(key)
+            if entry is None:
+                flags = os.O_RDWR | (os.O_CREAT if create else 0)
+                entry = [os.open(path, flags, 0o644), 0]
+                self.files[key] = entry
+            else:
+                self.files.move_to_end(key)
+
+            entry[1] += 1
+            self._close_extra()
+
+        try:
+            yield entry[0]
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                self._close_extra()
+
+    ### Closes least recently used descriptors that are over the limit and not borrowed ###
+    # :brief    :           #Caller must hold self.lock
+    def _close_extra(self):
+        if len(self.files) <= self.max_files:
+            return
+
+        to_close = []
+        for key, (fd, users) in self.files.items():
+            if len(self.files) - len(to_close) <= self.max_files:
+                break
+            if users == 0:
+                to_close.append(key)
+
+        for key in to_close:
+            fd, _ = self.files.pop(key)
+            os.close(fd)
+
+    ### Memory maps a file ###
+    # :param key: tuple         #(table_folder, segment)
+    # :param path: string       #Path of the file
+    # :param end: int           #The mapping has to cover bytes up to this offset
+    # :returns mmap:            #Shared writable mapping of the whole file, None if the file is shorter than end
+    # :brief    :               #Maps the file again if it grew past the current mapping
+    def map(self, key, path, end):
+        with self.lock:
+            mapping = self.maps.get(key)
+            if mapping is not None and len(mapping) >= end:
+                return mapping
+
+        with self.open(key, path) as fd:
+            size = os.fstat(fd).st_size
+            if size < end:
+                return None
+
+            with self.lock:
+                mapping = self.maps.get(key)
+                if mapping is None or len(mapping) < end:
+                    if mapping is not None:
+                        self.retired_maps.append(mapping)
+                    mapping = mmap.mmap(fd, size)
+                    self.maps[key] = mapping
+
+                return mapping
+
+    ### Flushes and closes every descriptor and mapping ###
+    # :param sync: bool     #fsync each file before closing it
+    # :brief    :           #Mappings are synced to disk (msync), mappings that pages still have views of
+    #                       #Can't be closed and are left for the garbage collector
+    def close_all(self, sync=False):
+        with self.lock:
+            mappings = list(self.maps.values()) + self.retired_maps
+            self.maps = {}
+            self.retired_maps = []
+
+            for mapping in mappings:
+                mapping.flush()
+                try:
+                    mapping.close()
+                except BufferError:
+                    pass
+
+            while self.files:
+                _, (fd, _) = self.files.popitem(last=False)
+                if sync:
+                    os.fsync(fd)
+                os.close(fd)
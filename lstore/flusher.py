@@ -0,0 +1,104 @@
+from config import *
+from collections import defaultdict
+
+import logging
+import threading
+
+### Flusher class writes dirty pages back to disk in the background ###
+# Dirty pages are written before the bufferpool picks them for eviction
+# So queries that trigger an eviction mostly find clean pages and don't wait on disk
+# Pages of the same segment file are sorted and adjacent ones are written with one vectored write
+class Flusher:
+
+    ### Initializer for the flusher ###
+    # :param pool:          #BufferPool whose pages are flushed
+    # :param high_water:    #Start flushing once this fraction of the pool is dirty
+    # :param low_water:     #Stop flushing once the dirty fraction is down to this
+    # :param interval:      #Seconds between checks of the dirty fraction
+    def __init__(self, pool, high_water=FLUSH_HIGH_WATER, low_water=FLUSH_LOW_WATER, interval=FLUSH_INTERVAL):
+        self.pool = pool # type: BufferPool
+        self.high_water = high_water
+        self.low_water = low_water
+        self.interval = interval
+
+        self.flushed_pages = 0
+        self.flush_writes = 0
+
+        self.wake = threading.Event()
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    ### Background loop ###
+    # :brief    :       #Checks the pool every interval, or sooner when woken up
+    def _run(self):
+        while not self.stopped:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+            if self.stopped:
+                break
+
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("%s: (%s) flush failed", threading.get_ident(), "Flusher._run")
+
+    ### Flushes dirty pages if the pool is over the high water mark ###
+    # :param force: bool    #Flush every dirty page, ignoring the water marks
+    # :returns int:         #Number of pages written
+    def flush(self, force=False):
+        pool = self.pool
+        max_pages = max(1, pool.max_pages)
+
+        # The count is read without locking the pool, only the pages to flush are ordered
+        num_dirty = pool.num_dirty
+        if not force and num_dirty <= self.high_water * max_pages:
+            return 0
+
+        if force:
+            dirty = pool.dirty_pages()
+        else:
+            dirty = pool.dirty_pages(num_dirty - int(self.low_water * max_pages))
+
+        # Pages closest to eviction go first
+        batches = defaultdict(list)
+        in_flight = []
+        for pool_key, page in dirty:
+            snapshot = pool.snapshot_for_flush(pool_key, page)
+            if snapshot is None:
+                continue
+
+            table_name = pool_key[0]
+            segment, offset, data = snapshot
+            batches[(table_name, segment)].append((offset, data))
+            in_flight.append(pool_key)
+
+        num_written = 0
+        written = False
+        try:
+            for (table_name, segment), writes in batches.items():
+                self.flush_writes += pool.disk.write_page_batch(table_name, segment, writes)
+                num_written += len(writes)
+            written = True
+        finally:
+            pool.flush_done(in_flight, written)
+
+        self.flushed_pages += num_written
+        return num_written
+
+    # Makes the background thread check the pool now
+    def signal(self):
+        self.wake.set()
+
+    # Stops the background thread and waits for it to finish
+    def stop(self):
+        self.stopped = True
+        self.wake.set()
+        self.thread.join()
+
+    def stats(self):
+        return {
+            'flushed_pages': self.flushed_pages,
+            'flush_writes': self.flush_writes,
+        }
@@ -0,0 +1,73 @@
+import random
+import shutil
+import sys
+import tempfile
+import threading
+
+from db import Database
+from mergejob import MergeJob
+from query import Query
+
+### Threaded queries through page handles while a merge runs ###
+# Run from the lstore folder: python handles.test.py
+# Threads update and select their own rows, each query pins its pages once (see PageHandles)
+# A merge loops next to them, update_row_lock keeps it from copying a page an update is halfway through
+# Afterwards every row has its last update and no pin is left
+
+NUM_ROWS = 800
+NUM_THREADS = 4
+NUM_UPDATES = 300
+
+folder = tempfile.mkdtemp()
+db = Database()
+db.open(folder)
+table = db.create_table('Handles', 5, 0)
+query = Query(table)
+
+expected = {}
+for key in range(NUM_ROWS):
+    query.insert(key, key, key, key, key)
+    expected[key] = [key, key, key, key, key]
+
+wrong_reads = []
+
+# Updates and reads back rows whose key is seed modulo NUM_THREADS
+def work(seed):
+    rand = random.Random(seed)
+    for i in range(NUM_UPDATES):
+        key = rand.randrange(seed, NUM_ROWS, NUM_THREADS)
+        column = rand.randrange(1, 5)
+        update = [None] * 5
+        update[column] = seed * NUM_UPDATES + i
+        query.update(key, *update)
+        expected[key][column] = seed * NUM_UPDATES + i
+
+        if query.select(key, 0, [1, 1, 1, 1, 1])[0].columns != expected[key]:
+            wrong_reads.append(key)
+
+done = threading.Event()
+def merge_loop():
+    while not done.is_set():
+        MergeJob(table).run()
+
+merger = threading.Thread(target=merge_loop)
+merger.start()
+
+threads = [threading.Thread(target=work, args=(seed,)) for seed in range(NUM_THREADS)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+
+done.set()
+merger.join()
+
+bad = sum(1 for key, values in expected.items() if query.select(key, 0, [1, 1, 1, 1, 1])[0].columns != values)
+pool = table.bp.pool
+results = [len(wrong_reads), bad, pool.leaked_pins(), pool.handle_pins, len(pool.pins)]
+
+db.close()
+shutil.rmtree(folder)
+
+print(results)
+sys.exit(1 if any(results) else 0)
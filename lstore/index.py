@@ -102,7 +102,7 @@ class Index:
     def update_index(self, column, new_key, rid):
 
         self.remove_by_rid(column, rid)
-        self.insert(column, new_key, rid)
+        self.insert(new_key, rid, column)
 
     
     ### Creates index on specfic column ###
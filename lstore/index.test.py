@@ -0,0 +1,119 @@
+import random
+import shutil
+import sys
+import tempfile
+
+from config import *
+from db import Database
+from mergejob import MergeJob
+from page import Page
+from query import Query
+from tree import BPlusTree
+
+### Zone maps, column scans and the indexes built after them ###
+# Run from the lstore folder: python index.test.py
+# Each check is True if the scan or index found the records it should have, the script exits 1 if one isn't
+
+NUM_ROWS = CELLS_PER_PAGE * 4
+
+results = {}
+
+### Zone maps (user-018) ###
+# Widening only grows the bounds, a rebuild shrinks them but keeps what was widened while tracking
+page = Page()
+results['zone empty'] = page.zone_min is None and not page.zone_overlaps(0, 2**64 - 1)
+for value in [40, 10, 25]:
+    page.widen_zone(value, 1)
+results['zone widen'] = (page.zone_min, page.zone_max, page.zone_count) == (10, 40, 3)
+results['zone overlaps'] = page.zone_overlaps(40, 50) and page.zone_overlaps(0, 10) and page.zone_overlaps(15, 16) and \
+    not page.zone_overlaps(41, 100) and not page.zone_overlaps(0, 9)
+
+page.track_zone()
+page.widen_zone(90)
+page.rebuild_zone([20, 30, 25])
+results['zone rebuild keeps tracked'] = (page.zone_min, page.zone_max, page.zone_count) == (20, 90, 3) and page.zone_tracked is None
+
+page.rebuild_zone([20, 30, 25])
+results['zone rebuild'] = (page.zone_min, page.zone_max) == (20, 30)
+
+# A page without a zone map but with records has to be read
+page = Page()
+page.num_records = 1
+results['zone missing reads page'] = page.zone_overlaps(5, 5)
+
+### B+ tree ###
+# Keys and rids inserted and removed at random are found as a dict of sets would find them
+rand = random.Random(18)
+tree = BPlusTree(4)
+model = {}
+for _ in range(3000):
+    key, rid = rand.randrange(200), rand.randrange(1, 50)
+    if rand.random() < 0.35 and model.get(key):
+        rid = rand.choice(sorted(model[key]))
+        tree.remove(key, rid)
+        model[key].discard(rid)
+    elif rid not in model.get(key, ()):
+        tree.insert(key, rid)
+        model.setdefault(key, set()).add(rid)
+results['tree matches model'] = all(set(tree.get_rid(key) or []) == model.get(key, set()) for key in range(200))
+
+### Column scans ###
+# Values grow with the key, so a scan reads only the pages whose zone map holds the value
+folder = tempfile.mkdtemp()
+db = Database(warm_restart=False)
+db.open(folder)
+table = db.create_table('Grades', 3, 0)
+query = Query(table)
+for key in range(NUM_ROWS):
+    query.insert(key, key // 10, key % 7)
+
+found = query.select(20, 1, [1, 1, 1]) # keys 200 to 209, all in the first page
+results['scan finds'] = sorted(record.columns[0] for record in found) == list(range(200, 210))
+results['scan skips pages'] = table.scan_pages_read == 1 and table.scan_pages_skipped > 0
+
+# An update widens the zone map so the scan finds the new value, and still finds the old records
+query.update(3, None, 10**6, None)
+results['scan after update'] = [record.columns[0] for record in query.select(10**6, 1, [1, 1, 1])] == [3] and \
+    sorted(record.columns[0] for record in query.select(0, 1, [1, 1, 1])) == [0, 1, 2, 4, 5, 6, 7, 8, 9]
+
+# Once the update is undone, a merge rebuilds the zone map from the merged values and it shrinks again
+query.update(3, None, 0, None)
+MergeJob(table).run()
+pid = table.page_directory.pid(table.key_index[3], START_USER_DATA_COLUMN + 1)
+page = table.page_ranges[pid[2]].get_page(pid[1])
+results['zone after merge'] = page.zone_max < 10**6 and query.select(10**6, 1, [1, 1, 1]) == []
+db.close()
+
+# Zone maps are written with the page headers and skip pages after a reopen as well
+db = Database(warm_restart=False)
+db.open(folder)
+table = db.get_table('Grades')
+query = Query(table)
+found = query.select(20, 1, [1, 1, 1])
+results['zone after reopen'] = len(found) == 10 and table.scan_pages_read == 1 and table.scan_pages_skipped > 0
+
+### Index after scans ###
+# A column scanned more than scans_before_index times gets an index, later selects don't scan it
+for _ in range(table.scans_before_index):
+    query.select(2, 2, [1, 1, 1])
+results['index not before'] = not table.indices.is_indexed(2)
+
+scanned = table.scan_pages_read + table.scan_pages_skipped
+found = query.select(2, 2, [1, 1, 1])
+results['index after scans'] = table.indices.is_indexed(2) and table.column_scans[2] == table.scans_before_index + 1
+results['index select'] = sorted(record.columns[0] for record in found) == [key for key in range(NUM_ROWS) if key % 7 == 2] and \
+    table.scan_pages_read + table.scan_pages_skipped == scanned
+
+# Inserts and updates after the index was built are in it
+query.insert(NUM_ROWS, 0, 2)
+query.update(0, None, None, 2)
+query.update(2, None, None, 5)
+found = sorted(record.columns[0] for record in query.select(2, 2, [1, 1, 1]))
+expected = sorted([key for key in range(1, NUM_ROWS) if key % 7 == 2 and key != 2] + [0, NUM_ROWS])
+results['index follows changes'] = found == expected and [record.columns[0] for record in query.select(5, 2, [1, 1, 1])].count(2) == 1
+results['index missing key'] = query.select(99, 2, [1, 1, 1]) == []
+db.close()
+shutil.rmtree(folder)
+
+print(results)
+sys.exit(0 if all(results.values()) else 1)
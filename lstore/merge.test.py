@@ -0,0 +1,84 @@
+import random
+import shutil
+import sys
+import tempfile
+import threading
+
+from db import Database
+from mergejob import MergeJob
+from query import Query
+
+### Merges that run while updates keep coming must not lose any of them ###
+# Run from the lstore folder: python merge.test.py [seed ...]
+# One thread merges over and over while the main thread updates random rows
+# Every row is then checked, before and after the database is closed and opened again
+# The merges must also have reclaimed tail records, see MergeJob.reclaim_tails
+
+NUM_ROWS = 1500
+NUM_UPDATES = 1500
+
+### Updates rows while merges run, then checks every row ###
+# :param seed:          #Seed of the random updates
+# :param cumulative:    #Table keeps cumulative tail records, see Table.update_row
+# :returns tuple:       #(number of rows with a wrong value, number of tail records reclaimed)
+def run(seed, cumulative=False):
+    folder = tempfile.mkdtemp()
+    rand = random.Random(seed)
+
+    db = Database()
+    db.open(folder)
+    table = db.create_table('Merge', 5, 0, cumulative=cumulative)
+    query = Query(table)
+
+    expected = {}
+    for key in range(NUM_ROWS):
+        query.insert(key, 0, 0, 0, 0)
+        expected[key] = [key, 0, 0, 0, 0]
+
+    done = threading.Event()
+    def merge_loop():
+        while not done.is_set():
+            MergeJob(table).run()
+
+    merger = threading.Thread(target=merge_loop)
+    merger.start()
+
+    for i in range(NUM_UPDATES):
+        key = rand.randrange(NUM_ROWS)
+        column = rand.randrange(1, 5)
+        update = [None] * 5
+        update[column] = i + 1
+        query.update(key, *update)
+        expected[key][column] = i + 1
+
+    done.set()
+    merger.join()
+
+    # A last merge with no updates in between
+    MergeJob(table).run()
+    bad = check(query, expected)
+    reclaimed = table.reclaimed.get('tail_records', 0)
+
+    db.close()
+    db = Database()
+    db.open(folder)
+    query = Query(db.get_table('Merge'))
+    bad += check(query, expected)
+    db.close()
+
+    shutil.rmtree(folder)
+    return bad, reclaimed
+
+# Number of rows whose values are not the expected ones
+def check(query, expected):
+    bad = 0
+    for key, values in expected.items():
+        record = query.select(key, 0, [1, 1, 1, 1, 1])[0]
+        if record.columns != values:
+            bad += 1
+    return bad
+
+seeds = [int(seed) for seed in sys.argv[1:]] or [1, 2, 3]
+results = [run(seed, cumulative) for seed in seeds for cumulative in (False, True)]
+print(results)
+sys.exit(1 if any(bad or not reclaimed for bad, reclaimed in results) else 0)
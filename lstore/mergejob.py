@@ -2,6 +2,9 @@ from table import *
 from config import *
 from page import Page
 from util import *
+from collections import defaultdict
+
+import encoding
 
 
 ### MergeJob Class ###
@@ -12,26 +15,47 @@ class MergeJob:
 
     ### Initializer function of the mergejob ###
     # :param table:     #Table whose records will be merged
-    def __init__(self, table):
+    # :param encode:    #Store full data pages with a compact encoding, see encoding.py
+    def __init__(self, table, encode=ENCODE_MERGED_PAGES):
         self.copied_metarecords = {} # key to metarecord
         self.copied_base_pages = {} # (inner, pr) to page
         self.copied_prev_rid = None
         self.min_tid = RESERVED_TID
         self.table = table # type: Table
         self.to_unpin = []
+        self.copied_cells = {} # page_key -> cells of a copied page, see read_copied_by_pid_as_int
+        self.encode = encode
+        self.data_page_keys = set() # page keys of the copied pages that hold user data columns
+        self.encoded_pages = defaultdict(int) # encoding name -> number of pages merged with it
+        self.reclaimed = defaultdict(int) # what reclaim_tails freed: tail records, tail pages and bytes
 
     ### Function that copies all the base records ###
     # :returns copies:  #List of copied records
     # :brief    :       #Copies all the base records and metarecords and uses those for merge
+    #                   #Caller holds the table's update_row_lock exclusive, so no update runs while the pages are copied
+    #                   #Every tail record then either is reachable from a copied indirection or takes a RID below all of them
+    #                   #Which is what makes min_tid a TPS that holds for every copied page, see write_tps_to_all
     def copy_data(self):
         self.copied_prev_rid = self.table.prev_rid
         copied_metarecords = {}
+
+        # Updates from here on are kept in the zone maps the merge rebuilds, see rebuild_zones
+        for page in self.base_pages():
+            page.track_zone()
+
         copied_base_pages = {}
+        self.table.prefetch_records(range(1, min(CELLS_PER_PAGE, self.copied_prev_rid) + 1))
         for rid in range(1, self.copied_prev_rid+1):
+            # Load the pages of the next batch of records while this one is copied
+            if rid % CELLS_PER_PAGE == 0:
+                self.table.prefetch_records(range(rid + 1, min(rid + CELLS_PER_PAGE, self.copied_prev_rid) + 1))
+
             if rid not in self.table.page_directory:
                 continue
 
             current_record = self.table.page_directory[rid].copy()
+            for pid in current_record.columns[START_USER_DATA_COLUMN:]:
+                self.data_page_keys.add((pid[1], pid[2]))
         
             for pid in current_record.columns:
                 cell_idx, inner_idx, range_idx = pid
@@ -45,12 +69,28 @@ class MergeJob:
                         self.to_unpin.append(page_key)
 
                     copied_base_pages[(inner_idx, range_idx)] = og_page.copy()
+                    self.table.bp.unpin(page_key)
                     
                 
             copied_metarecords[rid] = current_record
 
         return [copied_metarecords, copied_base_pages]
         
+    # Base page objects of the table, loaded or not
+    def base_pages(self):
+        return [page for page_range in self.table.page_ranges for page in page_range.base_pages[:page_range.base_page_count]]
+
+    ### Rebuilds the zone maps of the merged data pages ###
+    # :brief    :       #The zone maps only grew since the last merge, they shrink back to the merged values
+    #                   #Plus whatever was inserted or updated while the merge ran (see Page.track_zone)
+    def rebuild_zones(self):
+        for inner_idx, range_idx in self.data_page_keys:
+            og_page = self.table.page_ranges[range_idx].get_page(inner_idx) # type: Page
+            og_page.rebuild_zone(self.copied_base_pages[(inner_idx, range_idx)].read_all())
+
+        for page in self.base_pages():
+            page.track_zone(False)
+
     ### Reads the copied pages ###
     # :param pid: tuple     #Tuple of three (cell_idx, inner_idx, range_idx) that allows reading a single cell
     # returns bytes:        #Returns the bytes in the cell specified by the pid
@@ -61,8 +101,15 @@ class MergeJob:
         return bytes_read
 
     # Same as above but returns the int values
+    # Only used for meta columns, which the merge doesn't write, so each page is read once as a whole
     def read_copied_by_pid_as_int(self, pid):
-        return int_from_bytes(self.read_copied_by_pid(pid))
+        cell_idx, inner_idx, range_idx = pid
+        page_key = (inner_idx, range_idx)
+        cells = self.copied_cells.get(page_key)
+        if cells is None:
+            cells = self.copied_base_pages[page_key].read_all()
+            self.copied_cells[page_key] = cells
+        return int(cells[cell_idx])
 
 
     
@@ -94,7 +141,7 @@ class MergeJob:
             if need[data_col_idx] == 0:
                 continue
             col_pid = base_record.columns[START_USER_DATA_COLUMN + data_col_idx]
-            tps = self.table.get_page(col_pid).read_tps()
+            tps = self.copied_base_pages[(col_pid[1], col_pid[2])].read_tps()
             tps_all[data_col_idx] = tps
 
             data = self.read_copied_by_pid(col_pid)
@@ -110,25 +157,26 @@ class MergeJob:
         # read tail records
         while sum(need) != 0: #  todo: or indirection > tps or more?
             self.min_tid = min(self.min_tid, next_rid)
+
+            # Reclaimed by an earlier merge, its values are in the copied pages and its RID is the TPS they have
+            if next_rid not in self.table.page_directory:
+                break
             curr_record = self.table.page_directory[next_rid]
 
-            curr_enc_pid = curr_record.columns[SCHEMA_ENCODING_COLUMN]
-            curr_enc_bytes = self.table.read_pid(curr_enc_pid)
-            curr_enc = int_from_bytes(curr_enc_bytes)
-            curr_enc_binary = bin(curr_enc)[2:].zfill(self.table.num_columns)
+            # A tail record only has pids for the columns it updated, so its schema encoding page isn't read
+            curr_data_pids = curr_record.columns[START_USER_DATA_COLUMN:]
 
-            for data_col_idx, is_updated in enumerate(curr_enc_binary):
+            for data_col_idx, col_pid in enumerate(curr_data_pids):
                 if need[data_col_idx] == 0:
                     continue
 
-                if is_updated == '0':
+                if col_pid is None:
                     continue
                 
                 if next_rid >= tps_all[data_col_idx]:
                     need[data_col_idx] = 0
                     continue
 
-                col_pid = curr_record.columns[START_USER_DATA_COLUMN + data_col_idx]
                 data = self.table.read_pid(col_pid)
                 data = int_from_bytes(data)
                 resp[data_col_idx] = data
@@ -158,6 +206,18 @@ class MergeJob:
         for page in self.copied_base_pages.values():
             page.write_tps(self.min_tid)
 
+    ### Encodes the merged data pages ###
+    # :brief    :       #Only full pages are encoded, records are never added to them so they won't be written again
+    #                   #Meta column pages stay plain, updates write their indirection and schema cells in place
+    def encode_data_pages(self):
+        if not self.encode:
+            return
+
+        for page_key in self.data_page_keys:
+            page = self.copied_base_pages[page_key] # type: Page
+            if page.num_records == page.cells_per_page:
+                self.encoded_pages[encoding.NAMES[page.encode()]] += 1
+
     ### Loads merged pages back into table ###
     # :param merged_record:     #Merged record with the new merged data
     # :brief            :       #Loads the merged pages into the table, overriding the original pages
@@ -179,7 +239,8 @@ class MergeJob:
                     raise Exception("The original page isn't loaded")
                 data = new_page._data
                 if og_page.num_records != new_page.num_records:
-                    idx = new_page.num_records # also accounts for tps
+                    # Only full pages are encoded, so a page that got new records is plain
+                    idx = CELL_SIZE_BYTES + new_page.num_records * new_page.cell_size # also accounts for tps
                     data = data[:idx] + og_page._data[idx:]
 
                 original_data = og_page._data
@@ -187,71 +248,137 @@ class MergeJob:
                 og_page.is_dirty = True
                 og_page.is_loaded = True
 
+            if len(data) != len(original_data):
+                self.table.bp.resized(page_key, og_page)
+
+            self.table.bp.unpin(page_key)
+
+    ### Reclaims the tail records and pages the merge folded into the base pages ###
+    # :brief    :       #Tail records of the copied base records from the TPS up are never read again
+    #                   #But queries that started before the merged pages were loaded back may still follow them
+    #                   #So once those queries are done (see EpochManager), the records leave the page directory
+    #                   #And their slots are cut off (see PageDirectory.compact_tails)
+    #                   #Then every tail page no record points to leaves the pool and gives back its extent and slot
+    #                   #Only pages that were not the last of their column's chain before the wait, so no update writes to them
+    #                   #min_tid bounds every copied base record because copy_data ran with updates held off
+    #                   #A tail record of one of them that wasn't merged has a RID below min_tid and stays
+    def reclaim_tails(self):
+        if self.min_tid == RESERVED_TID:
+            return
+
+        table = self.table
+        directory = table.page_directory
+
+        closed_pages = [(inner_idx, range_idx) for range_idx, page_range in enumerate(table.page_ranges)
+            for inner_idx in page_range.closed_tail_pages()]
+        table.epochs.synchronize()
+
+        for rid, key in directory.oldest_tails(self.min_tid):
+            base_rid = table.key_index.get(key)
+            if base_rid is None or base_rid > self.copied_prev_rid:
+                continue
+
+            # delete_record walks the tail records of its base record under this lock
+            with table.del_locks(base_rid):
+                if rid in directory:
+                    del directory[rid]
+                    self.reclaimed['tail_records'] += 1
+
+        num_slots = directory.compact_tails(self.min_tid)
+        self.reclaimed['directory_bytes'] += num_slots * (table.num_total_cols + 1) * CELL_SIZE_BYTES
+
+        for page_key in closed_pages:
+            if directory.tail_page_cells(*page_key):
+                continue
+
+            dropped = table.bp.drop_page(page_key)
+            if dropped is None:
+                continue
+
+            memory_bytes, disk_bytes = dropped
+            self.reclaimed['tail_pages'] += 1
+            self.reclaimed['memory_bytes'] += memory_bytes
+            self.reclaimed['disk_bytes'] += disk_bytes
+
+        table.last_reclaimed = dict(self.reclaimed)
+        for name, amount in self.reclaimed.items():
+            table.reclaimed[name] = table.reclaimed.get(name, 0) + amount
+
     ### Runs the merge ###
     # :brief    :       #Copies the data and merges it with the talk records
     #                   #Then reloads it back into the table, while managing all the locks needed
+    #                   #Pages are read in bulk access mode (see BufferPool.bulk_access)
+    #                   #Finally the merged tail records and pages are reclaimed, see reclaim_tails
     def run(self):
 
-        self.table.merging = 1
+        # Merges read every base page once, keep them out of the pool
+        with self.table.bp.bulk_access():
+            self.table.merging = 1
         
-        with self.table.merge_lock:
-            self.copied_metarecords, self.copied_base_pages = self.copy_data()
+            with self.table.merge_lock, self.table.update_row_lock.exclusive():
+                self.copied_metarecords, self.copied_base_pages = self.copy_data()
 
-        self.table.merging = 2
+            self.table.merging = 2
 
-        for rid in range(1, self.copied_prev_rid+1):
+            for rid in range(1, self.copied_prev_rid+1):
 
-            if rid not in self.table.page_directory:
-                continue
+                if rid not in self.table.page_directory:
+                    continue
+
+                # Lock record from deletion
+                self.table.del_locks(rid).acquire()
+                if rid not in self.table.page_directory: # If we just acquired the del lock, we might've acquired it after a delete
+                    self.table.del_locks(rid).release()
+                    # print('Got lock but the base record was deleted')
+                    continue
+
+                self.table.merging = 3
+                # Collapse
+                base_record, data_cols = self.collapse_record(rid)
+                self.write_collapsed_pages(base_record, data_cols)
 
-            # Lock record from deletion
-            self.table.del_locks(rid).acquire()
-            if rid not in self.table.page_directory: # If we just acquired the del lock, we might've acquired it after a delete
+                # Release lock
                 self.table.del_locks(rid).release()
-                # print('Got lock but the base record was deleted')
-                continue
 
-            self.table.merging = 3
-            # Collapse
-            base_record, data_cols = self.collapse_record(rid)
-            self.write_collapsed_pages(base_record, data_cols)
+            self.table.merging = 4
+            self.write_tps_to_all()
+            self.encode_data_pages()
 
-            # Release lock
-            self.table.del_locks(rid).release()
+            for rid in range(1, self.copied_prev_rid+1):
 
-        self.table.merging = 4
-        self.write_tps_to_all()
+                if rid not in self.copied_metarecords:
+                    continue
 
-        for rid in range(1, self.copied_prev_rid+1):
+                # Lock record from rw/deletion
+                while(1):
+                    acquire_resp = acquire_all([self.table.rw_locks(rid), self.table.del_locks(rid)])
+                    if acquire_resp is False:
+                        continue
+                    locks = acquire_resp
 
-            if rid not in self.copied_metarecords:
-                continue
+                    if rid not in self.table.page_directory: # If we just acquired the del lock, we might've acquired it after a delete
+                        release_all(locks)
+                        break
 
-            # Lock record from rw/deletion
-            while(1):
-                acquire_resp = acquire_all([self.table.rw_locks(rid), self.table.del_locks(rid)])
-                if acquire_resp is False:
-                    continue
-                locks = acquire_resp
+                    self.table.merging = 4
+                    # Write back
+                    metarecord = self.copied_metarecords[rid]
+                    self.load_into_table(metarecord)
 
-                if rid not in self.table.page_directory: # If we just acquired the del lock, we might've acquired it after a delete
+                    # Release lock
                     release_all(locks)
                     break
 
-                self.table.merging = 4
-                # Write back
-                metarecord = self.copied_metarecords[rid]
-                self.load_into_table(metarecord)
+            self.rebuild_zones()
 
-                # Release lock
-                release_all(locks)
-                break
+            self.table.merging = 5
+            for page_key in self.to_unpin:
+                self.table.bp.unpin_merge(page_key)
 
-        self.table.merging = 5
-        for page_key in self.to_unpin:
-            self.table.bp.unpin_merge(page_key)
+            with self.table.merge_lock:
+                self.table.bp.flush_unpooled()
 
-        with self.table.merge_lock:
-            self.table.bp.flush_unpooled()
+        self.table.merging = 6
+        self.reclaim_tails()
 
         self.table.merging = 0
\ No newline at end of file
@@ -0,0 +1,61 @@
+import threading
+
+### Histogram class counts values in power of two buckets ###
+# Used by the bufferpool for latencies and batch sizes
+# Values are recorded in units (1e-6 for latencies in seconds gives microseconds)
+# Bucket i counts values in [2^(i-1), 2^i) units, bucket 0 counts values under 1 unit
+class Histogram:
+
+    NUM_BUCKETS = 40
+
+    ### Initializer for the histogram ###
+    # :param unit: float    #Size of one unit, recorded values are divided by it
+    def __init__(self, unit=1):
+        self.unit = unit
+        self.buckets = [0] * self.NUM_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.lock = threading.Lock()
+
+    ### Records a value ###
+    # :param value:         #Value in the same unit as self.unit (seconds for latencies)
+    def record(self, value):
+        units = value / self.unit
+        bucket = min(int(units).bit_length(), self.NUM_BUCKETS - 1)
+
+        with self.lock:
+            self.buckets[bucket] += 1
+            self.count += 1
+            self.total += units
+            if units > self.max:
+                self.max = units
+
+    ### Upper bound of the bucket holding a percentile ###
+    # :param fraction: float    #Percentile as a fraction, 0.99 for p99
+    # :brief    :               #Caller must hold self.lock
+    def _percentile(self, fraction):
+        if self.count == 0:
+            return 0
+
+        rank = fraction * self.count
+        seen = 0
+        for bucket, num in enumerate(self.buckets):
+            seen += num
+            if seen >= rank:
+                return 2 ** bucket
+        return 2 ** (self.NUM_BUCKETS - 1)
+
+    ### Snapshot of the histogram ###
+    # :returns dict:        #Count, mean, max and p50/p99 in units, plus the non empty buckets
+    #                       #Buckets are keyed by their upper bound
+    def snapshot(self):
+        with self.lock:
+            return {
+                'count': self.count,
+                'mean': self.total / self.count if self.count else 0,
+                'max': self.max,
+                'p50': self._percentile(0.5),
+                'p99': self._percentile(0.99),
+                'buckets': {2 ** bucket: num for bucket, num in enumerate(self.buckets) if num},
+            }
@@ -0,0 +1,64 @@
+from time import perf_counter
+from random import randrange
+
+from config import *
+from util import *
+from page import Page, numpy
+
+import encoding
+
+### Page micro benchmarks ###
+# Run from the lstore folder: python page.bench.py
+
+NUM_PAGES = 2000
+
+### Makes a full page of random values ###
+def make_page():
+    page = Page()
+    for _ in range(CELLS_PER_PAGE):
+        page.write(int_to_bytes(randrange(0, 100)))
+    return page
+
+### Sums every cell of every page, one read per cell ###
+def scan_cells(pages):
+    total = 0
+    for page in pages:
+        for cell_idx in range(page.num_records):
+            total += int_from_bytes(page.read(cell_idx))
+    return total
+
+### Sums every cell of every page, one read_all per page ###
+def scan_read_all(pages):
+    total = 0
+    for page in pages:
+        cells = page.read_all()
+        total += int(cells.sum()) if numpy is not None else sum(cells)
+    return total
+
+if __name__ == '__main__':
+    pages = [make_page() for _ in range(NUM_PAGES)]
+
+    start = perf_counter()
+    expected = scan_cells(pages)
+    per_cell = (perf_counter() - start) / NUM_PAGES
+
+    start = perf_counter()
+    total = scan_read_all(pages)
+    per_page = (perf_counter() - start) / NUM_PAGES
+
+    assert total == expected
+    print("Column scan of %d pages, read_all returns %s" % (NUM_PAGES, 'numpy views' if numpy is not None else "array('Q')"))
+    print("read per cell:\t%.1f us per page" % (per_cell * 1e6))
+    print("read_all:\t%.1f us per page (%.0fx)" % (per_page * 1e6, per_cell / per_page))
+
+    # The same values, as a merge would store them
+    used = [encoding.NAMES[page.encode()] for page in pages]
+    num_bytes = sum(page.num_bytes for page in pages)
+
+    start = perf_counter()
+    total = scan_read_all(pages)
+    per_encoded = (perf_counter() - start) / NUM_PAGES
+
+    assert total == expected
+    print("encoded (%s):\t%.1f us per page, %d bytes per page (%.1fx smaller)" % (
+        ', '.join(sorted(set(used))), per_encoded * 1e6, num_bytes / NUM_PAGES, NUM_PAGES * PAGE_SIZE / num_bytes))
@@ -1,25 +1,60 @@
 from config import *
 from util import *
 from time import process_time
+from array import array
 
+import encoding
+import sys
 import threading
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 ### Page object ###
 # Represents a page of data (set to 4096 bytes) as a byte array
 # Keeps track of number of records and whether the it has been loaded or written to
 # Also, each page was a 8 bytes reserved for a tail processing sequence number (tps)
+# Cells are 8 bytes, base pages of narrow columns use 1, 2 or 4 byte cells and hold that many times more records
+# Every write bumps the page version, the page is dirty while its version is ahead of the last written one
+# A full page that is no longer written to can be encoded (see encoding.py), its data is then shorter than PAGE_SIZE
+# Reads decode transparently, a write turns the page back into a plain one first
+# A base data page keeps a zone map, the min and max of every value its records had since the last merge
+# And how many values it holds, so scans skip pages that can't match without loading them (see Table.scan_column)
+# A tail page keeps the set of columns written to it instead
 class Page:
 
     ### Initializer funtion  ###
     # :param is_importing: bool     #Determines whether the page will be loaded with data from disk or be a new blank page. 
-    def __init__(self, is_importing = False):
+    # :param cell_size: int         #Bytes per cell, see COLUMN_TYPES
+    # :IV self.version:             #Number of writes made to the page
+    # :IV self.clean_version:       #Version that was last written to disk
+    # :IV self.zone_min/zone_max:   #Bounds of the zone map, None while the page holds no values
+    # :IV self.zone_count:          #Number of values in the page
+    # :IV self.tail_columns:        #Bit per table column written to a tail page (1 << column)
+    # :IV self.dirty_hook:          #Called with True when the page turns dirty and False when it turns clean
+    #                               #Set by the bufferpool while the page is in it, see BufferPool._track
+    def __init__(self, is_importing = False, cell_size = CELL_SIZE_BYTES):
+        self.cell_size = cell_size
         self.num_records = 0
         self.num_records_lock = threading.Lock()
+        self.version = 0
+        self.clean_version = 0
+        self.dirty_hook = None
         # self.indexes = None
         # self.write_lock = threading.Lock()
         # self.latch = pl.get(process_time())
         self.latch = threading.Lock()
 
+        self.zone_min = None
+        self.zone_max = None
+        self.zone_count = 0
+        self.zone_tracked = None # bounds widened since track_zone, see MergeJob
+        self.zone_dirty = False # zone map changed without a write to the page data
+        self.tail_columns = 0
+        self.stored_bytes = None # size of the data in its slot on disk, see DiskManager.import_page
+
         if is_importing:
             self._data = None
             self.is_loaded = False
@@ -40,11 +75,35 @@ class Page:
 
     @property
     def is_dirty(self):
-        return self.__is_loaded
+        return self.version != self.clean_version
 
+    # Setting True counts as a write, setting False marks the current version as written
     @is_dirty.setter
-    def is_dirty(self, is_loaded):
-        self.__is_loaded = is_loaded
+    def is_dirty(self, is_dirty):
+        if is_dirty:
+            self._written()
+        else:
+            self.mark_clean(self.version)
+
+    ### Marks the page clean up to a version ###
+    # :param version: int       #Version the page had when the data that was written to disk was taken
+    # :brief    :               #Writes made after that version keep the page dirty
+    def mark_clean(self, version):
+        if version > self.clean_version:
+            self.clean_version = version
+
+            hook = self.dirty_hook
+            if hook is not None and version == self.version:
+                hook(False)
+
+    # Counts a write, see dirty_hook
+    def _written(self):
+        was_clean = self.version == self.clean_version
+        self.version += 1
+
+        hook = self.dirty_hook
+        if was_clean and hook is not None:
+            hook(True)
         
 
     ### Loads data ###
@@ -72,56 +131,111 @@ class Page:
         self.is_loaded = False
     
     def has_capacity(self):
-        return self.num_records < (CELLS_PER_PAGE)
+        return self.num_records < self.cells_per_page
+
+    # Number of cells that fit in the page
+    @property
+    def cells_per_page(self):
+        return (PAGE_SIZE - CELL_SIZE_BYTES) // self.cell_size
 
     def get_num_records(self):
         return self.num_records
 
+    # Encoding of the page data, see encoding.py
+    @property
+    def encoding(self):
+        data = self._data
+        if data is None or len(data) == PAGE_SIZE:
+            return encoding.PLAIN
+        return data[CELL_SIZE_BYTES]
+
+    # Bytes of memory held by the page data
+    @property
+    def num_bytes(self):
+        data = self._data
+        return 0 if data is None else len(data)
+
+    ### Encodes the page with its smallest encoding ###
+    # :returns int:             #Encoding used, PLAIN if no encoding is smaller than the plain page
+    # :brief    :               #The data is swapped in one assignment, so readers see either the plain or the encoded data
+    #                           #Does not count as a write, the caller marks the page dirty if it should be written
+    def encode(self):
+        if self.encoding != encoding.PLAIN:
+            return self.encoding
+
+        values = self.read_all()
+        page_encoding, size = encoding.choose(values, self.cell_size)
+        if page_encoding == encoding.PLAIN or encoding.HEADER + size >= PAGE_SIZE:
+            return encoding.PLAIN
+
+        data = bytearray(self._data[:CELL_SIZE_BYTES])
+        data.append(page_encoding)
+        data += encoding.encode(values, page_encoding)
+        self._data = data
+        return page_encoding
+
+    ### Turns an encoded page back into a plain one ###
+    # :brief    :               #Called before every write, does nothing for a plain page
+    def decode(self):
+        data = self._data
+        if data is None or len(data) == PAGE_SIZE:
+            return
+
+        plain = bytearray(PAGE_SIZE)
+        plain[:CELL_SIZE_BYTES] = data[:CELL_SIZE_BYTES]
+        cells = array(CELL_TYPECODES[self.cell_size], encoding.read_range(data, 0, self.num_records))
+        if sys.byteorder != BYTE_ORDER:
+            cells.byteswap()
+        plain[CELL_SIZE_BYTES:CELL_SIZE_BYTES + len(cells) * self.cell_size] = cells.tobytes()
+        self._data = plain
+
         
     ### Writes bytes to the page ###
-    # :param value: bytes       #Dat  to write. Must be bytes of the specified CELLS_PER_PAGE size
+    # :param value: bytes       #Data to write, an int of any byte length that fits in the cell size
     # :brief    :               #Writes the bytes to the next available cell in the page
     #                           #Which is determined by the number of records in page
     #                           #Marks page as dirty 
     # return int:               #Returns the number of records in the page   
     def write(self, value):
         with self.num_records_lock:
+            self.decode()
             if not self.has_capacity():
                 raise Exception('page is full')
 
-            start = (self.num_records + 1) * CELL_SIZE_BYTES
+            start = CELL_SIZE_BYTES + self.num_records * self.cell_size
             self.num_records += 1
             record_num = self.num_records # the number of this particular record (index+1)
 
-        end = start + CELL_SIZE_BYTES
-        if len(value) != CELL_SIZE_BYTES:
+        end = start + self.cell_size
+        if len(value) != self.cell_size:
             value = int.from_bytes(value, 'little')
-            value = value.to_bytes(CELL_SIZE_BYTES, 'little')
+            value = value.to_bytes(self.cell_size, 'little')
         self._data[start:end] = value
-        self.is_dirty = True
+        self._written()
         return record_num
 
     
     ### Writes bytes to the page at specific cell ###
-    # :param value: bytes       #Data to write. Must be bytes of the specified CELLS_PER_PAGE size
+    # :param value: bytes       #Data to write, an int of any byte length that fits in the cell size
     # :param cell_idx: int      #Index of cell to write to. Only write to what has already been written too
     # :param increment:         #If writing to cell adds another record to page
     # :brief    :               #Allows writing to preexisting cells and updating data
     # :return int:              #Returns number of records in the page
     def write_to_cell(self, value, cell_idx, increment=False):
+        self.decode()
 
         if increment:
             if not self.has_capacity():
                 raise Exception('page is full')
             self.num_records += 1
 
-        start = (cell_idx + 1) * CELL_SIZE_BYTES
-        end = start + CELL_SIZE_BYTES
-        if len(value) != CELL_SIZE_BYTES:
+        start = CELL_SIZE_BYTES + cell_idx * self.cell_size
+        end = start + self.cell_size
+        if len(value) != self.cell_size:
             value = int.from_bytes(value,'little')
-            value = value.to_bytes(CELL_SIZE_BYTES,'little')
+            value = value.to_bytes(self.cell_size,'little')
         self._data[start:end] = value
-        self.is_dirty = True
+        self._written()
 
         return self.num_records
 
@@ -132,7 +246,7 @@ class Page:
         start = 0
         end = start + CELL_SIZE_BYTES
         self._data[start:end] = bytes_to_write
-        self.is_dirty = True
+        self._written()
 
     def read_tps(self) -> int:
         return int_from_bytes(bytes(self._data[0:CELL_SIZE_BYTES]))
@@ -143,17 +257,105 @@ class Page:
         '''
             Reads bytes from page, returning a bytearray
         '''
-        if cellIndex > CELLS_PER_PAGE - 1:
+        if cellIndex > self.cells_per_page - 1:
             raise Exception('cellIndex exceeds page size')
 
-        start = (cellIndex + 1) * CELL_SIZE_BYTES
-        end = start + CELL_SIZE_BYTES
-        return bytes(self._data[start:end])
+        data = self._data
+        if len(data) != PAGE_SIZE:
+            return encoding.read_cell(data, cellIndex).to_bytes(CELL_SIZE_BYTES, BYTE_ORDER)
+
+        start = CELL_SIZE_BYTES + cellIndex * self.cell_size
+        end = start + self.cell_size
+        return bytes(data[start:end])
+
+    ### Reads a range of cells at once ###
+    # :param start: int         #Index of the first cell
+    # :param end: int           #Index after the last cell, defaults to the number of records
+    # :returns:                 #Unsigned 64 bit values of the cells, a numpy view of the page data (no copy)
+    #                           #Or an array('Q') copy if numpy is not installed
+    # :brief    :               #One call instead of a read and int_from_bytes per cell
+    #                           #An encoded page is decoded into a new array, narrow cells are widened into one
+    def read_range(self, start=0, end=None):
+        if end is None:
+            end = self.num_records
+        if start < 0 or end > self.cells_per_page or start > end:
+            raise Exception('cell range exceeds page size', start, end)
+
+        data = self._data
+        if len(data) != PAGE_SIZE:
+            return encoding.read_range(data, start, end)
+
+        cell_size = self.cell_size
+        offset = CELL_SIZE_BYTES + start * cell_size
+        if numpy is not None:
+            cells = numpy.frombuffer(data, dtype='<u%d' % cell_size, count=end - start, offset=offset)
+            return cells if cell_size == CELL_SIZE_BYTES else cells.astype('<u8')
+
+        cells = array(CELL_TYPECODES[cell_size])
+        cells.frombytes(data[offset:CELL_SIZE_BYTES + end * cell_size])
+        if sys.byteorder != BYTE_ORDER:
+            cells.byteswap()
+        return cells if cell_size == CELL_SIZE_BYTES else array('Q', cells)
+
+    # Reads every written cell, see read_range
+    def read_all(self):
+        return self.read_range(0, self.num_records)
+
+    ### Widens the zone map to hold a value ###
+    # :param value: int         #Value inserted into, or updated in, one of the page's records
+    # :param count: int         #1 for a new record, 0 for an update of an existing one
+    # :brief    :               #The zone map only ever grows between merges, so it holds old values as well
+    #                           #Which keeps it correct without reading the page
+    def widen_zone(self, value, count=0):
+        with self.latch:
+            if self.zone_min is None or value < self.zone_min:
+                self.zone_min = value
+            if self.zone_max is None or value > self.zone_max:
+                self.zone_max = value
+            self.zone_count += count
+            self.zone_dirty = True
+
+            tracked = self.zone_tracked
+            if tracked is not None:
+                self.zone_tracked = (min(tracked[0], value), max(tracked[1], value)) if tracked else (value, value)
+
+    ### Starts or stops recording the values the zone map is widened with ###
+    # :param tracking: bool     #False to stop
+    # :brief    :               #A merge starts it before copying any page, see rebuild_zone
+    def track_zone(self, tracking=True):
+        with self.latch:
+            self.zone_tracked = () if tracking else None
+
+    ### Replaces the zone map with the bounds of the given values ###
+    # :param values:            #Values of the page's records, see read_all
+    # :brief    :               #Values the zone map was widened with since track_zone are kept
+    #                           #So updates made during a merge stay covered
+    def rebuild_zone(self, values):
+        with self.latch:
+            tracked = self.zone_tracked or ()
+            bounds = list(tracked)
+            if len(values):
+                bounds += [int(min(values)), int(max(values))]
+
+            self.zone_min = min(bounds) if bounds else None
+            self.zone_max = max(bounds) if bounds else None
+            self.zone_count = max(len(values), self.zone_count)
+            self.zone_tracked = None
+            self.zone_dirty = True
+
+    ### Checks if the page may hold a value in a range ###
+    # :param begin: int         #Smallest value of the range
+    # :param end: int           #Largest value of the range
+    # :returns bool:            #False only if no record of the page can have a value in the range
+    def zone_overlaps(self, begin, end):
+        if self.zone_min is None:
+            return self.num_records > 0 # no zone map, the page has to be read
+        return self.zone_min <= end and begin <= self.zone_max
 
     # Copies page
     def copy(self):
-        copy = Page()
-        copy._data = self._data.copy()
+        copy = Page(cell_size=self.cell_size)
+        copy._data = bytearray(self._data)
         copy.num_records = self.num_records
         return copy
 
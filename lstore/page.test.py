@@ -0,0 +1,194 @@
+import encoding
+import page as page_module
+import shutil
+import sys
+import tempfile
+
+from config import *
+from db import Database
+from mergejob import MergeJob
+from page import Page
+from query import Query
+from util import *
+
+### Page data, versions and encodings ###
+# Run from the lstore folder: python page.test.py
+# Each check is True if the page did what it should have, the script exits 1 if one isn't
+
+results = {}
+
+### Dirty tracking (user-007) ###
+# A write makes the page dirty, marking clean the version a flush took leaves later writes dirty
+page = Page()
+hook_calls = []
+page.dirty_hook = hook_calls.append
+results['version new page dirty'] = page.is_dirty and page.is_loaded
+
+page.is_dirty = False
+results['version clean keeps data'] = not page.is_dirty and page.is_loaded
+
+page.write(int_to_bytes(1))
+flushed_version = page.version
+page.write(int_to_bytes(2))
+page.mark_clean(flushed_version)
+results['version write during flush'] = page.is_dirty
+
+page.mark_clean(page.version)
+page.mark_clean(flushed_version) # an older flush landing late
+results['version clean'] = not page.is_dirty and page.clean_version == page.version
+
+page.write_to_cell(int_to_bytes(3), 0)
+results['version write to cell'] = page.is_dirty and int_from_bytes(page.read(0)) == 3
+results['version hook'] = hook_calls == [False, True, False, True]
+
+### Vectorized reads (user-015) ###
+# A range of cells comes back as unsigned 64 bit values in one call, a numpy view of the page if numpy is there
+values = [value * 2**40 + value for value in range(300)] + [2**64 - 1]
+page = Page()
+for value in values:
+    page.write(int_to_bytes(value))
+results['vector read range'] = list(page.read_range(10, 20)) == values[10:20] and list(page.read_range(5, 5)) == []
+results['vector read all'] = list(page.read_all()) == values and list(page.read_range()) == values
+
+try:
+    page.read_range(0, page.cells_per_page + 1)
+    results['vector out of range'] = False
+except Exception:
+    results['vector out of range'] = True
+
+if page_module.numpy is not None:
+    results['vector numpy view'] = not page.read_all().flags.owndata
+    page_module.numpy, numpy = None, page_module.numpy
+    results['vector without numpy'] = list(page.read_all()) == values
+    page_module.numpy = numpy
+else:
+    results['vector without numpy'] = page.read_all().typecode == 'Q'
+
+# Sums read whole base pages, rows with updates that aren't merged yet go through their tail records
+folder = tempfile.mkdtemp()
+db = Database(warm_restart=False)
+db.open(folder)
+query = Query(db.create_table('Grades', 3, 0))
+expected = {}
+for key in range(CELLS_PER_PAGE * 3):
+    query.insert(key, key, 1)
+    expected[key] = key
+for key in range(0, CELLS_PER_PAGE * 3, 3):
+    query.update(key, None, key * 2, None)
+    expected[key] = key * 2
+MergeJob(query.table).run()
+for key in range(0, CELLS_PER_PAGE * 3, 7):
+    query.update(key, None, key + 5, None)
+    expected[key] = key + 5
+results['vector sums'] = query.sum(0, CELLS_PER_PAGE * 3 - 1, 1) == sum(expected.values()) and \
+    query.sum(100, 700, 1) == sum(expected[key] for key in range(100, 701)) and query.sum(0, CELLS_PER_PAGE * 3 - 1, 2) == CELLS_PER_PAGE * 3
+db.close()
+shutil.rmtree(folder)
+
+### Page encodings (user-016) ###
+# A page is stored with the smallest of FOR, DICT and RLE, reads decode and a write turns it plain again
+def encoded_page(values):
+    page = Page()
+    for value in values:
+        page.write(int_to_bytes(value))
+    return page, page.encode()
+
+cells = Page().cells_per_page
+samples = {
+    'for': [2**40 + (value * 37) % 200 for value in range(cells)],
+    'dict': [[2**50, 7, 2**63, 12345][value % 4] for value in range(cells)],
+    'rle': [value // 100 * 2**45 for value in range(cells)],
+}
+for name, values in samples.items():
+    page, page_encoding = encoded_page(values)
+    results['encoding %s chosen' % name] = encoding.NAMES[page_encoding] == name and page.num_bytes < PAGE_SIZE
+    results['encoding %s reads' % name] = list(page.read_all()) == values and list(page.read_range(100, 250)) == values[100:250] and \
+        int_from_bytes(page.read(cells - 1)) == values[-1] and page.read_tps() == RESERVED_TID
+
+    page.write_to_cell(int_to_bytes(99), 3)
+    values[3] = 99
+    results['encoding %s write decodes' % name] = page.encoding == encoding.PLAIN and page.num_bytes == PAGE_SIZE and \
+        list(page.read_all()) == values
+
+# Values spread over the whole range have nothing smaller than the plain page
+page, page_encoding = encoded_page([(value * 0x9E3779B97F4A7C15) % 2**64 for value in range(cells)])
+results['encoding random stays plain'] = page_encoding == encoding.PLAIN and page.num_bytes == PAGE_SIZE
+
+# A merge encodes the full data pages, the encoded pages are written and read back
+folder = tempfile.mkdtemp()
+db = Database(warm_restart=False)
+db.open(folder)
+query = Query(db.create_table('Grades', 3, 0))
+for key in range(CELLS_PER_PAGE * 2):
+    query.insert(key, key % 3, 2**40)
+for key in range(0, CELLS_PER_PAGE * 2, 9):
+    query.update(key, None, 2, None)
+merge = MergeJob(query.table, encode=True)
+merge.run()
+results['encoding merge'] = sum(merge.encoded_pages.values()) > 0 and merge.encoded_pages['plain'] < sum(merge.encoded_pages.values())
+db.close()
+
+db = Database(warm_restart=False)
+db.open(folder)
+query = Query(db.get_table('Grades'))
+bad = 0
+for key in range(CELLS_PER_PAGE * 2):
+    expected = [key, 2 if key % 9 == 0 else key % 3, 2**40]
+    if query.select(key, 0, [1, 1, 1])[0].columns != expected:
+        bad += 1
+query.update(1, None, None, 5)
+results['encoding round trip'] = bad == 0 and query.select(1, 0, [1, 1, 1])[0].columns == [1, 1, 5]
+db.close()
+shutil.rmtree(folder)
+
+### Narrow cells (user-017) ###
+# A page of 1, 2 or 4 byte cells holds that many times more records, range reads widen the cells to 8 bytes
+for cell_size in (1, 2, 4):
+    page = Page(cell_size=cell_size)
+    values = [(value * 31) % (1 << cell_size * 8) for value in range(page.cells_per_page)]
+    for value in values:
+        page.write(int_to_bytes(value))
+    results['narrow %d cells per page' % cell_size] = page.cells_per_page == (PAGE_SIZE - CELL_SIZE_BYTES) // cell_size and not page.has_capacity()
+    results['narrow %d reads' % cell_size] = list(page.read_all()) == values and int_from_bytes(page.read(5)) == values[5] and \
+        list(page.read_range(7, 9)) == values[7:9]
+
+    page.write_to_cell(int_to_bytes(values[0] + 1), 0)
+    copy = page.copy()
+    results['narrow %d copy' % cell_size] = copy.cell_size == cell_size and int_from_bytes(copy.read(0)) == values[0] + 1
+
+# Values that don't fit their column are refused, narrow base pages need fewer pages for the same rows
+folder = tempfile.mkdtemp()
+db = Database(warm_restart=False)
+db.open(folder)
+wide = Query(db.create_table('Wide', 3, 0))
+narrow = Query(db.create_table('Narrow', 3, 0, column_types=[64, 8, 16]))
+for key in range(CELLS_PER_PAGE * 2):
+    wide.insert(key, key % 256, key)
+    narrow.insert(key, key % 256, key)
+def base_pages(table):
+    return sum(page_range.base_page_count for page_range in table.page_ranges)
+results['narrow fewer pages'] = base_pages(narrow.table) < base_pages(wide.table)
+results['narrow select'] = narrow.select(300, 0, [1, 1, 1])[0].columns == [300, 300 % 256, 300]
+
+refused = 0
+for columns in [(CELLS_PER_PAGE * 2, 256, 0), (CELLS_PER_PAGE * 2, 0, 1 << 16), (CELLS_PER_PAGE * 2, -1, 0)]:
+    try:
+        narrow.insert(*columns)
+    except Exception:
+        refused += 1
+try:
+    narrow.update(1, None, 300, None)
+except Exception:
+    refused += 1
+results['narrow refused'] = refused == 4 and narrow.select(1, 0, [1, 1, 1])[0].columns == [1, 1, 1]
+
+try:
+    db.create_table('Odd', 2, 0, column_types=[64, 12])
+    results['narrow unknown type'] = False
+except Exception:
+    results['narrow unknown type'] = True
+db.close()
+shutil.rmtree(folder)
+
+print(results)
+sys.exit(0 if all(results.values()) else 1)
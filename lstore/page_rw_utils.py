@@ -3,6 +3,8 @@ from pagerange import PageRange
 from util import *
 from config import *
 
+import compression
+
 ### Utility functions to read and write from and to disk ###
 
 
@@ -20,36 +22,105 @@ def encode_pagerange(pr):
     BYTES_base_pages = b''
     for i in range(pr.base_page_count):
         page = pr.base_pages[i]
-        BYTES_base_pages += encode_page(page)  # 8 + PAGE_SIZE
+        BYTES_base_pages += encode_page(page).ljust(SIZE_ENCODED_PAGE, b'\0')  # PAGE_HEADER_SIZE + PAGE_SIZE
 
     # Write Tail Pages
     BYTES_tail_pages = b''
     for i in range(pr.tail_page_count):
         page = pr.tail_pages[i]
-        BYTES_tail_pages += encode_page(page)
+        BYTES_tail_pages += encode_page(page).ljust(SIZE_ENCODED_PAGE, b'\0')
 
     write = b''
     write += BYTES_base_page_count  # 8 bytes
     write += BYTES_tail_page_count  # 8 bytes
-    write += BYTES_base_pages      # num_bp * (8+PAGE_SIZE)
-    write += BYTES_tail_pages      # num_tp * (8+PAGE_SIZE)
+    write += BYTES_base_pages      # num_bp * SIZE_ENCODED_PAGE
+    write += BYTES_tail_pages      # num_tp * SIZE_ENCODED_PAGE
 
     return write
 
+### Header of a page on disk ###
+# :param page:      #Loaded page
+# :param codec_id:  #Codec the data is compressed with, see compression.py
+# :param num_bytes: #Size of the compressed data
+# :returns int:     #Number of records, plus the size of the data above ENCODED_SIZE_SHIFT if the page is encoded
+#                   #And the cell size above CELL_SIZE_SHIFT if the page has narrow cells
+#                   #And the codec above CODEC_SHIFT if the data is compressed, the size is then the compressed one
+def page_header(page: Page, codec_id=compression.NONE, num_bytes=None):
+    header = page.num_records
+
+    if num_bytes is None:
+        num_bytes = page.num_bytes
+    if num_bytes != PAGE_SIZE or codec_id != compression.NONE:
+        header |= num_bytes << ENCODED_SIZE_SHIFT
+
+    if page.cell_size != CELL_SIZE_BYTES:
+        header |= page.cell_size << CELL_SIZE_SHIFT
+
+    header |= codec_id << CODEC_SHIFT
+
+    return header
+
+### Splits a page header ###
+# :param header: int    #See page_header
+# :returns tuple:       #(number of records, size of the page data on disk, cell size, codec id)
+def split_page_header(header):
+    num_records = header & ((1 << ENCODED_SIZE_SHIFT) - 1)
+    num_bytes = (header >> ENCODED_SIZE_SHIFT) & ((1 << (CELL_SIZE_SHIFT - ENCODED_SIZE_SHIFT)) - 1)
+    cell_size = (header >> CELL_SIZE_SHIFT) & ((1 << (CODEC_SHIFT - CELL_SIZE_SHIFT)) - 1)
+    codec_id = header >> CODEC_SHIFT
+    return num_records, num_bytes or PAGE_SIZE, cell_size or CELL_SIZE_BYTES, codec_id
+
+### Header of a page slot ###
+# :param page:      #Loaded page
+# :returns bytes:   #PAGE_HEADER_SIZE bytes, the page_header then the zone map and tail page columns (see encode_page_zone)
+def encode_page_header(page: Page, codec_id=compression.NONE, num_bytes=None):
+    return int_to_bytes(page_header(page, codec_id, num_bytes)) + encode_page_zone(page)
+
+### Zone map part of a page header ###
+# :param page:      #Page, loaded or not
+# :returns bytes:   #Zone map min, max and count, then the tail page columns, 8 bytes each
+#                   #A zone map without values is stored with a count of 0
+#                   #Written on its own at 8 bytes into the slot when only the zone map changed
+def encode_page_zone(page: Page):
+    out = int_to_bytes(page.zone_min or 0)
+    out += int_to_bytes(page.zone_max or 0)
+    out += int_to_bytes(page.zone_count if page.zone_min is not None else 0)
+    out += int_to_bytes(page.tail_columns)
+    return out
+
+### Reads the header of a page slot into a page ###
+# :param page:      #Page to set the number of records, cell size, zone map and tail page columns of
+# :param BYTES_header:  #First PAGE_HEADER_SIZE bytes of the slot
+# :returns tuple:   #(size of the page data in the slot, codec id)
+def decode_page_header(page: Page, BYTES_header):
+    num_records, num_bytes, page.cell_size, codec_id = split_page_header(int_from_bytes(BYTES_header[0:8]))
+    page.num_records = num_records
+    page.stored_bytes = num_bytes
+
+    zone_count = int_from_bytes(BYTES_header[24:32])
+    if zone_count:
+        page.zone_min = int_from_bytes(BYTES_header[8:16])
+        page.zone_max = int_from_bytes(BYTES_header[16:24])
+    page.zone_count = zone_count
+    page.tail_columns = int_from_bytes(BYTES_header[32:40])
+    return num_bytes, codec_id
+
 ### Encodes all the information of a page ###
 # :param page:      #Page to encode
-# :brief    :       #Writes the num of records and data to a byte array
-def encode_page(page: Page):
+# :param codec:     #Name of the codec to compress the data with, None to store it as is, see compression.py
+# :brief    :       #Writes the header and data to a byte array
+#                   #An encoded or compressed page only writes its own bytes, the rest of its slot is left as is
+def encode_page(page: Page, codec=None):
     if page == None:
-        num_records = 0
+        header = bytearray(PAGE_HEADER_SIZE)
         data = bytearray(PAGE_SIZE)
     else:
-        num_records = page.num_records
-        data = page._data
+        codec_id, data = compression.compress(page._data, codec)
+        header = encode_page_header(page, codec_id, len(data))
 
     out = b''
-    out += int_to_bytes(num_records)  # 8
-    out += bytearray(data)            # PAGE_SIZE
+    out += header                     # PAGE_HEADER_SIZE
+    out += bytearray(data)            # PAGE_SIZE or less
 
     return out
 
@@ -67,7 +138,7 @@ def decode_pagerange(BYTES_pr) -> PageRange:
     pr.tail_page_count = int_from_bytes(BYTES_tail_page_count)
 
     # Read Base Pages
-    bytes_page_size = 8 + PAGE_SIZE
+    bytes_page_size = SIZE_ENCODED_PAGE
     offset_end_base = 16
 
     for i in range(pr.base_page_count):
@@ -90,15 +161,35 @@ def decode_pagerange(BYTES_pr) -> PageRange:
 
     return pr
 
+### Decodes only the meta info of a pagerange ###
+# :param BYTES_meta:    #First PR_META_OFFSETS[-1] bytes of an encoded pagerange
+# :brief    :           #Makes the pagerange with unloaded pages so they can be loaded later by the bufferpool
+def decode_pagerange_meta(BYTES_meta) -> PageRange:
+
+    pr = PageRange()
+
+    pr.base_page_count = int_from_bytes(BYTES_meta[PR_META_OFFSETS[0]:PR_META_OFFSETS[1]])
+    pr.tail_page_count = int_from_bytes(BYTES_meta[PR_META_OFFSETS[1]:PR_META_OFFSETS[2]])
+
+    for i in range(pr.base_page_count):
+        pr.base_pages[i] = Page(True)
+
+    for i in range(pr.tail_page_count):
+        pr.tail_pages.append(Page(True))
+
+    return pr
+
 ### Decodes a page ###
 # :param page:      #Bytes that contain the info of a page
 def decode_page(BYTES_page) -> Page:
     page = Page(True) # type: Page
     # data, num_records=None, is_dirty=None, force=False):
     # is_loaded = True
-    num_records = int_from_bytes(BYTES_page[0:8])
-    data = bytearray(BYTES_page[8:])
-    page.load(data, num_records)
+    num_bytes, codec_id = decode_page_header(page, BYTES_page[:PAGE_HEADER_SIZE])
+    data = bytearray(BYTES_page[PAGE_HEADER_SIZE:PAGE_HEADER_SIZE + num_bytes])
+    if codec_id != compression.NONE:
+        data = compression.decompress(data, codec_id)
+    page.load(data, page.num_records)
     return page
 
 # test stuff
@@ -0,0 +1,82 @@
+import threading
+import tracemalloc
+from time import perf_counter
+from random import randrange
+
+from config import *
+from pagedirectory import PageDirectory, MetaRecord
+from pagerange import BaseLayout
+
+### Page directory benchmarks ###
+# Run from the lstore folder: python pagedirectory.bench.py
+# Compares the packed directory with the dict of MetaRecords it replaced
+# Every base record gets an update of one column, like a table after NUM_RECORDS updates
+
+NUM_RECORDS = 100000
+NUM_COLUMNS = 5
+NUM_LOOKUPS = 100000
+NUM_TOTAL_COLS = START_USER_DATA_COLUMN + NUM_COLUMNS
+LAYOUT = BaseLayout([CELL_SIZE_BYTES] * NUM_TOTAL_COLS)
+
+### Makes the records of a table ###
+# :returns list:        #(rid, MetaRecord) of the base records, then of the tail records
+def make_records():
+    records = []
+    for rid in range(1, NUM_RECORDS + 1):
+        columns = [LAYOUT.pid(col, rid) for col in range(NUM_TOTAL_COLS)]
+        records.append((rid, MetaRecord(rid, 906659671 + rid, columns)))
+
+    for i in range(NUM_RECORDS):
+        rid = RESERVED_TID - 1 - i
+        updated = randrange(NUM_COLUMNS)
+        columns = [[i % CELLS_PER_PAGE, 16 + i // CELLS_PER_PAGE, randrange(NUM_RECORDS // 1000)] for _ in range(START_USER_DATA_COLUMN)]
+        columns += [[i % CELLS_PER_PAGE, 16 + i // CELLS_PER_PAGE, 0] if col == updated else None for col in range(NUM_COLUMNS)]
+        records.append((rid, MetaRecord(rid, 906659671 + i, columns)))
+    return records
+
+### Bytes allocated to hold the records ###
+# :param make:          #Builds the directory from the records
+def allocated_bytes(make):
+    tracemalloc.start()
+    directory = make(make_records())
+    num_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return directory, num_bytes
+
+# The dict of MetaRecords with one Lock each, as tables kept it before
+def make_dict(records):
+    directory = {}
+    for rid, record in records:
+        record.latch = threading.Lock()
+        directory[rid] = record
+    return directory
+
+def make_packed(records):
+    directory = PageDirectory(NUM_TOTAL_COLS, LAYOUT)
+    for rid, record in records:
+        directory[rid] = record
+    return directory
+
+### Seconds per lookup of the RID column of a random base record ###
+def lookup_time(lookup):
+    rids = [randrange(1, NUM_RECORDS + 1) for _ in range(NUM_LOOKUPS)]
+    start = perf_counter()
+    for rid in rids:
+        lookup(rid)
+    return (perf_counter() - start) / NUM_LOOKUPS
+
+if __name__ == '__main__':
+    print("Page directory of %d base and %d tail records" % (NUM_RECORDS, NUM_RECORDS))
+
+    records, num_bytes = allocated_bytes(make_dict)
+    dict_per_record = num_bytes / len(records)
+    print("dict:\t%.0f bytes per record, %.2f us per lookup" % (dict_per_record,
+        lookup_time(lambda rid: records[rid].columns[RID_COLUMN]) * 1e6))
+    del records
+
+    packed, num_bytes = allocated_bytes(make_packed)
+    packed_per_record = num_bytes / len(packed)
+    print("packed:\t%.0f bytes per record (%.0fx smaller), %.2f us per pid lookup, %.2f us per MetaRecord" % (
+        packed_per_record, dict_per_record / packed_per_record,
+        lookup_time(lambda rid: packed.pid(rid, RID_COLUMN)) * 1e6,
+        lookup_time(lambda rid: packed[rid].columns[RID_COLUMN]) * 1e6))
@@ -0,0 +1,294 @@
+from config import *
+from array import array
+from collections import defaultdict
+
+import threading
+
+### Packed page directory ###
+# Maps the RID of every base and tail record to the pids of its columns
+# Base records:     The RID of a base record is its row number, so its pids are computed (see BaseLayout.pid)
+#                   Only its key and whether it is there are kept, at slot rid, base RIDs count up from 1
+# Tail records:     A pid (cell index, inner page index, pagerange index) is packed into one unsigned 64 bit int
+#                   The packed pids of each column sit in an array('Q'), the slab of that column
+#                   At slot RESERVED_TID - rid - offset, tail RIDs count down from RESERVED_TID - 1
+#                   The offset starts at 0 and moves up as the slots of reclaimed records are cut off, see compact_tails
+#                   A column the record didn't update, or any column of a record that isn't there, holds EMPTY
+#                   A record is there when its RID column is not EMPTY, it is written last so readers never see half a record
+# MetaRecords are only made when a record is looked up, see PageDirectory.__getitem__
+
+EMPTY = 2**64 - 1
+TAIL_RIDS = 1 << 63 # RIDs from here on are tail RIDs
+
+PAGE_SHIFT = PID_CELL_BITS
+RANGE_SHIFT = PID_CELL_BITS + PID_PAGE_BITS
+CELL_MASK = (1 << PID_CELL_BITS) - 1
+PAGE_MASK = (1 << PID_PAGE_BITS) - 1
+
+# Packs a pid into one int, EMPTY for None
+def pack_pid(pid):
+    if pid is None:
+        return EMPTY
+    cell_idx, inner_page_idx, page_range_idx = pid
+    return cell_idx | inner_page_idx << PAGE_SHIFT | page_range_idx << RANGE_SHIFT
+
+# Unpacks a pid, None for EMPTY
+def unpack_pid(packed):
+    if packed == EMPTY:
+        return None
+    return [packed & CELL_MASK, packed >> PAGE_SHIFT & PAGE_MASK, packed >> RANGE_SHIFT]
+
+class MetaRecord:
+    def __init__(self, rid, key, columns):
+        self.rid = rid
+        self.key = key
+        self.columns = columns
+
+    def copy(self):
+        copy = MetaRecord(self.rid, self.key, self.columns)
+        return copy
+
+class PageDirectory:
+
+    ### Initializer for the page directory ###
+    # :param num_total_cols:    #Number of meta and user columns of the table
+    # :param base_layout:       #BaseLayout of the table, places the cells of base records
+    def __init__(self, num_total_cols, base_layout):
+        self.num_total_cols = num_total_cols
+        self.base_layout = base_layout
+        self.base_present = bytearray() # 1 if the base record is there
+        self.base_keys = array('Q')
+        # (offset, column -> packed pids of tail records, keys of tail records), replaced as a whole by compact_tails
+        self.tails = (0, [array('Q') for _ in range(num_total_cols)], array('Q'))
+        self.page_cells = defaultdict(int) # inner_idx | page_range_idx << PID_PAGE_BITS -> cells of tail records in the page
+        self.num_records = 0
+        self.deleted = None # MetaRecords of deleted records, looked up with RID 0
+        self.lock = threading.Lock() # taken by writes, slabs grow when a record is set past their end
+
+    # Slabs of the tail records and the slot of a tail RID in them, the slot is negative if the RID was cut off
+    def _tail_slot(self, rid):
+        offset, columns, keys = self.tails
+        return columns, keys, RESERVED_TID - rid - offset
+
+    # True if a base RID is there
+    def _has_base(self, rid):
+        return 0 < rid < len(self.base_present) and self.base_present[rid] == 1
+
+    ### Gets one pid of a record ###
+    # :param rid:           #RID of the record
+    # :param column:        #Index of the column, meta columns included
+    # :returns list:        #[cell_idx, page_idx, page_range_idx], None if the record or column isn't there
+    # :brief    :           #Used by hot paths that only need a few columns, no MetaRecord is made
+    def pid(self, rid, column):
+        if rid < TAIL_RIDS:
+            return self.base_layout.pid(column, rid) if self._has_base(rid) else None
+
+        columns, _, idx = self._tail_slot(rid)
+        slab = columns[column]
+        if not 0 <= idx < len(slab):
+            return None
+        return unpack_pid(slab[idx])
+
+    def __contains__(self, rid):
+        if rid == 0:
+            return self.deleted is not None
+        if rid < TAIL_RIDS:
+            return self._has_base(rid)
+        columns, _, idx = self._tail_slot(rid)
+        slab = columns[RID_COLUMN]
+        return 0 <= idx < len(slab) and slab[idx] != EMPTY
+
+    ### Looks up a record ###
+    # :param rid:           #RID of the record, 0 for the list of deleted records
+    # :returns MetaRecord:  #A new MetaRecord made from the slabs, changing it doesn't change the directory
+    def __getitem__(self, rid):
+        if rid == 0:
+            if self.deleted is None:
+                raise KeyError(rid)
+            return self.deleted
+
+        if rid < TAIL_RIDS:
+            if not self._has_base(rid):
+                raise KeyError(rid)
+            pid = self.base_layout.pid
+            return MetaRecord(rid, self.base_keys[rid], [pid(column, rid) for column in range(self.num_total_cols)])
+
+        columns, keys, idx = self._tail_slot(rid)
+        if not 0 <= idx < len(keys) or columns[RID_COLUMN][idx] == EMPTY:
+            raise KeyError(rid)
+        return MetaRecord(rid, keys[idx], [unpack_pid(slab[idx]) for slab in columns])
+
+    def get(self, rid, default=None):
+        try:
+            return self[rid]
+        except KeyError:
+            return default
+
+    ### Sets a record ###
+    # :param rid:           #RID of the record, 0 for the list of deleted records
+    # :param record:        #MetaRecord with one pid per column, None for a column a tail record didn't update
+    #                       #Only the key of a base record is kept, its pids follow from its RID
+    def __setitem__(self, rid, record):
+        if rid == 0:
+            self.deleted = record
+            return
+
+        if rid < TAIL_RIDS:
+            self.set_base(rid, record.key)
+            return
+
+        with self.lock:
+            columns, keys, idx = self._tail_slot(rid)
+            if idx < 0:
+                raise KeyError(rid)
+            if idx >= len(keys):
+                # RIDs are handed out before their records are set, so slots can be set out of order
+                gap = array('Q', [EMPTY]) * (idx + 1 - len(keys))
+                keys.extend(gap)
+                for slab in columns:
+                    slab.extend(gap)
+
+            is_new = columns[RID_COLUMN][idx] == EMPTY
+            if not is_new:
+                self._count_cells(columns, idx, -1)
+
+            keys[idx] = record.key
+            for column, pid in enumerate(record.columns):
+                if column != RID_COLUMN:
+                    columns[column][idx] = pack_pid(pid)
+            columns[RID_COLUMN][idx] = pack_pid(record.columns[RID_COLUMN])
+            self._count_cells(columns, idx, 1)
+
+            if is_new:
+                self.num_records += 1
+
+    ### Sets a base record ###
+    # :param rid:           #RID of the record, its row number
+    # :param key:           #Primary key of the record
+    def set_base(self, rid, key):
+        with self.lock:
+            if rid >= len(self.base_keys):
+                # RIDs are handed out before their records are set, so slots can be set out of order
+                gap = rid + 1 - len(self.base_keys)
+                self.base_keys.extend(array('Q', [0]) * gap)
+                self.base_present.extend(bytes(gap))
+
+            self.base_keys[rid] = key
+            if not self.base_present[rid]:
+                self.base_present[rid] = 1
+                self.num_records += 1
+
+    def __delitem__(self, rid):
+        if rid == 0:
+            if self.deleted is None:
+                raise KeyError(rid)
+            self.deleted = None
+            return
+
+        with self.lock:
+            if rid not in self:
+                raise KeyError(rid)
+            if rid < TAIL_RIDS:
+                self.base_present[rid] = 0
+                self.num_records -= 1
+                return
+
+            columns, _, idx = self._tail_slot(rid)
+            self._count_cells(columns, idx, -1)
+            columns[RID_COLUMN][idx] = EMPTY # gone for readers before its other columns are
+            for slab in columns:
+                slab[idx] = EMPTY
+            self.num_records -= 1
+
+    ### Counts the cells a tail record has in each tail page ###
+    # :param columns:       #Slabs the record is in
+    # :param idx:           #Slot of the record
+    # :param delta:         #1 when the record is set, -1 when it is removed
+    # :brief    :           #Caller must hold self.lock, pages left with no cells have no entry
+    def _count_cells(self, columns, idx, delta):
+        cells = self.page_cells
+        for slab in columns:
+            packed = slab[idx]
+            if packed == EMPTY:
+                continue
+
+            page = packed >> PAGE_SHIFT
+            count = cells[page] + delta
+            if count:
+                cells[page] = count
+            else:
+                del cells[page]
+
+    # Number of cells of tail records in a tail page, 0 once no record points into it
+    def tail_page_cells(self, inner_page_idx, page_range_idx):
+        return self.page_cells.get(inner_page_idx | page_range_idx << PID_PAGE_BITS, 0)
+
+    ### Oldest tail records ###
+    # :param bound:         #Smallest RID, tail RIDs count down so the records from it up are the oldest
+    # :returns list:        #(rid, key) of each tail record from bound up
+    def oldest_tails(self, bound):
+        offset, columns, keys = self.tails
+        rids = columns[RID_COLUMN]
+        end = min(len(rids), RESERVED_TID - bound - offset + 1)
+        return [(RESERVED_TID - offset - idx, keys[idx]) for idx in range(end) if rids[idx] != EMPTY]
+
+    ### Cuts off the empty slots of the oldest tail records ###
+    # :param bound:         #Smallest RID whose slot can be cut, later RIDs may be handed out and not set yet
+    # :returns int:         #Number of slots cut off
+    # :brief    :           #Once a merge reclaimed the oldest tail records their slots are at the start of the slabs
+    #                       #New slabs without them replace the old ones in one assignment and the offset moves up
+    #                       #So a lookup that got the old ones still finds its record in them
+    def compact_tails(self, bound):
+        with self.lock:
+            offset, columns, keys = self.tails
+            rids = columns[RID_COLUMN]
+            end = min(len(rids), RESERVED_TID - bound - offset + 1)
+
+            # EMPTY is all 0xff bytes, so the leading empty slots are the leading 0xff bytes
+            head = rids[:max(end, 0)].tobytes()
+            num_slots = (len(head) - len(head.lstrip(b'\xff'))) // rids.itemsize
+            if num_slots == 0:
+                return 0
+
+            self.tails = (offset + num_slots, [slab[num_slots:] for slab in columns], keys[num_slots:])
+            return num_slots
+
+    def pop(self, rid, *default):
+        try:
+            record = self[rid]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[rid]
+        return record
+
+    # Number of records, plus one for the list of deleted records like a dict keyed by RID
+    def __len__(self):
+        return self.num_records + (self.deleted is not None)
+
+    ### RIDs in the directory ###
+    # :brief    :       #0 if there are deleted records, then base RIDs counting up and tail RIDs counting down
+    def __iter__(self):
+        if self.deleted is not None:
+            yield 0
+        for rid, present in enumerate(self.base_present):
+            if present:
+                yield rid
+        offset, columns, _ = self.tails
+        for idx, packed in enumerate(columns[RID_COLUMN]):
+            if packed != EMPTY:
+                yield RESERVED_TID - offset - idx
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for rid in self:
+            yield rid, self[rid]
+
+    ### Bytes held by the slabs ###
+    # :returns int:     #Bytes of the keys and packed pids, the list of deleted records is not counted
+    def num_bytes(self):
+        _, columns, keys = self.tails
+        slabs = columns + [self.base_keys, keys]
+        return len(self.base_present) + sum(slab.buffer_info()[1] * slab.itemsize for slab in slabs)
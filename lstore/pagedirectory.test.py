@@ -0,0 +1,161 @@
+import shutil
+import sys
+import tempfile
+
+from config import *
+from db import Database
+from pagedirectory import *
+from pagerange import BaseLayout
+from query import Query
+
+### Page directory lookups, tail slabs and the meta file ###
+# Run from the lstore folder: python pagedirectory.test.py
+# Each check is True if the directory gave back the pids it should have, the script exits 1 if one isn't
+
+NUM_COLS = START_USER_DATA_COLUMN + 3
+
+# Pid of a tail record's column, the pagerange is the column so pids of a record differ
+def tail_pid(cell_idx, column):
+    return [cell_idx, 100 + cell_idx // 10, column]
+
+# Tail record whose odd user columns weren't updated
+def tail_record(rid, key):
+    columns = [tail_pid(RESERVED_TID - rid, column) for column in range(NUM_COLS)]
+    for column in range(START_USER_DATA_COLUMN + 1, NUM_COLS, 2):
+        columns[column] = None
+    return MetaRecord(rid, key, columns)
+
+# Records of a directory as comparable tuples
+def records(directory):
+    return [(rid, record.key, record.columns) for rid, record in directory.items() if rid != 0]
+
+results = {}
+
+### Packed tail slabs (user-021) ###
+pids = [[0, 0, 0], [CELL_MASK, PAGE_MASK, 0], [7, 3, (1 << 24) - 1]]
+results['pack pid'] = [unpack_pid(pack_pid(pid)) for pid in pids] == pids and pack_pid(None) == EMPTY and unpack_pid(EMPTY) is None
+
+directory = PageDirectory(NUM_COLS, BaseLayout([CELL_SIZE_BYTES] * NUM_COLS))
+tail_rids = [RESERVED_TID - 1 - num for num in range(40)]
+
+# RIDs are handed out before their records are set, so they can be set out of order
+for rid in reversed(tail_rids):
+    directory[rid] = tail_record(rid, rid % 1000)
+expected = tail_record(tail_rids[5], tail_rids[5] % 1000)
+record = directory[tail_rids[5]]
+results['tail get'] = (record.rid, record.key, record.columns) == (expected.rid, expected.key, expected.columns) and \
+    directory.pid(tail_rids[5], START_USER_DATA_COLUMN) == expected.columns[START_USER_DATA_COLUMN]
+results['tail empty column'] = record.columns[START_USER_DATA_COLUMN + 1] is None and directory.pid(tail_rids[5], START_USER_DATA_COLUMN + 1) is None
+results['tail count'] = len(directory) == 40 and list(directory) == tail_rids and RESERVED_TID - 41 not in directory
+
+# A changed record moves its cell counts to its new pages
+directory[tail_rids[0]] = MetaRecord(tail_rids[0], 1, [[0, 900, column] for column in range(NUM_COLS)])
+results['tail page cells'] = directory.tail_page_cells(900, RID_COLUMN) == 1 and directory.tail_page_cells(100, RID_COLUMN) == 8
+
+# Deleted slots read as missing, then the leading empty slots of the oldest records are cut off
+for rid in tail_rids[:10] + tail_rids[12:15]:
+    del directory[rid]
+results['tail delete'] = tail_rids[3] not in directory and directory.get(tail_rids[3]) is None and \
+    directory.pid(tail_rids[3], RID_COLUMN) is None and directory.tail_page_cells(100, RID_COLUMN) == 0
+results['oldest tails'] = directory.oldest_tails(tail_rids[15]) == [(rid, rid % 1000) for rid in tail_rids[10:12] + tail_rids[15:16]]
+
+num_bytes = directory.num_bytes()
+# The first tail RID is RESERVED_TID - 1, so slot 0 is empty from the start
+results['compact tails'] = directory.compact_tails(tail_rids[20]) == 11 and directory.tails[0] == 11 and \
+    directory.compact_tails(tail_rids[20]) == 0 and directory.num_bytes() < num_bytes
+results['compacted lookups'] = directory[tail_rids[11]].key == tail_rids[11] % 1000 and tail_rids[12] not in directory and \
+    list(directory) == tail_rids[10:12] + tail_rids[15:]
+
+try:
+    directory[tail_rids[2]] = tail_record(tail_rids[2], 0)
+    results['cut slot refused'] = False
+except KeyError:
+    results['cut slot refused'] = True
+
+# The list of deleted records is looked up with RID 0 and counted like a record
+directory[0] = MetaRecord(0, 0, [1, 2])
+results['deleted records'] = 0 in directory and directory[0].columns == [1, 2] and len(directory) == 28 and list(directory)[0] == 0
+del directory[0]
+
+# A tail record takes 8 bytes per column and its key
+directory = PageDirectory(NUM_COLS, BaseLayout([CELL_SIZE_BYTES] * NUM_COLS))
+for num in range(10000):
+    rid = RESERVED_TID - 1 - num
+    directory[rid] = tail_record(rid, num)
+results['tail bytes per record'] = directory.num_bytes() <= 10000 * (NUM_COLS + 1) * 8 * 1.2
+
+# The directory of a table is written to its meta file and read back the same
+folder = tempfile.mkdtemp()
+db = Database(warm_restart=False)
+db.open(folder)
+table = db.create_table('Grades', 3, 0)
+query = Query(table)
+for key in range(CELLS_PER_PAGE + 50):
+    query.insert(key, key, key)
+for key in range(0, CELLS_PER_PAGE + 50, 4):
+    query.update(key, None, key + 1, None)
+for key in range(1, CELLS_PER_PAGE, 50):
+    query.delete(key)
+before = records(table.page_directory)
+db.close()
+
+db = Database(warm_restart=False)
+db.open(folder)
+table = db.get_table('Grades')
+query = Query(table)
+results['meta round trip'] = records(table.page_directory) == before and query.select(4, 0, [1, 1, 1])[0].columns == [4, 5, 4] and \
+    query.select(1, 0, [1, 1, 1]) == []
+db.close()
+shutil.rmtree(folder)
+
+### Base pids from the RID (user-022) ###
+# The layout gives the same page index as counting the pages made while rows are inserted
+cell_sizes = [CELL_SIZE_BYTES] * START_USER_DATA_COLUMN + [1, 8, 2, 4]
+layout = BaseLayout(cell_sizes)
+made = {}
+for block in range(layout.period * 3):
+    for col_idx, span in enumerate(layout.spans):
+        if block % span == 0:
+            made[(col_idx, block // span)] = len(made)
+results['base layout'] = all(layout.outer_page_idx(col_idx, col_page_num) == outer for (col_idx, col_page_num), outer in made.items())
+
+row = CELLS_PER_PAGE * 9 + 3
+outer = layout.outer_page_idx(START_USER_DATA_COLUMN, 1)
+results['base pid'] = layout.pid(START_USER_DATA_COLUMN, row) == [row - 1 - CELLS_PER_PAGE * 8, outer % PAGE_RANGE_MAX_BASE_PAGES, outer // PAGE_RANGE_MAX_BASE_PAGES] and \
+    layout.pid(RID_COLUMN, 1) == [0, RID_COLUMN, 0]
+
+# Only the key of a base record is kept, set in any order
+directory = PageDirectory(len(cell_sizes), layout)
+directory.set_base(5, 50)
+directory.set_base(2, 20)
+record = directory[5]
+results['base record'] = record.key == 50 and record.columns == [layout.pid(column, 5) for column in range(len(cell_sizes))] and \
+    3 not in directory and directory.pid(3, RID_COLUMN) is None and list(directory) == [2, 5]
+del directory[2]
+results['base delete'] = 2 not in directory and len(directory) == 1 and directory.num_bytes() < 100
+
+# Every cell a computed pid points to holds the value of its row, across pageranges and narrow columns
+folder = tempfile.mkdtemp()
+db = Database(warm_restart=False)
+db.open(folder)
+table = db.create_table('Grades', 3, 0, column_types=[64, 8, 16])
+query = Query(table)
+num_rows = CELLS_PER_PAGE * (PAGE_RANGE_MAX_BASE_PAGES + 2)
+for key in range(num_rows):
+    query.insert(key, key % 256, key % 65536)
+
+bad = 0
+with table.bp.handles() as pages:
+    for key in range(0, num_rows, 37):
+        rid = table.key_index[key]
+        for column, value in enumerate([key, key % 256, key % 65536]):
+            if int.from_bytes(pages.read(table.page_directory.pid(rid, START_USER_DATA_COLUMN + column)), BYTE_ORDER) != value:
+                bad += 1
+        if int.from_bytes(pages.read(table.page_directory.pid(rid, RID_COLUMN)), BYTE_ORDER) != rid:
+            bad += 1
+results['base pids hold rows'] = bad == 0 and table.page_directory.pid(table.key_index[num_rows - 1], RID_COLUMN)[2] > 0
+db.close()
+shutil.rmtree(folder)
+
+print(results)
+sys.exit(0 if all(results.values()) else 1)
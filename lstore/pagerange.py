@@ -7,6 +7,8 @@ import threading
 # Each pagerange was a max number of base pages (set to 16)
 # Base pages are read only and store the original record
 # Tail pages append only and contain all updates to records
+# Each column has its own chain of tail pages, so reading a column's updates only loads pages of that column
+# Tail pages a merge reclaimed leave their chain, their slots are reused by the next tail pages made
 
 class PageRange:
 
@@ -19,6 +21,8 @@ class PageRange:
         self.tail_pages = []
         self.base_page_count = 0
         self.tail_page_count = 0
+        self.tail_chains = {} # column -> inner indexes of its tail pages, oldest first
+        self.free_tail_pages = [] # inner indexes of reclaimed tail pages, see free_tail_page
         self.tail_page_lock = threading.Lock()
 
     # Returns true if the number of base pages is less than max base pages
@@ -27,14 +31,15 @@ class PageRange:
 
 
     ### Creates new base page ###
+    # :param cell_size:     #Bytes per cell of the column the page belongs to
     # :returns tuple:       #Tuple of two contaning (page index, new page object)
-    def create_base_page(self):
+    def create_base_page(self, cell_size=CELL_SIZE_BYTES):
 
         if self.base_page_count >= PAGE_RANGE_MAX_BASE_PAGES:
             raise Exception('Trying to create base page on full page range')
 
         inner_page_index = self.base_page_count
-        new_page = Page()
+        new_page = Page(cell_size=cell_size)
         self.base_pages[inner_page_index] = new_page
 
         self.base_page_count += 1
@@ -42,23 +47,69 @@ class PageRange:
         return (inner_page_index, new_page)
 
     ### Gets an open tail page ###
+    # :param column:        #Column of the table the cell is for, meta columns included
     # :returns tuple:       #TUple of two containing (page_index, existing page object)
-    def get_open_tail_page(self):
+    # :brief    :           #The last page of the column's chain, or a new one if it is full
+    def get_open_tail_page(self, column):
 
         with self.tail_page_lock:
-            if self.tail_page_count == 0:
-                inner_idx, tail_page = self._create_tail_page()
-            else:
-                inner_idx, tail_page = self._get_latest_tail()
-                is_open = tail_page.has_capacity()
-                if not is_open:
-                    inner_idx, tail_page = self._create_tail_page()
-
+            chain = self.tail_chains.setdefault(column, [])
+            if chain:
+                inner_idx = chain[-1]
+                tail_page = self.get_page(inner_idx)
+                if tail_page.has_capacity():
+                    return (inner_idx, tail_page)
+
+            inner_idx, tail_page = self._create_tail_page()
+            chain.append(inner_idx)
             return (inner_idx, tail_page)
 
+    ### Rebuilds the tail page chains of the columns ###
+    # :brief    :           #From the columns written to each tail page (see Page.tail_columns)
+    #                       #Called when the pageranges of a table are imported, once the page headers are read
+    def rebuild_tail_chains(self):
+        with self.tail_page_lock:
+            self.tail_chains = {}
+            for tail_idx, page in enumerate(self.tail_pages[:self.tail_page_count]):
+                column = 0
+                columns = page.tail_columns
+                while columns:
+                    if columns & 1:
+                        self.tail_chains.setdefault(column, []).append(PAGE_RANGE_MAX_BASE_PAGES + tail_idx)
+                    columns >>= 1
+                    column += 1
+
+    ### Tail pages no update writes to anymore ###
+    # :returns list:        #Inner indexes of the tail pages that are not the last of their column's chain
+    def closed_tail_pages(self):
+        with self.tail_page_lock:
+            open_pages = set(chain[-1] for chain in self.tail_chains.values() if chain)
+            closed = set(inner_idx for chain in self.tail_chains.values() for inner_idx in chain[:-1])
+            return sorted(closed - open_pages)
+
+    ### Frees the slot of a reclaimed tail page ###
+    # :param inner_page_index:  #Index of the tail page within pagerange
+    # :brief    :               #The page leaves its chain and an unloaded page without extent holds its slot
+    #                           #Until _create_tail_page reuses it, see MergeJob.reclaim_tails
+    def free_tail_page(self, inner_page_index):
+        with self.tail_page_lock:
+            for chain in self.tail_chains.values():
+                if inner_page_index in chain:
+                    chain.remove(inner_page_index)
+
+            self.tail_pages[inner_page_index - PAGE_RANGE_MAX_BASE_PAGES] = Page(True)
+            self.free_tail_pages.append(inner_page_index)
+
     ### Makes a new tailpage ###
     # :returns tuple:       #Tuple of two containing (inner_page_index, new page object)
+    # :brief    :           #Takes the slot of a reclaimed tail page if there is one
     def _create_tail_page(self):
+        if self.free_tail_pages:
+            inner_page_index = self.free_tail_pages.pop()
+            new_page = Page()
+            self.tail_pages[inner_page_index - PAGE_RANGE_MAX_BASE_PAGES] = new_page
+            return (inner_page_index, new_page)
+
         inner_page_index = self.tail_page_count + PAGE_RANGE_MAX_BASE_PAGES
         new_page = Page()
         self.tail_pages.append(new_page)
@@ -66,16 +117,6 @@ class PageRange:
 
         return (inner_page_index, new_page)
 
-    ### Retrieves the most recent tail page ###
-    # :returns tuple:       #Tuple of two containing (inner_page_index, existing page object)
-    def _get_latest_tail(self):
-        if self.tail_page_count == 0:
-            return None
-
-        last_tail_idx = self.tail_page_count - 1
-        inner_idx = PAGE_RANGE_MAX_BASE_PAGES + last_tail_idx
-        return (inner_idx, self.tail_pages[last_tail_idx])
-
     ### Retrieves a page ###
     # :param inner_page_index:      #Index of page within pagerange
     # :return page:                 #A base or tail page depending on the index
@@ -84,4 +125,48 @@ class PageRange:
             return self.base_pages[inner_page_index]
 
         last_tp_index = inner_page_index - PAGE_RANGE_MAX_BASE_PAGES
-        return self.tail_pages[last_tp_index]
\ No newline at end of file
+        return self.tail_pages[last_tp_index]
+
+### BaseLayout Class ###
+# Places the base pages of a table's columns across its pageranges
+# Base pages are made as rows are inserted, in column order, and fill the pageranges one after the other
+# A page of a 64 bit column holds CELLS_PER_PAGE rows (a block), a page of a narrower column spans several blocks
+# So the pages made at each block repeat with a period of the widest span, which gives the index of any page in O(1)
+class BaseLayout:
+
+    ### Initializer Function ###
+    # :param cell_sizes: list   #Bytes per cell of every column of the table, meta columns included
+    def __init__(self, cell_sizes):
+        self.spans = [CELL_SIZE_BYTES // cell_size for cell_size in cell_sizes]
+        self.cells_per_page = [CELLS_PER_PAGE * span for span in self.spans]
+        self.period = max(self.spans)
+
+        # block in the period -> {column -> index of the page among the pages of the period}
+        # Only columns that get a new page at that block have an entry
+        self.offsets = []
+        num_pages = 0
+        for block in range(self.period):
+            offsets = {}
+            for col_idx, span in enumerate(self.spans):
+                if block % span == 0:
+                    offsets[col_idx] = num_pages
+                    num_pages += 1
+            self.offsets.append(offsets)
+
+        self.pages_per_period = num_pages
+
+    ### Index of a base page in respect to all base pages of the table ###
+    # :param col_idx:       #Column number in the table
+    # :param col_page_num:  #Number of the page among the pages of the column
+    def outer_page_idx(self, col_idx, col_page_num):
+        period, block = divmod(col_page_num * self.spans[col_idx], self.period)
+        return period * self.pages_per_period + self.offsets[block][col_idx]
+
+    ### Pid of the cell of a row in a column ###
+    # :param col_idx:       #Column number in the table
+    # :param row_num:       #Number of the row, from 1, the RID of a base record is its row number
+    # :returns list:        #[cell_idx, inner_page_idx, page_range_idx]
+    def pid(self, col_idx, row_num):
+        col_page_num, cell_idx = divmod(row_num - 1, self.cells_per_page[col_idx])
+        page_range_idx, inner_page_idx = divmod(self.outer_page_idx(col_idx, col_page_num), PAGE_RANGE_MAX_BASE_PAGES)
+        return [cell_idx, inner_page_idx, page_range_idx]
@@ -0,0 +1,455 @@
+from collections import OrderedDict
+
+import itertools
+
+### Page replacement policies for the bufferpool ###
+# Each policy only tracks page keys (page_idx, page_range_idx), the bufferpool owns the pages
+# Policies are not thread safe, the bufferpool calls them while holding its pool lock
+# Every policy counts its own hits and misses so policies can be compared on real workloads
+
+class ReplacementPolicy:
+
+    name = None
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    ### Records an access to a page ###
+    # :param page_key:      #Consists of a tuple in the form of (page_idx, page_range_idx)
+    # :returns bool:        #True if the page was already resident (a hit)
+    def touch(self, page_key):
+        raise NotImplementedError
+
+    ### Picks pages to evict ###
+    # :param num:           #Max number of pages to evict
+    # :param capacity:      #Number of pages the pool is allowed to hold
+    # :param is_evictable:  #Function that takes a page key and returns False if the page can't be evicted (pinned)
+    # :returns list:        #Page keys that are no longer resident
+    def victims(self, num, capacity, is_evictable):
+        raise NotImplementedError
+
+    ### Resident pages in the order they would likely be evicted ###
+    # :returns list:        #Page keys, next victim first
+    def eviction_order(self):
+        raise NotImplementedError
+
+    ### Sort key of a resident page in eviction_order ###
+    # :param page_key:      #Consists of a tuple in the form of (page_idx, page_range_idx)
+    # :brief    :           #Sorting a few pages by rank orders them without walking every resident page
+    #                       #Ranks are only comparable until the policy changes again
+    def rank(self, page_key):
+        raise NotImplementedError
+
+    ### Puts back a page victims just returned ###
+    # :param page_key:      #Consists of a tuple in the form of (page_idx, page_range_idx)
+    # :brief    :           #The page goes where the next victim is taken from and the ghost entry its eviction left is dropped
+    #                       #It is not an access, no hit or miss is counted and the page is not promoted
+    #                       #Used for victims that got pinned or are being flushed before they could leave the pool
+    def reinstate(self, page_key):
+        raise NotImplementedError
+
+    ### Forgets a resident page without evicting it through the policy ###
+    # :param page_key:      #Consists of a tuple in the form of (page_idx, page_range_idx)
+    def remove(self, page_key):
+        raise NotImplementedError
+
+    def __contains__(self, page_key):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def _record(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return hit
+
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
+
+    def stats(self):
+        return {
+            'policy': self.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hit_ratio(),
+        }
+
+### Ordered dict that stamps each key with its place ###
+# Stamps grow towards the back and shrink towards the front, so sorting keys by stamp gives their order
+# Policies use it for resident pages so rank doesn't have to walk the queue
+class StampedQueue(OrderedDict):
+
+    def __init__(self):
+        super().__init__()
+        self.stamps = {}
+        self.clock = itertools.count(1)
+
+    def __setitem__(self, key, value):
+        # Changing the value of a key keeps its place
+        if key not in self.stamps:
+            self.stamps[key] = next(self.clock)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.stamps.pop(key, None)
+
+    def pop(self, key, *default):
+        value = super().pop(key, *default)
+        self.stamps.pop(key, None)
+        return value
+
+    def move_to_end(self, key, last = True):
+        super().move_to_end(key, last)
+        stamp = next(self.clock)
+        self.stamps[key] = stamp if last else -stamp
+
+
+### Pops up to num evictable keys from the front of an ordered dict ###
+# :param queue: OrderedDict     #Keys ordered oldest first
+# :param num:                   #Max number of keys to pop
+# :param is_evictable:          #See ReplacementPolicy.victims
+def pop_evictable(queue, num, is_evictable):
+    popped = []
+    for page_key in queue:
+        if len(popped) >= num:
+            break
+        if is_evictable(page_key):
+            popped.append(page_key)
+
+    for page_key in popped:
+        del queue[page_key]
+
+    return popped
+
+
+### Least recently used ###
+class LRUPolicy(ReplacementPolicy):
+
+    name = 'lru'
+
+    def __init__(self):
+        super().__init__()
+        self.pages = StampedQueue()
+
+    def touch(self, page_key):
+        if page_key in self.pages:
+            self.pages.move_to_end(page_key)
+            return self._record(True)
+
+        self.pages[page_key] = None
+        return self._record(False)
+
+    def victims(self, num, capacity, is_evictable):
+        return pop_evictable(self.pages, num, is_evictable)
+
+    def reinstate(self, page_key):
+        self.pages[page_key] = None
+        self.pages.move_to_end(page_key, last=False)
+
+    def eviction_order(self):
+        return list(self.pages)
+
+    def rank(self, page_key):
+        return self.pages.stamps[page_key]
+
+    def remove(self, page_key):
+        self.pages.pop(page_key, None)
+
+    def __contains__(self, page_key):
+        return page_key in self.pages
+
+    def __len__(self):
+        return len(self.pages)
+
+
+### CLOCK (second chance) ###
+# The ordered dict is the clock face and its front is the hand
+# A referenced page gets its bit cleared and goes behind the hand instead of being evicted
+class ClockPolicy(ReplacementPolicy):
+
+    name = 'clock'
+
+    def __init__(self):
+        super().__init__()
+        self.pages = StampedQueue() # page_key -> reference bit
+
+    def touch(self, page_key):
+        if page_key in self.pages:
+            self.pages[page_key] = True
+            return self._record(True)
+
+        self.pages[page_key] = False
+        return self._record(False)
+
+    def victims(self, num, capacity, is_evictable):
+        popped = []
+
+        # Two sweeps are enough to clear every reference bit
+        sweeps = 2 * len(self.pages)
+        while sweeps > 0 and self.pages and len(popped) < num:
+            sweeps -= 1
+            page_key, referenced = next(iter(self.pages.items()))
+
+            if referenced or not is_evictable(page_key):
+                self.pages[page_key] = False
+                self.pages.move_to_end(page_key)
+                continue
+
+            del self.pages[page_key]
+            popped.append(page_key)
+
+        return popped
+
+    def reinstate(self, page_key):
+        self.pages[page_key] = False
+        self.pages.move_to_end(page_key, last=False)
+
+    def eviction_order(self):
+        # Unreferenced pages are taken on the first sweep
+        first = [page_key for page_key, referenced in self.pages.items() if not referenced]
+        second = [page_key for page_key, referenced in self.pages.items() if referenced]
+        return first + second
+
+    def rank(self, page_key):
+        return (self.pages[page_key], self.pages.stamps[page_key])
+
+    def remove(self, page_key):
+        self.pages.pop(page_key, None)
+
+    def __contains__(self, page_key):
+        return page_key in self.pages
+
+    def __len__(self):
+        return len(self.pages)
+
+
+### 2Q ###
+# New pages go through a small FIFO (a1in), pages evicted from it are remembered in a ghost FIFO (a1out)
+# Only pages that are touched again while in a1out get into the main LRU (am)
+# So a single scan can only flush a1in and never the hot pages in am
+class TwoQueuePolicy(ReplacementPolicy):
+
+    name = '2q'
+
+    # Fractions of the pool capacity, from the 2Q paper
+    IN_FRACTION = 0.25
+    OUT_FRACTION = 0.5
+
+    def __init__(self):
+        super().__init__()
+        self.a1in = StampedQueue()
+        self.a1out = OrderedDict() # ghost keys, not resident
+        self.am = StampedQueue()
+        self.out_capacity = 0
+
+    def touch(self, page_key):
+        if page_key in self.am:
+            self.am.move_to_end(page_key)
+            return self._record(True)
+
+        if page_key in self.a1in:
+            return self._record(True)
+
+        if page_key in self.a1out:
+            del self.a1out[page_key]
+            self.am[page_key] = None
+            return self._record(False)
+
+        self.a1in[page_key] = None
+        return self._record(False)
+
+    def victims(self, num, capacity, is_evictable):
+        in_capacity = max(1, int(capacity * self.IN_FRACTION))
+        self.out_capacity = max(1, int(capacity * self.OUT_FRACTION))
+
+        popped = []
+
+        # Evict from a1in while it is over its share, then from am
+        if len(self.a1in) > in_capacity:
+            from_in = pop_evictable(self.a1in, min(num, len(self.a1in) - in_capacity), is_evictable)
+            for page_key in from_in:
+                self.a1out[page_key] = None
+            popped += from_in
+
+        if len(popped) < num:
+            popped += pop_evictable(self.am, num - len(popped), is_evictable)
+
+        # am could be all pinned, fall back to a1in
+        if len(popped) < num:
+            from_in = pop_evictable(self.a1in, num - len(popped), is_evictable)
+            for page_key in from_in:
+                self.a1out[page_key] = None
+            popped += from_in
+
+        while len(self.a1out) > self.out_capacity:
+            self.a1out.popitem(last=False)
+
+        return popped
+
+    def reinstate(self, page_key):
+        # Victims from a1in were remembered in a1out, those from am were not
+        if page_key in self.a1out:
+            del self.a1out[page_key]
+            queue = self.a1in
+        else:
+            queue = self.am
+
+        queue[page_key] = None
+        queue.move_to_end(page_key, last=False)
+
+    def eviction_order(self):
+        return list(self.a1in) + list(self.am)
+
+    def rank(self, page_key):
+        if page_key in self.a1in:
+            return (0, self.a1in.stamps[page_key])
+        return (1, self.am.stamps[page_key])
+
+    def remove(self, page_key):
+        self.a1in.pop(page_key, None)
+        self.am.pop(page_key, None)
+
+    def __contains__(self, page_key):
+        return page_key in self.a1in or page_key in self.am
+
+    def __len__(self):
+        return len(self.a1in) + len(self.am)
+
+
+### ARC (adaptive replacement cache) ###
+# t1 holds pages seen once, t2 pages seen at least twice, b1 and b2 are their ghosts
+# A hit in a ghost list moves the target size p of t1 towards the list that would have kept the page
+class ARCPolicy(ReplacementPolicy):
+
+    name = 'arc'
+
+    def __init__(self):
+        super().__init__()
+        self.t1 = StampedQueue()
+        self.t2 = StampedQueue()
+        self.b1 = OrderedDict()
+        self.b2 = OrderedDict()
+        self.p = 0
+        self.capacity = 0
+
+    def touch(self, page_key):
+        if page_key in self.t1:
+            del self.t1[page_key]
+            self.t2[page_key] = None
+            return self._record(True)
+
+        if page_key in self.t2:
+            self.t2.move_to_end(page_key)
+            return self._record(True)
+
+        if page_key in self.b1:
+            delta = max(len(self.b2) / len(self.b1), 1)
+            self.p = min(self.capacity, self.p + delta)
+            del self.b1[page_key]
+            self.t2[page_key] = None
+            return self._record(False)
+
+        if page_key in self.b2:
+            delta = max(len(self.b1) / len(self.b2), 1)
+            self.p = max(0, self.p - delta)
+            del self.b2[page_key]
+            self.t2[page_key] = None
+            return self._record(False)
+
+        self.t1[page_key] = None
+        return self._record(False)
+
+    def victims(self, num, capacity, is_evictable):
+        self.capacity = capacity
+        popped = []
+
+        # One pass over each list, every step takes the next evictable key of the list ARC replaces from
+        # Sizes count the keys already taken as gone, the lists only change once all victims are picked
+        lists = [(self.t1, self.b1), (self.t2, self.b2)]
+        candidates = [(page_key for page_key in resident if is_evictable(page_key)) for resident, _ in lists]
+        sizes = [len(self.t1), len(self.t2)]
+        taken = []
+
+        while len(taken) < num:
+            prefer_t1 = sizes[0] > 0 and (sizes[0] > self.p or sizes[1] == 0)
+            order = [0, 1] if prefer_t1 else [1, 0]
+
+            for which in order:
+                page_key = next(candidates[which], None)
+                if page_key is not None:
+                    taken.append((which, page_key))
+                    sizes[which] -= 1
+                    break
+            else:
+                break
+
+        for which, page_key in taken:
+            resident, ghost = lists[which]
+            del resident[page_key]
+            ghost[page_key] = None
+            popped.append(page_key)
+
+        # Bound the ghost lists: |t1| + |b1| <= c and everything <= 2c
+        while self.b1 and len(self.t1) + len(self.b1) > capacity:
+            self.b1.popitem(last=False)
+        while self.b2 and len(self.t1) + len(self.t2) + len(self.b1) + len(self.b2) > 2 * capacity:
+            self.b2.popitem(last=False)
+
+        return popped
+
+    def reinstate(self, page_key):
+        # The victim left a ghost in the list matching the one it came from
+        if page_key in self.b2:
+            del self.b2[page_key]
+            resident = self.t2
+        else:
+            self.b1.pop(page_key, None)
+            resident = self.t1
+
+        resident[page_key] = None
+        resident.move_to_end(page_key, last=False)
+
+    def eviction_order(self):
+        if len(self.t1) > self.p:
+            return list(self.t1) + list(self.t2)
+        return list(self.t2) + list(self.t1)
+
+    def rank(self, page_key):
+        t1_first = len(self.t1) > self.p
+        if page_key in self.t1:
+            return (not t1_first, self.t1.stamps[page_key])
+        return (t1_first, self.t2.stamps[page_key])
+
+    def remove(self, page_key):
+        self.t1.pop(page_key, None)
+        self.t2.pop(page_key, None)
+
+    def __contains__(self, page_key):
+        return page_key in self.t1 or page_key in self.t2
+
+    def __len__(self):
+        return len(self.t1) + len(self.t2)
+
+
+POLICIES = {
+    LRUPolicy.name: LRUPolicy,
+    ClockPolicy.name: ClockPolicy,
+    TwoQueuePolicy.name: TwoQueuePolicy,
+    ARCPolicy.name: ARCPolicy,
+}
+
+### Makes a replacement policy from its name ###
+# :param name: string       #One of 'lru', 'clock', '2q', 'arc'
+def make_policy(name):
+    try:
+        return POLICIES[name.lower()]()
+    except KeyError:
+        raise Exception('Unknown replacement policy', name)
@@ -0,0 +1,119 @@
+import sys
+
+from replacement import *
+
+### Victim order of the page replacement policies ###
+# Run from the lstore folder: python replacement.test.py
+# Page keys are plain ints here, policies only compare and hash them
+# LRU, CLOCK, 2Q and ARC get the same kind of checks: victims, eviction order, ghosts and reinstate
+# Each check is True if the policy picked the pages it should have
+
+CAPACITY = 8
+
+# Every page can be evicted
+def any_page(page_key):
+    return True
+
+# Pages with a resident rank sort in eviction order
+def ranks_sorted(policy):
+    order = policy.eviction_order()
+    return sorted(order, key=policy.rank) == order
+
+results = {}
+
+### LRU ###
+lru = make_policy('lru')
+for page_key in [1, 2, 3, 4, 5]:
+    lru.touch(page_key)
+lru.touch(2)
+results['lru order'] = lru.eviction_order() == [1, 3, 4, 5, 2]
+results['lru ranks'] = ranks_sorted(lru)
+results['lru victims'] = lru.victims(2, CAPACITY, any_page) == [1, 3]
+
+# A pinned page is skipped and stays the next victim once unpinned
+results['lru pinned'] = lru.victims(2, CAPACITY, lambda page_key: page_key != 4) == [5, 2]
+results['lru after pinned'] = lru.eviction_order() == [4]
+
+# A victim that got pinned goes back in front, without counting an access
+lru.reinstate(5)
+results['lru reinstate'] = lru.eviction_order() == [5, 4] and ranks_sorted(lru)
+results['lru hits'] = (lru.hits, lru.misses) == (1, 5)
+
+lru.remove(4)
+results['lru remove'] = 4 not in lru and len(lru) == 1
+
+### CLOCK ###
+# A referenced page gets a second chance and goes behind the hand
+clock = make_policy('clock')
+for page_key in [1, 2, 3, 4]:
+    clock.touch(page_key)
+clock.touch(2)
+results['clock order'] = clock.eviction_order() == [1, 3, 4, 2] and ranks_sorted(clock)
+results['clock victims'] = clock.victims(2, CAPACITY, any_page) == [1, 3]
+results['clock bit cleared'] = clock.eviction_order() == [4, 2] and ranks_sorted(clock)
+
+# Pinned pages go round the clock, the sweep stops once every page was seen twice
+results['clock all pinned'] = clock.victims(1, CAPACITY, lambda page_key: False) == [] and len(clock) == 2
+
+### 2Q ###
+# A page evicted from a1in is remembered in a1out, touching it again puts it in am
+two_queue = make_policy('2q')
+for page_key in [1, 2, 3, 4]:
+    two_queue.touch(page_key)
+results['2q victims from a1in'] = two_queue.victims(2, CAPACITY, any_page) == [1, 2] and list(two_queue.a1out) == [1, 2]
+two_queue.touch(1)
+results['2q ghost hit'] = list(two_queue.am) == [1] and (two_queue.hits, two_queue.misses) == (0, 5)
+
+# A scan only goes through a1in, the page in am stays and a1out stays bounded
+for page_key in range(10, 40):
+    two_queue.touch(page_key)
+    two_queue.victims(1, CAPACITY, any_page)
+results['2q scan resistant'] = list(two_queue.am) == [1] and len(two_queue.a1out) <= CAPACITY * TwoQueuePolicy.OUT_FRACTION
+
+# A victim put back forgets its ghost and is the next victim again
+two_queue.touch(50)
+victim = two_queue.victims(1, CAPACITY, any_page)[0]
+two_queue.reinstate(victim)
+results['2q reinstate'] = victim in two_queue and victim not in two_queue.a1out and ranks_sorted(two_queue) and \
+    two_queue.victims(1, CAPACITY, any_page) == [victim]
+
+### ARC ###
+arc = make_policy('arc')
+for page_key in [1, 2]:
+    arc.touch(page_key)
+arc.touch(1)
+for page_key in [3, 4]:
+    arc.touch(page_key)
+results['arc lists'] = (list(arc.t1), list(arc.t2)) == ([2, 3, 4], [1])
+results['arc victims from t1'] = arc.victims(1, 4, any_page) == [2] and list(arc.b1) == [2]
+
+# A hit in b1 grows t1's target and brings the page back into t2
+arc.touch(2)
+results['arc ghost hit'] = arc.p == 1 and (list(arc.t1), list(arc.t2)) == ([3, 4], [1, 2])
+
+# One batch takes from t1 while it is over p, then from t2
+results['arc batch'] = arc.victims(2, 4, any_page) == [3, 1] and (list(arc.b1), list(arc.b2)) == ([3], [1])
+results['arc order'] = arc.eviction_order() == [2, 4] and ranks_sorted(arc)
+
+# A scan goes through t1 and leaves t2 alone
+for page_key in range(10, 40):
+    arc.touch(page_key)
+    arc.victims(1, 4, any_page)
+results['arc scan resistant'] = list(arc.t2) == [2] and len(arc.t1) + len(arc.b1) <= 4
+
+# A victim put back forgets its ghost and is the next victim again
+victim = arc.victims(1, 4, any_page)[0]
+arc.reinstate(victim)
+results['arc reinstate'] = victim in arc and victim not in arc.b1 and victim not in arc.b2 and \
+    arc.victims(1, 4, any_page) == [victim]
+
+### make_policy ###
+results['policy names'] = [make_policy(name).name for name in ['LRU', 'clock', '2Q', 'arc']] == ['lru', 'clock', '2q', 'arc']
+try:
+    make_policy('fifo')
+    results['unknown policy'] = False
+except Exception:
+    results['unknown policy'] = True
+
+print(results)
+sys.exit(0 if all(results.values()) else 1)
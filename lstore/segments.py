@@ -0,0 +1,173 @@
+from config import *
+from util import *
+
+import os
+import threading
+
+### PageLocations class places the pages of a table in its segment files ###
+# Every page of a table, base or tail, of any pagerange, is stored in one of a few segment files
+# A page takes one extent of a segment, its header then its data (see page_rw_utils.encode_page)
+# Extents are sized to what the page needs, so encoded and compressed pages take less space on disk
+# A page that outgrows its extent, or shrinks to less than half of it, moves to another one
+# Freed extents, also those of tail pages a merge reclaimed, are reused first fit, new ones are appended to the last segment
+# The map is written to the table folder when the database closes and read back when it opens
+class PageLocations:
+
+    ### Initializer for the page locations ###
+    # :IV self.extents:     #Dict of page key (inner_idx, pagerange_idx) -> [segment, offset, size]
+    # :IV self.free:        #List of [segment, offset, size] of extents no page uses
+    # :IV self.ends:        #Bytes used in each segment, new extents start there
+    # :IV self.sizes:       #Bytes preallocated in each segment file, see grow
+    def __init__(self):
+        self.extents = {}
+        self.free = []
+        self.ends = [0]
+        self.sizes = [0]
+        self.lock = threading.Lock()
+
+    # Extent of a page, None if the page was never written
+    def locate(self, page_key):
+        return self.extents.get(page_key)
+
+    ### Picks the extent a page is written to ###
+    # :param page_key: tuple    #(inner_idx, pagerange_idx)
+    # :param num_bytes: int     #Bytes to write, header and data
+    # :returns list:            #[segment, offset, size] of the extent
+    # :brief    :               #The page keeps its extent if it fits and isn't more than twice what it needs
+    #                           #Otherwise its extent is freed and it gets a free one, or a new one at the end of the last segment
+    def place(self, page_key, num_bytes):
+        size = -(-num_bytes // EXTENT_ALIGN) * EXTENT_ALIGN
+
+        with self.lock:
+            extent = self.extents.get(page_key)
+            if extent is not None:
+                if size <= extent[2] <= 2 * size:
+                    return extent
+                self.free.append(extent)
+
+            extent = self._take_free(size) or self._append(size)
+            self.extents[page_key] = extent
+            return extent
+
+    ### Frees the extent of a page that is gone ###
+    # :param page_key: tuple    #(inner_idx, pagerange_idx)
+    # :returns int:             #Bytes of the extent, 0 if the page was never written
+    # :brief    :               #The extent goes to the free list, the next pages placed take it first
+    def release(self, page_key):
+        with self.lock:
+            extent = self.extents.pop(page_key, None)
+            if extent is None:
+                return 0
+
+            self.free.append(extent)
+            return extent[2]
+
+    ### Takes the first free extent that fits ###
+    # :param size: int          #Bytes needed, a multiple of EXTENT_ALIGN
+    # :brief    :               #The rest of a bigger extent stays free, caller must hold self.lock
+    def _take_free(self, size):
+        for i, (segment, offset, free_size) in enumerate(self.free):
+            if free_size < size:
+                continue
+
+            if free_size == size:
+                del self.free[i]
+            else:
+                self.free[i] = [segment, offset + size, free_size - size]
+            return [segment, offset, size]
+
+        return None
+
+    ### Makes a new extent at the end of the last segment ###
+    # :param size: int          #Bytes needed
+    # :brief    :               #Starts a new segment once the last one would go past SEGMENT_SIZE
+    #                           #Caller must hold self.lock
+    def _append(self, size):
+        segment = len(self.ends) - 1
+        if self.ends[segment] and self.ends[segment] + size > SEGMENT_SIZE:
+            self.ends.append(0)
+            self.sizes.append(0)
+            segment += 1
+
+        offset = self.ends[segment]
+        self.ends[segment] = offset + size
+        return [segment, offset, size]
+
+    ### Preallocates space in a segment file ###
+    # :param segment: int       #Segment number
+    # :param fd:                #Open descriptor of the segment file
+    # :brief    :               #Once the used space passes the preallocated size, the file grows by its own size
+    #                           #At least SEGMENT_GROWTH and at most SEGMENT_MAX_GROWTH bytes, in one fallocate
+    #                           #So appended extents stay contiguous on disk instead of growing the file one page at a time
+    def grow(self, segment, fd):
+        with self.lock:
+            end = self.ends[segment]
+            size = self.sizes[segment]
+            if end <= size:
+                return
+
+            new_size = max(end, size + min(max(size, SEGMENT_GROWTH), SEGMENT_MAX_GROWTH))
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(fd, size, new_size - size)
+            else:
+                os.ftruncate(fd, new_size)
+            self.sizes[segment] = new_size
+
+    # Bytes of the segment files used by pages
+    def used_bytes(self):
+        with self.lock:
+            return sum(extent[2] for extent in self.extents.values())
+
+    ### Encodes the page locations ###
+    #       --- Locations file format ---
+    #
+    #       Every piece of info is 8 bytes.
+    #       - Number of segments
+    #       - Bytes used in each segment
+    #       - Number of pages
+    #       - For each page: inner index, pagerange index, segment, offset, size
+    #       - Number of free extents
+    #       - For each free extent: segment, offset, size
+    def encode(self):
+        with self.lock:
+            data = bytearray()
+            data += int_to_bytes(len(self.ends))
+            for end in self.ends:
+                data += int_to_bytes(end)
+
+            data += int_to_bytes(len(self.extents))
+            for (inner_idx, pr_idx), extent in self.extents.items():
+                for value in (inner_idx, pr_idx, *extent):
+                    data += int_to_bytes(value)
+
+            data += int_to_bytes(len(self.free))
+            for extent in self.free:
+                for value in extent:
+                    data += int_to_bytes(value)
+
+            return bytes(data)
+
+    ### Decodes page locations ###
+    # :param data: bytes        #See encode
+    # :brief    :               #Space preallocated past the used bytes isn't known, grow allocates it again (a no op)
+    def decode(self, data):
+        ints = [int_from_bytes(data[i:i + CELL_SIZE_BYTES]) for i in range(0, len(data), CELL_SIZE_BYTES)]
+
+        num_segments = ints[0]
+        self.ends = ints[1:1 + num_segments]
+        self.sizes = list(self.ends)
+        pos = 1 + num_segments
+
+        self.extents = {}
+        for _ in range(ints[pos]):
+            inner_idx, pr_idx, segment, offset, size = ints[pos + 1:pos + 6]
+            self.extents[(inner_idx, pr_idx)] = [segment, offset, size]
+            pos += 5
+        pos += 1
+
+        self.free = []
+        for _ in range(ints[pos]):
+            self.free.append(ints[pos + 1:pos + 4])
+            pos += 3
+
+        return self
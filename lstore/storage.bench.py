@@ -0,0 +1,347 @@
+import os
+import shutil
+import tempfile
+from time import perf_counter, sleep
+from random import randrange
+
+from config import *
+from db import Database
+from query import Query
+from mergejob import MergeJob
+
+### Storage benchmarks ###
+# Run from the lstore folder: python storage.bench.py
+# Writes a table to disk once, then reopens it with a pool much smaller than the table
+
+NUM_RECORDS = 20000
+POOL_PAGES = 50
+KEY_START = 906659671
+
+### Writes a table to disk ###
+# :param folder:        #Folder of the database files
+# :param column_types:  #Bits of each column, all 64 if None
+# :param clustered:     #The last column grows with the key (like a date) instead of being random
+# :param compression:   #Codec of the pages on disk, see compression.py
+# :param cumulative:    #Tail records carry every column updated since the last merge
+def build(folder, column_types=None, clustered=False, compression=None, cumulative=False):
+    db = Database(compression=compression)
+    db.open(folder)
+    table = db.create_table('Grades', 5, 0, column_types, cumulative)
+    query = Query(table)
+    for i in range(NUM_RECORDS):
+        last = i * 100 // NUM_RECORDS if clustered else randrange(0, 100)
+        query.insert(KEY_START + i, randrange(0, 100), randrange(0, 100), randrange(0, 100), last)
+    db.close()
+
+### Sums a column over every record of a freshly opened database ###
+# :param folder:        #Folder of the database files
+# :param use_mmap:      #Storage mode of the reopened database
+def cold_scan(folder, use_mmap):
+    db = Database(pool_bytes=POOL_PAGES * PAGE_SIZE, use_mmap=use_mmap)
+    db.open(folder)
+    table = db.get_table('Grades')
+    query = Query(table)
+
+    start = perf_counter()
+    query.sum(KEY_START, KEY_START + NUM_RECORDS - 1, 2)
+    elapsed = perf_counter() - start
+
+    stats = table.bp.stats()
+    stats['base_pages'] = sum(page_range.base_page_count for page_range in table.page_ranges)
+    stats['bytes_read'] = db.my_manager.io_stats()['bytes_read']
+    db.close()
+    return elapsed, stats
+
+### Disk space used by the pages of a database ###
+# :param folder:        #Folder of the database files
+# :returns int:         #Bytes of the page extents in the segment files, see segments.py
+def disk_usage(folder):
+    db = Database(warm_restart=False)
+    db.open(folder)
+    used = db.my_manager.table_locations('Grades').used_bytes()
+    db.close()
+    return used
+
+### Bytes written to disk per update ###
+# :param folder:        #Folder of the database files
+# :param num_updates:   #Number of random single column updates
+# :brief    :           #Only pages that changed since they were last written go to disk
+def update_write_volume(folder, num_updates):
+    db = Database(pool_bytes=POOL_PAGES * PAGE_SIZE)
+    db.open(folder)
+    table = db.get_table('Grades')
+    query = Query(table)
+
+    for _ in range(num_updates):
+        query.update(KEY_START + randrange(0, NUM_RECORDS), None, randrange(0, 100), None, None, None)
+    db.close()
+
+    return db.my_manager.io_stats()
+
+### Misses and hit ratio of point selects right after a restart ###
+# :param folder:        #Folder of the database files
+# :param warm_restart:  #Reload the pages that were in the pool at the last close
+# :param num_selects:   #Number of selects on the hot keys
+# :brief    :           #The hot keys are the first 4 pages worth of records, their pages fit in the pool
+#                       #A first session reads them so they are in the pool when it closes
+def restart_hit_ratio(folder, warm_restart, num_selects=500):
+    hot_keys = [KEY_START + i for i in range(4 * CELLS_PER_PAGE)]
+
+    db = Database(pool_bytes=POOL_PAGES * PAGE_SIZE)
+    db.open(folder)
+    query = Query(db.get_table('Grades'))
+    for _ in range(num_selects):
+        query.select(hot_keys[randrange(len(hot_keys))], 0, [1, 1, 1, 1, 1])
+    db.close()
+
+    db = Database(pool_bytes=POOL_PAGES * PAGE_SIZE, warm_restart=warm_restart)
+    db.open(folder)
+    table = db.get_table('Grades')
+    query = Query(table)
+    pool = table.bp.pool
+    while pool.prefetching:
+        sleep(0.01)
+
+    before = pool.stats()
+    for _ in range(num_selects):
+        query.select(hot_keys[randrange(len(hot_keys))], 0, [1, 1, 1, 1, 1])
+    after = pool.stats()
+    db.close()
+
+    hits = after['hits'] - before['hits']
+    misses = after['misses'] - before['misses']
+    return misses, hits / (hits + misses)
+
+### Merges a table on disk ###
+# :param folder:        #Folder of the database files
+# :param encode:        #Store the merged data pages with a compact encoding
+def merge(folder, encode):
+    db = Database(warm_restart=False)
+    db.open(folder)
+    table = db.get_table('Grades')
+    MergeJob(table, encode).run()
+    db.close()
+
+### Pool use of random selects of whole records right after a restart ###
+# :param folder:        #Folder of the database files, see merge
+# :param num_selects:   #Number of selects
+# :returns tuple:       #(get_page misses, bytes in the pool at the end)
+# :brief    :           #The default pool holds fewer plain base pages than the table has
+def select_misses(folder, num_selects=5000):
+    db = Database(warm_restart=False)
+    db.open(folder)
+    table = db.get_table('Grades')
+    query = Query(table)
+
+    for _ in range(num_selects):
+        query.select(KEY_START + randrange(0, NUM_RECORDS), 0, [1, 1, 1, 1, 1])
+
+    stats = table.bp.stats()
+    db.close()
+    return stats['get_misses'], stats['num_bytes']
+
+### Size and load time of the table metadata ###
+# :param folder:        #Folder of the database files
+# :returns tuple:       #(bytes of the meta file, seconds get_table takes to read it)
+def table_meta(folder):
+    db = Database(warm_restart=False)
+    db.open(folder)
+
+    start = perf_counter()
+    db.get_table('Grades')
+    elapsed = perf_counter() - start
+
+    num_bytes = os.path.getsize(os.path.join(folder, 'Grades', 'Grades_meta'))
+    db.close()
+    return num_bytes, elapsed
+
+### Reads of one column of a table with many tail records ###
+# :param folder:        #Folder of the database files, a copy gets the updates
+# :param num_updates:   #Number of random single column updates, they are not merged
+# :param num_selects:   #Number of selects of random records
+# :returns tuple:       #(seconds of a sum of the column, its page loads, page loads of the selects)
+# :brief    :           #Both run right after a restart with a POOL_PAGES pool and only read the last column
+def tail_reads(folder, num_updates, num_selects=2000):
+    updated = os.path.join(folder, 'updated')
+    shutil.rmtree(updated, ignore_errors=True)
+    shutil.copytree(folder, updated, ignore=shutil.ignore_patterns('merged', 'updated'))
+
+    db = Database(pool_bytes=POOL_PAGES * PAGE_SIZE, warm_restart=False)
+    db.open(updated)
+    query = Query(db.get_table('Grades'))
+    for _ in range(num_updates):
+        columns = [None] * 5
+        columns[randrange(1, 5)] = randrange(0, 100)
+        query.update(KEY_START + randrange(0, NUM_RECORDS), *columns)
+    db.close()
+
+    db = Database(pool_bytes=POOL_PAGES * PAGE_SIZE, warm_restart=False)
+    db.open(updated)
+    table = db.get_table('Grades')
+    start = perf_counter()
+    Query(table).sum(KEY_START, KEY_START + NUM_RECORDS - 1, 4)
+    elapsed = perf_counter() - start
+    sum_loads = table.bp.stats()['load_latency_us']['count']
+    db.close()
+
+    db = Database(pool_bytes=POOL_PAGES * PAGE_SIZE, warm_restart=False)
+    db.open(updated)
+    table = db.get_table('Grades')
+    query = Query(table)
+    for _ in range(num_selects):
+        query.select(KEY_START + randrange(0, NUM_RECORDS), 0, [0, 0, 0, 0, 1])
+    select_loads = table.bp.stats()['load_latency_us']['count']
+    db.close()
+
+    return elapsed, sum_loads, select_loads
+
+### Tail space and select latency of hot keys with long update chains ###
+# :param folder:        #Folder of the database files
+# :param num_hot_keys:  #Number of keys that get every update
+# :param num_updates:   #Number of random single column updates, they are not merged
+# :param num_selects:   #Number of selects of whole hot records
+# :returns tuple:       #(tail pages, seconds per select)
+def hot_key_selects(folder, num_hot_keys=200, num_updates=10000, num_selects=2000):
+    db = Database(warm_restart=False)
+    db.open(folder)
+    table = db.get_table('Grades')
+    query = Query(table)
+    for _ in range(num_updates):
+        columns = [None] * 5
+        columns[randrange(1, 5)] = randrange(0, 100)
+        query.update(KEY_START + randrange(0, num_hot_keys), *columns)
+
+    start = perf_counter()
+    for _ in range(num_selects):
+        query.select(KEY_START + randrange(0, num_hot_keys), 0, [1, 1, 1, 1, 1])
+    elapsed = (perf_counter() - start) / num_selects
+
+    tail_pages = sum(page_range.tail_page_count for page_range in table.page_ranges)
+    db.close()
+    return tail_pages, elapsed
+
+### Rounds of random updates each followed by a merge ###
+# :param folder:        #Folder of the database files
+# :param num_rounds:    #Number of merges
+# :param num_updates:   #Number of random single column updates before each merge
+# :returns list:        #Per merge, (what it reclaimed, bytes used in the segment files, bytes of the page directory)
+#                       #See MergeJob.reclaim_tails
+def merge_rounds(folder, num_rounds=3, num_updates=20000):
+    db = Database(warm_restart=False)
+    db.open(folder)
+    table = db.get_table('Grades')
+    query = Query(table)
+    locations = db.my_manager.table_locations('Grades')
+
+    rounds = []
+    for _ in range(num_rounds):
+        for _ in range(num_updates):
+            columns = [None] * 5
+            columns[randrange(1, 5)] = randrange(0, 100)
+            query.update(KEY_START + randrange(0, NUM_RECORDS), *columns)
+
+        MergeJob(table).run()
+        rounds.append((table.last_reclaimed, locations.used_bytes(), table.page_directory.num_bytes()))
+
+    db.close()
+    return rounds
+
+### Selects on a column without an index ###
+# :param folder:        #Folder of the database files
+# :param column:        #Column to select on
+# :param num_selects:   #Number of selects of random values
+# :returns tuple:       #(seconds per select, column pages read, column pages skipped by their zone map)
+def scan_selects(folder, column, num_selects=20):
+    db = Database(warm_restart=False)
+    db.open(folder)
+    table = db.get_table('Grades')
+    table.scans_before_index = num_selects # every select scans, see Table.select
+    query = Query(table)
+
+    start = perf_counter()
+    for _ in range(num_selects):
+        query.select(randrange(0, 100), column, [1, 1, 1, 1, 1])
+    elapsed = (perf_counter() - start) / num_selects
+
+    db.close()
+    return elapsed, table.scan_pages_read, table.scan_pages_skipped
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as folder:
+        build(folder)
+
+        print("Cold scan of %d records with a %d page pool" % (NUM_RECORDS, POOL_PAGES))
+        for use_mmap in [False, True]:
+            elapsed, stats = cold_scan(folder, use_mmap)
+            print("%s:\t%.3f s, %d of %d prefetched pages used" % ('mmap' if use_mmap else 'file', elapsed,
+                stats['prefetch_useful'], stats['prefetch_issued']))
+
+        print("Misses of the first selects after a restart")
+        for warm_restart in [False, True]:
+            misses, hit_ratio = restart_hit_ratio(folder, warm_restart)
+            print("%s:\t%d misses, hit ratio %.3f" % ('warm' if warm_restart else 'cold', misses, hit_ratio))
+
+        print("Random selects of %d records after a merge with a %d page pool" % (NUM_RECORDS, MAX_POOL_PAGES))
+        for encode in [False, True]:
+            merged = os.path.join(folder, 'merged')
+            shutil.rmtree(merged, ignore_errors=True)
+            shutil.copytree(folder, merged, ignore=shutil.ignore_patterns('merged'))
+            merge(merged, encode)
+            misses, num_bytes = select_misses(merged)
+            print("%s:\t%d misses, %d bytes in the pool" % ('encoded' if encode else 'plain', misses, num_bytes))
+
+        num_bytes, elapsed = table_meta(folder)
+        print("Table metadata:\t%d bytes, %.3f s to load" % (num_bytes, elapsed))
+
+        print("Reads of one column after random updates with a %d page pool" % POOL_PAGES)
+        for num_updates in [5000, 20000]:
+            elapsed, sum_loads, select_loads = tail_reads(folder, num_updates)
+            print("%d updates:\tsum %.3f s with %d page loads, %d page loads for 2000 selects" % (
+                num_updates, elapsed, sum_loads, select_loads))
+
+        print("Selects of 200 hot keys after 10000 updates")
+        for cumulative in [False, True]:
+            hot = os.path.join(folder, 'hot')
+            shutil.rmtree(hot, ignore_errors=True)
+            build(hot, cumulative=cumulative)
+            tail_pages, elapsed = hot_key_selects(hot)
+            print("%s:\t%d tail pages, %.0f us per select" % ('cumulative' if cumulative else 'incremental', tail_pages, elapsed * 1e6))
+
+        print("Merges after 20000 random updates each")
+        reclaimed = os.path.join(folder, 'reclaimed')
+        shutil.copytree(folder, reclaimed, ignore=shutil.ignore_patterns('merged', 'updated', 'hot'))
+        for i, (freed, disk_bytes, directory_bytes) in enumerate(merge_rounds(reclaimed)):
+            print("merge %d:\treclaimed %d tail records, %d tail pages, %d bytes on disk, %d directory bytes; "
+                "%d bytes on disk, %d directory bytes after" % (i + 1, freed.get('tail_records', 0), freed.get('tail_pages', 0),
+                freed.get('disk_bytes', 0), freed.get('directory_bytes', 0), disk_bytes, directory_bytes))
+
+        print("Cold scan with 8 bit grade columns")
+        for column_types in [None, [32, 8, 8, 8, 8]]:
+            narrow = os.path.join(folder, 'narrow')
+            shutil.rmtree(narrow, ignore_errors=True)
+            build(narrow, column_types)
+            elapsed, stats = cold_scan(narrow, False)
+            print("%s:\t%.3f s, %d base pages, %d page loads" % (column_types or 'all 64 bit', elapsed,
+                stats['base_pages'], stats['load_latency_us']['count']))
+
+        print("Selects on a column without an index")
+        clustered = os.path.join(folder, 'clustered')
+        build(clustered, clustered=True)
+        for name, column in [('random', 1), ('clustered', 4)]:
+            elapsed, pages_read, pages_skipped = scan_selects(clustered, column)
+            print("%s:\t%.1f ms per select, %d pages read, %d skipped" % (name, elapsed * 1e3, pages_read, pages_skipped))
+
+        print("Cold scan of compressed pages with a %d page pool" % POOL_PAGES)
+        for compression in [None, 'zlib']:
+            compressed = os.path.join(folder, 'compressed')
+            shutil.rmtree(compressed, ignore_errors=True)
+            build(compressed, compression=compression)
+            elapsed, stats = cold_scan(compressed, False)
+            print("%s:\t%.3f s, %d bytes on disk, %d bytes read" % (compression or 'none', elapsed,
+                disk_usage(compressed), stats['bytes_read']))
+
+        print("Bytes written by random updates with a %d page pool" % POOL_PAGES)
+        for num_updates in [100, 1000]:
+            io = update_write_volume(folder, num_updates)
+            print("%d updates:\t%d pages, %d bytes, %.0f bytes per update" % (
+                num_updates, io['pages_written'], io['bytes_written'], io['bytes_written'] / num_updates))
@@ -0,0 +1,245 @@
+import compression
+import os
+import segments
+import shutil
+import sys
+import tempfile
+
+from config import *
+from db import Database
+from filepool import FilePool
+from query import Query
+from segments import PageLocations
+
+### Pages written to disk and read back ###
+# Run from the lstore folder: python storage.test.py
+# Each check is True if the storage layer did what it should have, the script exits 1 if one isn't
+
+NUM_ROWS = CELLS_PER_PAGE * 4
+POOL_PAGES = 16
+
+### Fills tables, closes the database and checks every row after opening it again ###
+# :param folder:        #Folder of the database files
+# :param names:         #Names of the tables
+# :param setup:         #Function called with the db before the tables are filled
+# :param column_types:  #Bits of each column, see Database.create_table
+# :param kwargs:        #Passed to Database
+# :returns tuple:       #(rows with a wrong value after the reopen, stats of the database before it was closed)
+def round_trip(folder, names=('Grades',), setup=None, column_types=None, **kwargs):
+    kwargs.setdefault('pool_bytes', POOL_PAGES * PAGE_SIZE)
+    db = Database(**kwargs)
+    db.open(folder)
+    if setup is not None:
+        setup(db)
+
+    for name in names:
+        query = Query(db.create_table(name, 5, 0, column_types))
+        for key in range(NUM_ROWS):
+            query.insert(key, key % 7, key * 3, key, 2**40 + key)
+        for key in range(0, NUM_ROWS, 5):
+            query.update(key, None, None, None, key + 1, None)
+
+    stats = db.stats()
+    db.close()
+
+    db = Database(**kwargs)
+    db.open(folder)
+    bad = 0
+    for name in names:
+        query = Query(db.get_table(name))
+        for key in range(NUM_ROWS):
+            expected = [key, key % 7, key * 3, key + 1 if key % 5 == 0 else key, 2**40 + key]
+            if query.select(key, 0, [1, 1, 1, 1, 1])[0].columns != expected:
+                bad += 1
+    db.close()
+    return bad, stats
+
+# Page locations of a closed table, read from its locations file
+def read_locations(folder, name='Grades'):
+    locations = PageLocations()
+    with open(os.path.join(folder, name, name + '_locations'), 'rb') as locations_file:
+        locations.decode(locations_file.read())
+    return locations
+
+# Bytes read from disk to select every row of a table
+def bytes_read(folder, **kwargs):
+    db = Database(pool_bytes=POOL_PAGES * PAGE_SIZE, **kwargs)
+    db.open(folder)
+    query = Query(db.get_table('Grades'))
+    for key in range(NUM_ROWS):
+        query.select(key, 0, [1, 1, 1, 1, 1])
+    read = db.my_manager.io_stats()['bytes_read']
+    db.close()
+    return read
+
+def is_open(fd):
+    try:
+        os.fstat(fd)
+        return True
+    except OSError:
+        return False
+
+results = {}
+
+### File handle pool (user-004) ###
+# A file is opened once and reused, the least recently used descriptors over the limit are closed
+# But never one that is borrowed
+folder = tempfile.mkdtemp()
+files = FilePool(max_files=2)
+paths = [os.path.join(folder, 'file_%d' % num) for num in range(3)]
+
+with files.open('a', paths[0], create=True) as first:
+    with files.open('a', paths[0]) as again:
+        results['files reused'] = first == again
+
+    with files.open('b', paths[1], create=True) as second, files.open('c', paths[2], create=True) as third:
+        results['files borrowed stay open'] = len(files.files) == 3
+
+    # c is let go first while a and b are still borrowed, so it is the one over the limit
+    results['files over limit closed'] = list(files.files) == ['a', 'b'] and is_open(first) and is_open(second) and not is_open(third)
+
+fds = [fd for fd, _ in files.files.values()]
+files.close_all()
+results['files close all'] = not files.files and not any(is_open(fd) for fd in fds)
+
+try:
+    with files.open('d', os.path.join(folder, 'missing')):
+        pass
+    results['files missing raises'] = False
+except FileNotFoundError:
+    results['files missing raises'] = True
+shutil.rmtree(folder)
+
+# Two tables through a single descriptor
+def one_file(db):
+    db.my_manager.files.max_files = 1
+
+folder = tempfile.mkdtemp()
+bad, stats = round_trip(folder, ('Grades', 'Other'), one_file)
+results['files round trip'] = bad == 0 and stats['open_files'] <= 1
+shutil.rmtree(folder)
+
+### Memory mapped pages (user-005) ###
+# Pages loaded with use_mmap are views of the segment file, writes to them land in the mapping
+# And are still there after the database is closed and opened without mmap
+folder = tempfile.mkdtemp()
+bad, _ = round_trip(folder, use_mmap=True)
+results['mmap round trip'] = bad == 0
+
+db = Database(pool_bytes=POOL_PAGES * PAGE_SIZE, use_mmap=True)
+db.open(folder)
+table = db.get_table('Grades')
+query = Query(table)
+query.select(1, 0, [1, 1, 1, 1, 1])
+pid = table.page_directory.pid(table.key_index[1], START_USER_DATA_COLUMN + 1)
+page = table.page_ranges[pid[2]].get_page(pid[1])
+results['mmap zero copy'] = db.my_manager.is_mapped(page)
+
+for key in range(NUM_ROWS):
+    query.update(key, None, None, None, None, key)
+db.close()
+
+db = Database(pool_bytes=POOL_PAGES * PAGE_SIZE, use_mmap=False)
+db.open(folder)
+query = Query(db.get_table('Grades'))
+bad = sum(1 for key in range(NUM_ROWS) if query.select(key, 0, [1, 1, 1, 1, 1])[0].columns[4] != key)
+results['mmap writes kept'] = bad == 0
+db.close()
+shutil.rmtree(folder)
+
+### Narrow column types (user-017) ###
+# The cell size of every column is stored with the table, narrow pages are read back as narrow pages
+folder = tempfile.mkdtemp()
+bad, _ = round_trip(folder, column_types=[64, 8, 16, 32, 64])
+db = Database(pool_bytes=POOL_PAGES * PAGE_SIZE)
+db.open(folder)
+table = db.get_table('Grades')
+Query(table).select(1, 0, [1, 1, 1, 1, 1])
+pid = table.page_directory.pid(table.key_index[1], START_USER_DATA_COLUMN + 2)
+page = table.page_ranges[pid[2]].get_page(pid[1])
+results['narrow round trip'] = bad == 0 and table.column_types == [64, 8, 16, 32, 64] and page.cell_size == 2
+db.close()
+shutil.rmtree(folder)
+
+### Page compression (user-019) ###
+# Pages are compressed when written if that makes them smaller and are stored as is otherwise
+zeros = bytearray(PAGE_SIZE)
+codec_id, stored = compression.compress(zeros, 'zlib')
+results['compression zeros'] = codec_id == compression.IDS['zlib'] and len(stored) < PAGE_SIZE and \
+    compression.decompress(stored, codec_id) == zeros
+noise = bytearray(os.urandom(PAGE_SIZE))
+results['compression noise as is'] = compression.compress(noise, 'zlib') == (compression.NONE, noise) and \
+    compression.compress(zeros, None) == (compression.NONE, zeros)
+
+compression.register(200, 'reversed', lambda data: data[::-1][:len(data) // 2], lambda data: data + data)
+results['compression register'] = compression.compress(zeros, 'reversed')[0] == 200 and \
+    compression.decompress(bytes(PAGE_SIZE // 2), 200) == zeros
+del compression.CODECS[200], compression.IDS['reversed']
+
+refused = 0
+for call in [lambda: compression.compress(zeros, 'lz4'), lambda: compression.decompress(zeros, 99), lambda: compression.register(300, 'big', None, None)]:
+    try:
+        call()
+    except Exception:
+        refused += 1
+results['compression unknown codec'] = refused == 3
+
+# Compressed tables round trip, and take less space and fewer bytes read than plain ones
+plain, zlib = tempfile.mkdtemp(), tempfile.mkdtemp()
+plain_bad, _ = round_trip(plain, compression=None)
+zlib_bad, _ = round_trip(zlib, compression='zlib')
+results['compression round trip'] = plain_bad == 0 and zlib_bad == 0
+results['compression smaller'] = read_locations(zlib).used_bytes() < read_locations(plain).used_bytes() and \
+    bytes_read(zlib, compression='zlib') < bytes_read(plain, compression=None)
+
+# The codec is in each page header, so a compressed table opens with compression turned off
+db = Database(pool_bytes=POOL_PAGES * PAGE_SIZE, compression=None)
+db.open(zlib)
+query = Query(db.get_table('Grades'))
+results['compression mixed'] = query.select(11, 0, [1, 1, 1, 1, 1])[0].columns == [11, 4, 33, 11, 2**40 + 11]
+db.close()
+shutil.rmtree(plain)
+shutil.rmtree(zlib)
+
+### Segment files (user-020) ###
+# Extents are rounded up to EXTENT_ALIGN and appended, a page keeps its extent while it fits
+locations = PageLocations()
+first = locations.place((0, 0), PAGE_SIZE + 10)
+second = locations.place((1, 0), 100)
+results['segments append'] = first == [0, 0, PAGE_SIZE + EXTENT_ALIGN] and second == [0, PAGE_SIZE + EXTENT_ALIGN, 128]
+results['segments keep extent'] = locations.place((0, 0), PAGE_SIZE) is first and locations.locate((2, 0)) is None
+
+# A page that shrinks to less than half of its extent moves, freed extents are reused first fit
+# Here the shrunk page takes the front of its own old extent
+moved = locations.place((0, 0), 100)
+results['segments shrink moves'] = moved == [0, 0, 128] and locations.free == [[0, 128, PAGE_SIZE + EXTENT_ALIGN - 128]]
+reused = locations.place((2, 0), 1000)
+results['segments reuse free'] = reused == [0, 128, 1024] and locations.free == [[0, 1152, PAGE_SIZE + EXTENT_ALIGN - 1152]] and \
+    locations.ends == [PAGE_SIZE + EXTENT_ALIGN + 128]
+results['segments release'] = locations.release((2, 0)) == 1024 and locations.release((2, 0)) == 0 and locations.used_bytes() == 256
+
+copy = PageLocations().decode(locations.encode())
+results['segments encode'] = copy.extents == locations.extents and copy.free == locations.free and copy.ends == locations.ends
+
+# A new segment starts once the last one is full
+segments.SEGMENT_SIZE, segment_size = PAGE_SIZE * 2, segments.SEGMENT_SIZE
+locations = PageLocations()
+placed = [locations.place((page, 0), PAGE_SIZE) for page in range(3)]
+segments.SEGMENT_SIZE = segment_size
+results['segments next file'] = [extent[:2] for extent in placed] == [[0, 0], [0, PAGE_SIZE], [1, 0]]
+
+# A table is one segment file, its locations and its meta, the pages of every range are in the segment
+folder = tempfile.mkdtemp()
+bad, _ = round_trip(folder)
+locations = read_locations(folder)
+pageranges = {page_range for _, page_range in locations.extents}
+results['segments files'] = bad == 0 and sorted(os.listdir(os.path.join(folder, 'Grades'))) == ['Grades_locations', 'Grades_meta', 'segment_0'] and \
+    len(pageranges) > 1
+
+# Extents don't overlap
+extents = sorted(locations.extents.values())
+results['segments no overlap'] = all(a[0] != b[0] or a[1] + a[2] <= b[1] for a, b in zip(extents, extents[1:]))
+shutil.rmtree(folder)
+
+print(results)
+sys.exit(0 if all(results.values()) else 1)
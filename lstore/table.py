@@ -3,29 +3,20 @@ import threading
 from math import ceil, floor
 
 from page import *
-from pagerange import PageRange
+from pagerange import PageRange, BaseLayout
 from index import Index
 from config import *
 from util import *
 from mergejob import MergeJob
 from sxlock import LockManager
+from pagedirectory import PageDirectory, MetaRecord
+from epoch import EpochManager
 
 # from diskmanager import DiskManager
-from bufferpool import BufferPool
+from bufferpool import TablePool
 
 import logging
 
-class MetaRecord:
-    def __init__(self, rid, key, columns):
-        self.rid = rid
-        self.key = key
-        self.columns = columns
-        self.latch = threading.Lock()
-
-    def copy(self):
-        copy = MetaRecord(self.rid, self.key, self.columns)
-        return copy
-
 class Record:
 
     def __init__(self, rid, key, columns):
@@ -40,7 +31,10 @@ class Table:
     # :param num_columns: int       #Number of Columns: all columns are integer
     # :param key: int               #Index of table key in columns
     # :param disk: DiskManager      #DiskManager class to read and write pages from and to disk
-    def __init__(self, name, num_columns, key_col, disk):
+    #                               #Its bufferpool is shared with every other table of the database
+    # :param column_types: list     #Bits of each column, one of COLUMN_TYPES, all 64 if None
+    # :param cumulative: bool       #Tail records carry every column updated since the last merge, see carry_tail_values
+    def __init__(self, name, num_columns, key_col, disk, column_types=None, cumulative=CUMULATIVE_UPDATES):
         
         self.name = name
         self.key_col = key_col
@@ -48,10 +42,24 @@ class Table:
         self.num_sys_columns = 4 # Don't export
         self.num_total_cols = self.num_sys_columns + self.num_columns # Don't export
 
+        if column_types is None:
+            column_types = [64] * num_columns
+        if len(column_types) != num_columns:
+            raise Exception('Need one column type per column', column_types)
+        for bits in column_types:
+            if bits not in COLUMN_TYPES:
+                raise Exception('Unknown column type', bits)
+
+        self.column_types = list(column_types)
+        self.cell_sizes = [CELL_SIZE_BYTES] * self.num_sys_columns + [bits // 8 for bits in column_types] # Don't export
+        self.base_layout = BaseLayout(self.cell_sizes) # Don't export
+
+        self.cumulative = cumulative
+
         self.num_rows = 0
 
         self.page_ranges = []
-        self.page_directory = {}
+        self.page_directory = PageDirectory(self.num_total_cols, self.base_layout) # rid -> MetaRecord, see pagedirectory.py
         self._rw_locks = {} # only base records for now # Don't export
         self._del_locks = {} # Don't export
 
@@ -62,33 +70,43 @@ class Table:
         self.prev_tid = 2**64 - 1
         self.tid_latch = threading.Lock()
 
-        self.bp = BufferPool(self, disk)
+        self.bp = disk.bp.for_table(self) # type: TablePool
         self.key_index = {} # key -> base MetaRecord PID # Don't export
         self.indices = Index(self) # Don't export
 
         self.merging = 0
         self.updates_since_merge = 0
+        self.epochs = EpochManager() # queries that follow tail RIDs, see MergeJob.reclaim_tails
+        self.reclaimed = {} # totals of MergeJob.reclaimed over every merge
+        self.last_reclaimed = {} # MergeJob.reclaimed of the last merge
+
+        self.scan_pages_read = 0 # column pages scan_column read or skipped thanks to their zone map
+        self.scan_pages_skipped = 0
+        self.scans_before_index = SCANS_BEFORE_INDEX
+        self.column_scans = [0] * num_columns # selects that scanned each column, see select
 
         self.get_open_bp_lock = threading.Lock()
         self.tail_col_lock = threading.Lock()
-        self.update_row_lock = threading.Lock()
+        self.update_row_lock = SharedLock() # updates hold it shared, MergeJob.copy_data exclusive
         self.merge_schedule_lock = threading.Lock()
 
     ### Manages read-write locks ###
     # :param rid: int       #Unique identified for a entry or entry update
     def rw_locks(self, rid):
-        if rid not in self._rw_locks:
-            self._rw_locks[rid] = threading.Lock()
+        lock = self._rw_locks.get(rid)
+        if lock is None:
+            lock = self._rw_locks.setdefault(rid, threading.Lock())
 
-        return self._rw_locks[rid]
+        return lock
 
     ### Manages delete locks ###
     # :param rid: int       #Unique identified for a entry or entry update
     def del_locks(self, rid):
-        if rid not in self._del_locks:
-            self._del_locks[rid] = threading.Lock()
+        lock = self._del_locks.get(rid)
+        if lock is None:
+            lock = self._del_locks.setdefault(rid, threading.Lock())
 
-        return self._del_locks[rid]
+        return lock
 
     ### Initiates a mergejob ###
     # :brief    :       schedules a merge that combines combines the tail records into the base records#
@@ -122,6 +140,22 @@ class Table:
         page = self.bp.get_page(pid, pin=True)
         return page
 
+    ### Prefetches the pages of records ###
+    # :param rids:          #RIDs of the records about to be read
+    # :param columns:       #Indexes into the metarecord columns to prefetch, all columns if None
+    # :returns int:         #Number of page loads that were queued
+    def prefetch_records(self, rids, columns=None):
+        page_keys = set()
+        if columns is None:
+            columns = range(self.num_total_cols)
+        for rid in rids:
+            for col in columns:
+                pid = self.page_directory.pid(rid, col)
+                if pid is not None:
+                    page_keys.add((pid[1], pid[2]))
+
+        return self.bp.prefetch(sorted(page_keys, key=lambda page_key: (page_key[1], page_key[0])))
+
     ### Gets a pagerange ###
     # :param page_range_idx:        #Index of pagerange in table
     def get_page_range(self,page_range_idx):
@@ -140,38 +174,18 @@ class Table:
     # :param new_row_num:   #Number of records in table + 1
     # :returns tuple:       #A tuple consisting of a page class and a pid (see read_pid)
     # :brief    :           #Function to get a base page with space for more records
-    #                       #And calculates the prev cell index from col_idx and new_row_num
-    #                       #If the the prev cell index is the max cell index,
+    #                       #And calculates the cell index and page index from col_idx and new_row_num (see BaseLayout)
+    #                       #If the cell is the first of its page,
     #                       #The function will calculate the supposed pagerange index
     #                       #And see if the pagerange exists, otherwise it creates a new pagerange
     #                       #Then it will call create_base_page from the pagerange class to ge ta new page
     #                       #If the previously used page was not full then it will retrieve that page
     def get_open_base_page(self, col_idx, new_row_num):
-        # how many pages for this column exists
-        num_col_pages = ceil((new_row_num - 1) / CELLS_PER_PAGE)
+        # cell of the new row, its page within the pagerange and the pagerange
+        cell_idx, inner_page_idx, page_range_idx = self.base_layout.pid(col_idx, new_row_num)
 
-        # index of the last used page in respect to all pages across all page ranges
-        prev_outer_page_idx = col_idx + max(0, num_col_pages - 1) * self.num_total_cols
-
-        # index of last used page range
-        prev_page_range_idx = floor(prev_outer_page_idx / PAGE_RANGE_MAX_BASE_PAGES)
-
-        # index of last used page in respect to the specific page range
-        prev_inner_page_idx = get_inner_index_from_outer_index(prev_outer_page_idx, PAGE_RANGE_MAX_BASE_PAGES)
-
-        # index of cell within page
-        mod = (new_row_num - 1) % CELLS_PER_PAGE
-        max_cell_index = CELLS_PER_PAGE - 1
-        prev_cell_idx = max_cell_index if (0 == mod) else (mod - 1)
-
-        if max_cell_index == prev_cell_idx: # last page was full
+        if cell_idx == 0: # last page was full
             # Go to next col page
-
-            # New cell's page index in respect to all pages
-            outer_page_idx = col_idx if 0 == (new_row_num - 1) else prev_outer_page_idx + self.num_total_cols
-
-            # New cell's page range index
-            page_range_idx = floor(outer_page_idx / PAGE_RANGE_MAX_BASE_PAGES)
             
             try:
                 page_range = self.page_ranges[page_range_idx] # type: PageRange
@@ -181,31 +195,22 @@ class Table:
                 self.page_ranges.append(page_range)
                 self.bp.write_new_page_range(page_range, index)
 
-            # New cell's page index in respect to pages in page range
-            inner_page_idx = get_inner_index_from_outer_index(outer_page_idx, PAGE_RANGE_MAX_BASE_PAGES)
-
-            cell_idx = 0
-            created_inner_page_idx, page = page_range.create_base_page()
+            created_inner_page_idx, page = page_range.create_base_page(self.cell_sizes[col_idx])
 
             # print("Created new base page")
             if created_inner_page_idx != inner_page_idx:
                 raise Exception('Created inner page index is not the same as the expected inner page index',
                     page.get_num_records(),
-                    created_inner_page_idx, cell_idx, inner_page_idx, page_range_idx, outer_page_idx)
+                    created_inner_page_idx, cell_idx, inner_page_idx, page_range_idx)
             
             # base_page_is_new = True
 
         else: # there's space in the last used page
-            outer_page_idx = prev_outer_page_idx
-            page_range_idx = prev_page_range_idx
-            inner_page_idx = prev_inner_page_idx
-            cell_idx = prev_cell_idx + 1
-            
             page_range = self.page_ranges[page_range_idx] # type: PageRange
 
             page = page_range.get_page(inner_page_idx)
             if (None == page):
-                raise Exception('No page returned', cell_idx, inner_page_idx, page_range_idx, outer_page_idx, (new_row_num - 1), col_idx)
+                raise Exception('No page returned', cell_idx, inner_page_idx, page_range_idx, (new_row_num - 1), col_idx)
             
         pid = [cell_idx, inner_page_idx, page_range_idx]
 
@@ -220,17 +225,22 @@ class Table:
     # :returns bool:            #Returns true if successful
     # :brief    :               #Gets a lock of an open base page and the gets each column base page and pid
     #                           #Writes all the metadata and then writes the user data to the relevant pages
-    #                           #Puts the RID and page in the page directory and key and RID in the key_index
+    #                           #Puts the RID and key in the page directory and key and RID in the key_index
     def create_row(self, columns_data):
 
+        self.check_column_values(columns_data)
         key = columns_data[self.key_col]
 
         if key in self.key_index:
             raise Exception('Key already exists')
             
         # ORDER OF THESE LINES MATTER
+        # The RID of a base record is its row number, the page directory computes its pids from it
         with self.get_open_bp_lock:
             self.num_rows += 1
+            with self.rid_latch:
+                self.prev_rid += 1
+                rid = self.prev_rid
             indirection_pid, indirection_page = self.get_open_base_page(INDIRECTION_COLUMN, self.num_rows)
             rid_pid, rid_page = self.get_open_base_page(RID_COLUMN, self.num_rows)
             time_pid, time_page = self.get_open_base_page(TIMESTAMP_COLUMN, self.num_rows)
@@ -238,10 +248,6 @@ class Table:
             column_pids_and_pages = [self.get_open_base_page(START_USER_DATA_COLUMN + i, self.num_rows) for i in range(self.num_columns)]
 
         # RID
-        with self.rid_latch:
-            self.prev_rid += 1
-            
-        rid = self.prev_rid
         rid_in_bytes = int_to_bytes(rid)
         # num_records_in_page = rid_page.write(rid_in_bytes)
         rid_page.write_to_cell(rid_in_bytes, rid_pid[0], increment=True)
@@ -273,23 +279,25 @@ class Table:
             bytes_to_write = int_to_bytes(columns_data[i])
             # col_page.write(bytes_to_write)
             col_page.write_to_cell(bytes_to_write, col_pid[0], increment=True)
+            col_page.widen_zone(columns_data[i], 1)
             self.bp.unpin((col_pid[1], col_pid[2]))
 
             if self.indices.is_indexed(i):
                 self.indices.insert(columns_data[i], rid, i)
 
-        sys_cols = [indirection_pid, rid_pid, time_pid, schema_pid]
-        data_cols = [pid for pid, _ in column_pids_and_pages]
-        record = MetaRecord(rid, key, sys_cols + data_cols)
-        self.page_directory[rid] = record
-
-        self._rw_locks[rid] = threading.Lock()
-        self._del_locks[rid] = threading.Lock()
+        self.page_directory.set_base(rid, key)
 
         self.key_index[key] = rid
         # self.indices.insert(key, rid, self.key_col)
         return True
 
+    ### Checks that values fit the types of their columns ###
+    # :param values:        #List of values for each user column, None values are skipped
+    def check_column_values(self, values):
+        for i, value in enumerate(values):
+            if value is not None and not 0 <= value < (1 << self.column_types[i]):
+                raise Exception('Value does not fit column', i, value, self.column_types[i])
+
     ### Function to update a record ###
     # :param key:           #Primary key of record to update
     # :param update_data:   #List of values for update, None if value is not to be updated
@@ -299,9 +307,8 @@ class Table:
     #                       #Writes all the metadata and then the user data to the new tail record
     #                       #Finally updates the base record indirection and schema
     def update_row(self, key, update_data):
+        self.check_column_values(update_data)
         base_rid = self.key_index[key]
-        with self.tid_latch:
-            self.prev_tid -= 1
 
 
         ## Getting data from base record ============
@@ -321,79 +328,91 @@ class Table:
             # release_all(locks)
             return False
 
-        # Get base record indirection
-        base_indir_page_pid = base_record.columns[INDIRECTION_COLUMN]
-        base_indir_page = self.get_page(base_indir_page_pid) # type: Page
-        base_indir_cell_idx, bip, bipr = base_indir_page_pid
-        prev_update_rid_bytes = base_indir_page.read(base_indir_cell_idx)
-        self.bp.unpin((bip, bipr))
+        # The base record pages stay pinned until its indirection and schema are updated
+        # The update holds its epoch from the tail RID it takes until its record is set, see MergeJob.reclaim_tails
+        # And update_row_lock too, so a merge never copies the base pages while a tail RID isn't linked yet, see MergeJob.copy_data
+        with self.update_row_lock.shared(), self.epochs.reader(), self.bp.handles() as pages:
+            with self.tid_latch:
+                self.prev_tid -= 1
+                new_rid = self.prev_tid
 
-        # Base record encoding
-        base_enc_page_pid = base_record.columns[SCHEMA_ENCODING_COLUMN]
-        base_enc_page = self.get_page(base_enc_page_pid) # type: Page
-        base_enc_cell_idx, bep, bepr = base_enc_page_pid
-        self.bp.unpin((bep, bepr))
+            # Get base record indirection
+            base_indir_page_pid = base_record.columns[INDIRECTION_COLUMN]
+            base_indir_page = pages.get(base_indir_page_pid) # type: Page
+            base_indir_cell_idx = base_indir_page_pid[0]
+            prev_update_rid_bytes = base_indir_page.read(base_indir_cell_idx)
 
+            # Base record encoding
+            base_enc_page_pid = base_record.columns[SCHEMA_ENCODING_COLUMN]
+            base_enc_page = pages.get(base_enc_page_pid) # type: Page
+            base_enc_cell_idx = base_enc_page_pid[0]
 
-        ## Meta columns for tail page ==========
+            # A cumulative tail record also carries the values of the previous one no merge folded in yet
+            update_schema_binary = bin(tail_schema_encoding)[2:].zfill(self.num_columns)
+            tail_data = update_data
+            if self.cumulative:
+                tail_data = self.carry_tail_values(pages, base_record, int_from_bytes(prev_update_rid_bytes), update_data)
+                tail_schema_encoding = col_encoding_to_binary(tail_data[::-1], falsey=None)
 
-        indirection_pid = self.write_tail_column(base_record, INDIRECTION_COLUMN, prev_update_rid_bytes)
 
-        new_rid = self.prev_tid
-        rid_in_bytes = int_to_bytes(new_rid)
-        rid_pid = self.write_tail_column(base_record, RID_COLUMN, rid_in_bytes)
-        
-        millisec = int(round(time.time()*1000))
-        bytes_to_write = int_to_bytes(millisec)
-        time_pid = self.write_tail_column(base_record, TIMESTAMP_COLUMN, bytes_to_write)
-        
-        bytes_to_write = int_to_bytes(tail_schema_encoding)
-        schema_pid = self.write_tail_column(base_record, SCHEMA_ENCODING_COLUMN, bytes_to_write)
+            ## Meta columns for tail page ==========
 
-        meta_columns = [indirection_pid, rid_pid, time_pid, schema_pid]
+            indirection_pid = self.write_tail_column(base_record, INDIRECTION_COLUMN, prev_update_rid_bytes)
 
+            rid_in_bytes = int_to_bytes(new_rid)
+            rid_pid = self.write_tail_column(base_record, RID_COLUMN, rid_in_bytes)
+        
+            millisec = int(round(time.time()*1000))
+            bytes_to_write = int_to_bytes(millisec)
+            time_pid = self.write_tail_column(base_record, TIMESTAMP_COLUMN, bytes_to_write)
+        
+            bytes_to_write = int_to_bytes(tail_schema_encoding)
+            schema_pid = self.write_tail_column(base_record, SCHEMA_ENCODING_COLUMN, bytes_to_write)
 
-        ## Data Columns for tail page ==========
-        data_columns = []
-        tail_schema_encoding_binary = bin(tail_schema_encoding)[2:].zfill(self.num_columns)
+            meta_columns = [indirection_pid, rid_pid, time_pid, schema_pid]
 
-        for i, pid in enumerate(update_data):
-            if '0' == tail_schema_encoding_binary[i]:
-                data_columns.append(None)
-                continue
 
-            col_idx = START_USER_DATA_COLUMN + i
-            bytes_to_write = int_to_bytes(update_data[i])
-            pid = self.write_tail_column(base_record, col_idx, bytes_to_write)
-            data_columns.append(pid)
+            ## Data Columns for tail page ==========
+            data_columns = []
+            tail_schema_encoding_binary = bin(tail_schema_encoding)[2:].zfill(self.num_columns)
 
-        ## Create Tail Record
+            for i, pid in enumerate(tail_data):
+                if '0' == tail_schema_encoding_binary[i]:
+                    data_columns.append(None)
+                    continue
 
-        tail_record = MetaRecord(new_rid, key, meta_columns + data_columns)
-        self.page_directory[new_rid] = tail_record
+                col_idx = START_USER_DATA_COLUMN + i
+                bytes_to_write = int_to_bytes(tail_data[i])
+                pid = self.write_tail_column(base_record, col_idx, bytes_to_write)
+                data_columns.append(pid)
 
+                # The base page's zone map covers the new value before the update is visible
+                # Carried values are already covered
+                if update_data[i] is not None:
+                    _, inner_idx, page_range_idx = base_record.columns[col_idx]
+                    self.page_ranges[page_range_idx].get_page(inner_idx).widen_zone(update_data[i])
 
-        ## Update base record indirection and schema
+            ## Create Tail Record
 
-        new_rid_bytes = int_to_bytes(new_rid)
+            tail_record = MetaRecord(new_rid, key, meta_columns + data_columns)
+            self.page_directory[new_rid] = tail_record
 
-        if not base_indir_page.is_loaded:
-            base_indir_page = self.get_page(base_indir_page_pid)
 
-        base_indir_page.write_to_cell(new_rid_bytes, base_indir_cell_idx)
+            ## Update base record indirection and schema
 
-        if not base_enc_page.is_loaded:
-            base_enc_page = self.get_page(base_enc_page_pid)
+            # The base pages are still pinned, so they are still loaded
+            new_rid_bytes = int_to_bytes(new_rid)
+            base_indir_page.write_to_cell(new_rid_bytes, base_indir_cell_idx)
 
-        base_schema_enc_bytes = base_enc_page.read(base_enc_cell_idx)
-        base_schema_enc_int = int_from_bytes(base_schema_enc_bytes)
-        new_base_enc = base_schema_enc_int | tail_schema_encoding
-        bytes_to_write = int_to_bytes(new_base_enc)
-        base_enc_page.write_to_cell(bytes_to_write, base_enc_cell_idx)
+            base_schema_enc_bytes = base_enc_page.read(base_enc_cell_idx)
+            base_schema_enc_int = int_from_bytes(base_schema_enc_bytes)
+            new_base_enc = base_schema_enc_int | tail_schema_encoding
+            bytes_to_write = int_to_bytes(new_base_enc)
+            base_enc_page.write_to_cell(bytes_to_write, base_enc_cell_idx)
 
-        self.update_indices(tail_schema_encoding_binary, update_data, base_rid)
+            self.update_indices(update_schema_binary, update_data, base_rid)
 
-        return True
+            return True
 
     ### Helper function for update that writes to tail pages ###
     # :param base_record:       #Base record to be updated
@@ -406,13 +425,14 @@ class Table:
             logging.debug("%s: (%s) Start write tail column: %s, data: %s", threading.get_ident(), "write_tail_column", column, data)
             _,_,page_range_idx = base_record.columns[column]
             page_range = self.page_ranges[page_range_idx] # type: PageRange
-            column_inner_idx, column_page = page_range.get_open_tail_page()
+            column_inner_idx, column_page = page_range.get_open_tail_page(column)
             column_pid = [None, column_inner_idx, page_range_idx]
             logging.debug("%s: (%s) Got open tail page pid: %s", threading.get_ident(), "write_tail_column", column_pid)
             self.bp.add_page(column_pid, column_page, pin=True)
 
             logging.debug("%s: (%s) write tail page pid: %s", threading.get_ident(), "write_tail_column", column_pid)
             num_records_in_page = column_page.write(data)
+            column_page.tail_columns |= 1 << column
             column_cell_idx = num_records_in_page - 1
             column_pid[0] = column_cell_idx
 
@@ -420,6 +440,33 @@ class Table:
 
             return column_pid
 
+    ### Values a cumulative tail record carries over from the previous tail record ###
+    # :param pages:             #Handles of the update, see BufferPool.handles
+    # :param base_record:       #MetaRecord of the base record being updated
+    # :param prev_rid:          #RID in the base record indirection, the base RID if it has no tail records
+    # :param update_data:       #List of values for update, None if value is not to be updated
+    # :returns list:            #The values of the update, plus the previous tail record's value of the other columns
+    #                           #Unless a merge already folded the previous tail record into that column's base page
+    # :brief    :               #So the latest tail record has every column updated since the last merge,
+    #                           #And collapse_row stops after one tail hop
+    def carry_tail_values(self, pages, base_record, prev_rid, update_data):
+        tail_data = list(update_data)
+        if prev_rid == base_record.rid:
+            return tail_data
+
+        for i, value in enumerate(update_data):
+            if value is not None:
+                continue
+
+            col_idx = START_USER_DATA_COLUMN + i
+            prev_pid = self.page_directory.pid(prev_rid, col_idx)
+            if prev_pid is None or prev_rid >= pages.get(base_record.columns[col_idx]).read_tps():
+                continue
+
+            tail_data[i] = int_from_bytes(pages.read(prev_pid))
+
+        return tail_data
+
     ### Updates the indices of a record ###
     # :param tail_schema:       #Indicated which columns were updated
     # :param update_data:       #The new values for the columns
@@ -427,7 +474,7 @@ class Table:
     def update_indices(self, tail_schema, update_data, base_rid):
         for col in range(len(update_data)):
             if '1' == tail_schema[col] and self.indices.is_indexed(col):
-                self.indices.update_index(base_rid, update_data[col], col)
+                self.indices.update_index(col, update_data[col], base_rid)
 
     ### Select gets values of a record ###
     # :param key:       #Key of record to get values for
@@ -436,6 +483,9 @@ class Table:
     # :returns record:  #A class that contains the values of the columns
     # :brief        :   #Either uses collaspe row funciton if search column is the key col or
     #                   #Uses the indices of a column to search for the key given
+    #                   #Or scans the column if it has no index, see scan_column
+    #                   #Once a column was scanned scans_before_index times it gets an index, so repeated
+    #                   #Selects on a column whose zone maps can't skip pages don't read the whole table each time
     def select(self, key, column, query_columns):
 
         if column == self.key_col:
@@ -456,12 +506,17 @@ class Table:
 
         else:
             if not self.indices.is_indexed(column):
-                self.indices.create_index(column)
-
-            try:
-                rids = self.indices.locate(column, key)
-            except:
-                return []
+                self.column_scans[column] += 1
+                if self.column_scans[column] > self.scans_before_index:
+                    self.indices.create_index(column)
+
+            if self.indices.is_indexed(column):
+                try:
+                    rids = self.indices.locate(column, key) or [] # None when no record has the key
+                except:
+                    return []
+            else:
+                rids = self.scan_column(column, key, key)
 
             records = []
             query_columns[column] = 0
@@ -504,68 +559,68 @@ class Table:
             
             # Acquired lock ===========
 
-            # Reading base record
-            base_record = self.page_directory[rid] # type: MetaRecord
-            base_enc_pid = base_record.columns[SCHEMA_ENCODING_COLUMN]
-            base_enc_bytes = self.read_pid(base_enc_pid)
-            base_enc_binary = bin(int_from_bytes(base_enc_bytes))[2:].zfill(self.num_columns)
-            tps_all = resp.copy()
-
-            for data_col_idx, is_dirty in enumerate(base_enc_binary):
-                
-                if need[data_col_idx] == 0:
-                    continue
+            # Every page is pinned once until the row is read, tail records stay while the row is in its epoch
+            with self.epochs.reader(), self.bp.handles() as pages:
 
-                col_pid = base_record.columns[START_USER_DATA_COLUMN + data_col_idx]
-                tps = self.get_page(col_pid).read_tps()
-                tps_all[data_col_idx] = tps
+                # Reading base record, point reads don't prefetch, sum and merges read ahead of their rows
+                base_record = self.page_directory[rid] # type: MetaRecord
+                base_enc_pid = base_record.columns[SCHEMA_ENCODING_COLUMN]
+                base_enc_bytes = pages.read(base_enc_pid)
+                base_enc_binary = bin(int_from_bytes(base_enc_bytes))[2:].zfill(self.num_columns)
+                tps_all = resp.copy()
 
-                data = self.read_pid(col_pid)
-                resp[data_col_idx] = int_from_bytes(data)
+                for data_col_idx, is_dirty in enumerate(base_enc_binary):
+                
+                    if need[data_col_idx] == 0:
+                        continue
 
-                if is_dirty == '0':
-                    need[data_col_idx] = 0
+                    col_pid = base_record.columns[START_USER_DATA_COLUMN + data_col_idx]
+                    tps = pages.get(col_pid).read_tps()
+                    tps_all[data_col_idx] = tps
 
-            # get RID of next tail record
-            curr_indir_pid = base_record.columns[INDIRECTION_COLUMN]
-            next_rid = int_from_bytes(self.read_pid(curr_indir_pid))
-            # read tail records
-            while sum(need) != 0 and next_rid < tps: #  todo: or indirection > tps or more?
-                curr_record = self.page_directory[next_rid]
-                curr_enc_pid = curr_record.columns[SCHEMA_ENCODING_COLUMN]
-                curr_enc_bytes = self.read_pid(curr_enc_pid)
-                curr_enc = int_from_bytes(curr_enc_bytes)
-                curr_enc_binary = bin(curr_enc)[2:].zfill(self.num_columns)
+                    data = pages.read(col_pid)
+                    resp[data_col_idx] = int_from_bytes(data)
 
-                for data_col_idx, is_updated in enumerate(curr_enc_binary):
-                    if need[data_col_idx] == 0:
-                        continue
+                    if is_dirty == '0':
+                        need[data_col_idx] = 0
 
-                    if is_updated == '0':
-                        continue
+                # get RID of next tail record
+                curr_indir_pid = base_record.columns[INDIRECTION_COLUMN]
+                next_rid = int_from_bytes(pages.read(curr_indir_pid))
+                # read tail records
+                while sum(need) != 0 and next_rid < tps: #  todo: or indirection > tps or more?
+                    curr_record = self.page_directory[next_rid]
+                    # A tail record only has pids for the columns it updated, so its schema encoding page isn't read
+                    curr_data_pids = curr_record.columns[START_USER_DATA_COLUMN:]
+
+                    for data_col_idx, col_pid in enumerate(curr_data_pids):
+                        if need[data_col_idx] == 0:
+                            continue
+
+                        if col_pid is None:
+                            continue
                     
-                    if next_rid >= tps_all[data_col_idx]:
-                        need[data_col_idx] = 0
-                        continue
+                        if next_rid >= tps_all[data_col_idx]:
+                            need[data_col_idx] = 0
+                            continue
 
-                    # print('LOOKED AT TAIL')
+                        # print('LOOKED AT TAIL')
 
-                    col_pid = curr_record.columns[START_USER_DATA_COLUMN + data_col_idx]
-                    data = self.read_pid(col_pid)
-                    data = int_from_bytes(data)
-                    resp[data_col_idx] = data
-                    need[data_col_idx] = 0
+                        data = pages.read(col_pid)
+                        data = int_from_bytes(data)
+                        resp[data_col_idx] = data
+                        need[data_col_idx] = 0
 
-                if sum(need) != 0:
-                    curr_indir_pid = curr_record.columns[INDIRECTION_COLUMN]
-                    next_rid = int_from_bytes(self.read_pid(curr_indir_pid))
+                    if sum(need) != 0:
+                        curr_indir_pid = curr_record.columns[INDIRECTION_COLUMN]
+                        next_rid = int_from_bytes(pages.read(curr_indir_pid))
 
-                    if next_rid == rid: # if next rid is base
-                        raise Exception("Came back to original, didn't get all we needed")
+                        if next_rid == rid: # if next rid is base
+                            raise Exception("Came back to original, didn't get all we needed")
 
-            # Release locks and return
-            release_all(locks)
-            return resp
+                # Release locks and return
+                release_all(locks)
+                return resp
 
     ### Function that deletes a record ###
     # :param key:       #Primary key of record to be deleted
@@ -599,46 +654,51 @@ class Table:
 
             # Acquired lock ===========
 
-            base_record = self.page_directory[base_rid]  # type: MetaRecord
-            base_rid_page = self.get_page(base_record.columns[RID_COLUMN])
-            base_rid_cell_inx,_,_ = base_record.columns[RID_COLUMN]
-
-            base_rid_page.write_to_cell(int_to_bytes(0),base_rid_cell_inx)
-            del self.key_index[key]
-            # self.indices.remove(self.key_col, key, base_rid)
-            if 0 in self.page_directory:
-                base_record.rid = 0
-                self.page_directory[0].append(base_record)
-            else:
-                self.page_directory[0] = [base_record]
-
-            base_indir_page_pid = base_record.columns[INDIRECTION_COLUMN]
-            new_tail_rid = self.read_pid(base_indir_page_pid)
-            new_tail_rid = int_from_bytes(new_tail_rid)
-
+            with self.epochs.reader(), self.bp.handles() as pages:
 
-            while True:            
-                new_tail_record = self.page_directory[new_tail_rid]
-                new_tail_rid_page = self.get_page(new_tail_record.columns[RID_COLUMN]) # type: Page
-                new_tail_rid_cell_inx,_,_ = new_tail_record.columns[RID_COLUMN]
+                base_record = self.page_directory[base_rid]  # type: MetaRecord
+                base_rid_page = pages.get(base_record.columns[RID_COLUMN])
+                base_rid_cell_inx,_,_ = base_record.columns[RID_COLUMN]
 
-                new_tail_rid_page.write_to_cell(int_to_bytes(0),new_tail_rid_cell_inx)
-                del self.page_directory[new_tail_rid]
-                self.page_directory[0].append(new_tail_record)
-                if(base_rid == new_tail_rid):
-                    break
+                base_rid_page.write_to_cell(int_to_bytes(0),base_rid_cell_inx)
+                del self.key_index[key]
+                # self.indices.remove(self.key_col, key, base_rid)
+                if 0 in self.page_directory:
+                    base_record.rid = 0
+                    self.page_directory[0].append(base_record)
                 else:
-                    new_tail_indir_page_pid = new_tail_record.columns[INDIRECTION_COLUMN]
-                    new_tail_rid = self.read_pid(new_tail_indir_page_pid)
-                    new_tail_rid = int_from_bytes(new_tail_rid)
-
-            # Release locks and return
-            for i in range(len(self.indices.indices)):
-                if self.indices.is_indexed(i):
-                    self.indices.remove_by_rid(i, base_rid)
-
-            release_all(locks)
-            return True
+                    self.page_directory[0] = [base_record]
+
+                base_indir_page_pid = base_record.columns[INDIRECTION_COLUMN]
+                new_tail_rid = pages.read(base_indir_page_pid)
+                new_tail_rid = int_from_bytes(new_tail_rid)
+
+
+                while True:            
+                    if new_tail_rid not in self.page_directory:
+                        # A merge reclaimed the older tail records, see MergeJob.reclaim_tails
+                        new_tail_rid = base_rid
+                    new_tail_record = self.page_directory[new_tail_rid]
+                    new_tail_rid_page = pages.get(new_tail_record.columns[RID_COLUMN]) # type: Page
+                    new_tail_rid_cell_inx,_,_ = new_tail_record.columns[RID_COLUMN]
+
+                    new_tail_rid_page.write_to_cell(int_to_bytes(0),new_tail_rid_cell_inx)
+                    del self.page_directory[new_tail_rid]
+                    self.page_directory[0].append(new_tail_record)
+                    if(base_rid == new_tail_rid):
+                        break
+                    else:
+                        new_tail_indir_page_pid = new_tail_record.columns[INDIRECTION_COLUMN]
+                        new_tail_rid = pages.read(new_tail_indir_page_pid)
+                        new_tail_rid = int_from_bytes(new_tail_rid)
+
+                # Release locks and return
+                for i in range(len(self.indices.indices)):
+                    if self.indices.is_indexed(i):
+                        self.indices.remove_by_rid(i, base_rid)
+
+                release_all(locks)
+                return True
 
         del self._del_locks[base_rid]
         del self._rw_locks[base_rid]
@@ -648,10 +708,11 @@ class Table:
     # :param end_range:                 #End of records to sum
     # :param aggregate_column_index:    #Column whose values to sum
     # :returns int:                     #Sum of values
-    # :brief    :                       #Uses collapse_row to get the values and sums them
+    # :brief    :                       #Sums the records in batches of CELLS_PER_PAGE, see _read_column_batch
+    #                                   #The base pages of the next batch are prefetched
+    #                                   #While the current one is summed
     def sum_records(self, start_range, end_range, aggregate_column_index):
-        query_columns = [0]*self.num_columns
-        query_columns [aggregate_column_index] = 1
+        prefetch_columns = [SCHEMA_ENCODING_COLUMN, INDIRECTION_COLUMN, START_USER_DATA_COLUMN + aggregate_column_index]
 
         sum = 0
             
@@ -662,7 +723,7 @@ class Table:
             curr_key = end_range
             end = start_range
 
-
+        rids = []
         while curr_key != (end+1): 
 
             try:
@@ -676,10 +737,102 @@ class Table:
                 curr_key += 1 
                 continue
 
-            value = self.collapse_row(curr_rid, query_columns)[aggregate_column_index]
-
-            sum += value
+            rids.append(curr_rid)
             curr_key += 1
 
+        # The scan goes through a ring of frames so it doesn't push point queries' pages out of the pool
+        with self.bp.bulk_access():
+            self.prefetch_records(rids[:CELLS_PER_PAGE], prefetch_columns)
+            for i in range(0, len(rids), CELLS_PER_PAGE):
+                self.prefetch_records(rids[i + CELLS_PER_PAGE:i + 2*CELLS_PER_PAGE], prefetch_columns)
+                for _, value in self._read_column_batch(rids[i:i + CELLS_PER_PAGE], aggregate_column_index):
+                    sum += value
+
         return sum
 
+    ### Reads a column over a batch of records ###
+    # :param rids:                      #RIDs of the base records
+    # :param aggregate_column_index:    #Column to read
+    # :returns list:                    #(rid, value) of each record that still exists
+    # :brief    :                       #Reads each base page once as a whole (see Page.read_range)
+    #                                   #Records whose column was never updated, or whose updates are all
+    #                                   #Merged into the base page (newest tail rid >= tps), are read
+    #                                   #Straight from the base page, the others go through collapse_row
+    def _read_column_batch(self, rids, aggregate_column_index):
+        query_columns = [0]*self.num_columns
+        query_columns[aggregate_column_index] = 1
+        column_bit = 1 << (self.num_columns - 1 - aggregate_column_index)
+
+        values_read = []
+        with self.bp.handles() as pages:
+            cells = {} # page_key -> (cell values, tps)
+
+            def read_cells(pid):
+                page_key = (pid[1], pid[2])
+                if page_key not in cells:
+                    page = pages.get(pid)
+                    cells[page_key] = (page.read_all(), page.read_tps())
+                return cells[page_key]
+
+            directory = self.page_directory
+            for rid in rids:
+                if rid not in directory:
+                    continue
+
+                enc_pid = directory.pid(rid, SCHEMA_ENCODING_COLUMN)
+                base_enc = int(read_cells(enc_pid)[0][enc_pid[0]])
+
+                col_pid = directory.pid(rid, START_USER_DATA_COLUMN + aggregate_column_index)
+                values, tps = read_cells(col_pid)
+
+                if base_enc & column_bit:
+                    indir_pid = directory.pid(rid, INDIRECTION_COLUMN)
+                    if int(read_cells(indir_pid)[0][indir_pid[0]]) < tps:
+                        values_read.append((rid, self.collapse_row(rid, query_columns)[aggregate_column_index]))
+                        continue
+
+                values_read.append((rid, int(values[col_pid[0]])))
+
+        return values_read
+
+    ### Finds the records whose value of a column is in a range ###
+    # :param column:        #Column to search
+    # :param begin:         #Smallest value to find
+    # :param end:           #Largest value to find
+    # :returns list:        #RIDs of the base records whose current value is in [begin, end]
+    # :brief    :           #Goes through the base pages of the column in order, see BaseLayout
+    #                       #A page whose zone map has no value in the range is skipped without being loaded
+    #                       #The RIDs of another page's records are read from the RID column,
+    #                       #Then their values are read like in sum_records
+    def scan_column(self, column, begin, end):
+        col_idx = START_USER_DATA_COLUMN + column
+        cells_per_page = self.base_layout.cells_per_page[col_idx]
+        rids_per_page = self.base_layout.cells_per_page[RID_COLUMN]
+        with self.get_open_bp_lock: # rows counted are in pages that exist
+            num_rows = self.num_rows
+
+        found = []
+        with self.bp.bulk_access():
+            for col_page_num in range(ceil(num_rows / cells_per_page)):
+                page_range_idx, inner_page_idx = divmod(self.base_layout.outer_page_idx(col_idx, col_page_num), PAGE_RANGE_MAX_BASE_PAGES)
+                if not self.page_ranges[page_range_idx].get_page(inner_page_idx).zone_overlaps(begin, end):
+                    self.scan_pages_skipped += 1
+                    continue
+                self.scan_pages_read += 1
+
+                # Rows of the page, their RIDs are in the RID column pages of the same rows
+                first_row = col_page_num * cells_per_page
+                last_row = min(num_rows, first_row + cells_per_page)
+                rids = []
+                with self.bp.handles() as pages:
+                    for rid_page_num in range(first_row // rids_per_page, ceil(last_row / rids_per_page)):
+                        rid_range_idx, rid_inner_idx = divmod(self.base_layout.outer_page_idx(RID_COLUMN, rid_page_num), PAGE_RANGE_MAX_BASE_PAGES)
+                        rid_cells = pages.get([None, rid_inner_idx, rid_range_idx]).read_all()
+                        start = max(first_row - rid_page_num * rids_per_page, 0)
+                        rids += [int(rid) for rid in rid_cells[start:last_row - rid_page_num * rids_per_page] if rid]
+
+                for rid, value in self._read_column_batch(rids, column):
+                    if begin <= value <= end:
+                        found.append(rid)
+
+        return found
@@ -0,0 +1,181 @@
+import random
+import shutil
+import sys
+import tempfile
+
+from config import *
+from db import Database
+from mergejob import MergeJob
+from pagerange import PageRange
+from query import Query
+from util import *
+
+### Tail page chains and the tail records written to them ###
+# Run from the lstore folder: python tail.test.py
+# Each check is True if the updates went to the tail pages they should have, the script exits 1 if one isn't
+
+NUM_ROWS = CELLS_PER_PAGE
+
+# Tail pages of a table and the columns written to each, (pagerange index, inner index) -> tail_columns
+def tail_columns(table):
+    return {(page_range_idx, PAGE_RANGE_MAX_BASE_PAGES + tail_idx): page.tail_columns
+            for page_range_idx, page_range in enumerate(table.page_ranges)
+            for tail_idx, page in enumerate(page_range.tail_pages[:page_range.tail_page_count])}
+
+# User columns of the latest tail record of a row, None for those it doesn't hold
+def latest_tail_columns(table, key):
+    base_rid = table.key_index[key]
+    with table.bp.handles() as pages:
+        tail_rid = int_from_bytes(pages.read(table.page_directory.pid(base_rid, INDIRECTION_COLUMN)))
+        pids = [table.page_directory.pid(tail_rid, START_USER_DATA_COLUMN + column) for column in range(table.num_columns)]
+        return [None if pid is None else int_from_bytes(pages.read(pid)) for pid in pids]
+
+# Reopens the database of a folder
+def reopen(folder, **kwargs):
+    db = Database(warm_restart=False, **kwargs)
+    db.open(folder)
+    return db
+
+results = {}
+
+### Tail page chains (user-023) ###
+# Each column gets its own chain, a full page is followed by a new one in the same chain
+page_range = PageRange()
+first, first_page = page_range.get_open_tail_page(4)
+other, _ = page_range.get_open_tail_page(5)
+results['chains per column'] = first != other and page_range.get_open_tail_page(4) == (first, first_page)
+
+for _ in range(first_page.cells_per_page):
+    first_page.write(int_to_bytes(1))
+second, _ = page_range.get_open_tail_page(4)
+results['chain grows'] = page_range.tail_chains[4] == [first, second] and page_range.closed_tail_pages() == [first]
+
+# A freed page leaves its chain and its slot goes to the next page made
+page_range.free_tail_page(first)
+reused, reused_page = page_range.get_open_tail_page(6)
+results['freed slot reused'] = page_range.tail_chains[4] == [second] and reused == first and reused_page.num_records == 0 and \
+    page_range.tail_page_count == 3
+
+# Chains are rebuilt from the columns written to each page
+for column, inner_idx in [(4, second), (5, other), (6, reused)]:
+    page_range.get_page(inner_idx).tail_columns = 1 << column
+chains = page_range.tail_chains
+page_range.rebuild_tail_chains()
+results['chains rebuilt'] = page_range.tail_chains == {4: [second], 5: [other], 6: [reused]} and chains[5] == [other]
+
+# Updates of one column only go to that column's tail pages, the other columns get none
+folder = tempfile.mkdtemp()
+db = reopen(folder)
+table = db.create_table('Grades', 4, 0)
+query = Query(table)
+for key in range(NUM_ROWS):
+    query.insert(key, key, key, key)
+for key in range(NUM_ROWS // 2):
+    query.update(key, None, None, key + 1, None)
+
+user_columns = set(columns for columns in tail_columns(table).values() if columns >> START_USER_DATA_COLUMN)
+results['only updated column'] = user_columns == {1 << (START_USER_DATA_COLUMN + 2)}
+results['one column per page'] = all(columns & (columns - 1) == 0 for columns in tail_columns(table).values())
+
+num_pages = len(tail_columns(table))
+db.close()
+
+# A reopened table keeps filling its partly full tail pages
+db = reopen(folder)
+table = db.get_table('Grades')
+query = Query(table)
+for key in range(10):
+    query.update(key, None, None, key + 2, None)
+results['reopened chains'] = len(tail_columns(table)) == num_pages and \
+    [query.select(key, 0, [1, 1, 1, 1])[0].columns for key in [0, 9, NUM_ROWS - 1]] == [[0, 0, 2, 0], [9, 9, 11, 9], [NUM_ROWS - 1] * 4]
+db.close()
+shutil.rmtree(folder)
+
+### Cumulative tail records (user-024) ###
+# The latest tail record of a row holds every column updated since the last merge, so reads need one tail hop
+folder = tempfile.mkdtemp()
+db = reopen(folder)
+cumulative = Query(db.create_table('Cumulative', 4, 0, cumulative=True))
+plain = Query(db.create_table('Plain', 4, 0))
+for query in [cumulative, plain]:
+    for key in range(NUM_ROWS):
+        query.insert(key, key, key, key)
+    query.update(1, None, 10, None, None)
+    query.update(1, None, None, 20, None)
+    query.update(1, None, 11, None, None)
+results['cumulative latest record'] = latest_tail_columns(cumulative.table, 1) == [None, 11, 20, None] and \
+    latest_tail_columns(plain.table, 1) == [None, 11, None, None] and \
+    cumulative.select(1, 0, [1, 1, 1, 1])[0].columns == plain.select(1, 0, [1, 1, 1, 1])[0].columns == [1, 11, 20, 1]
+
+# Columns a merge already folded into the base pages aren't carried any further
+MergeJob(cumulative.table).run()
+cumulative.update(1, None, None, None, 30)
+results['cumulative after merge'] = latest_tail_columns(cumulative.table, 1) == [None, None, None, 30] and \
+    cumulative.select(1, 0, [1, 1, 1, 1])[0].columns == [1, 11, 20, 30]
+
+# Random updates read back right through merges and a reopen, and the table stays cumulative
+rand = random.Random(24)
+expected = {key: [key] * 4 for key in range(NUM_ROWS)}
+expected[1] = [1, 11, 20, 30]
+def random_updates(query, count):
+    for _ in range(count):
+        key, column, value = rand.randrange(NUM_ROWS), rand.randrange(1, 4), rand.randrange(1000)
+        update = [None] * 4
+        update[column] = value
+        query.update(key, *update)
+        expected[key][column] = value
+
+def all_rows_right(query):
+    return all(query.select(key, 0, [1, 1, 1, 1])[0].columns == row for key, row in expected.items()) and \
+        query.sum(0, NUM_ROWS - 1, 2) == sum(row[2] for row in expected.values())
+
+random_updates(cumulative, 1500)
+MergeJob(cumulative.table).run()
+random_updates(cumulative, 1500)
+results['cumulative random'] = all_rows_right(cumulative)
+db.close()
+
+db = reopen(folder)
+cumulative = Query(db.get_table('Cumulative'))
+random_updates(cumulative, 500)
+results['cumulative reopen'] = cumulative.table.cumulative and not db.get_table('Plain').cumulative and all_rows_right(cumulative)
+db.close()
+shutil.rmtree(folder)
+
+### Reclaimed tail records (user-025) ###
+# With no query running next to it, a merge reclaims every tail record it folded in
+# And every closed tail page no record points to anymore, new tail pages then take their slots
+folder = tempfile.mkdtemp()
+db = reopen(folder)
+table = db.create_table('Grades', 4, 0)
+query = Query(table)
+for key in range(NUM_ROWS):
+    query.insert(key, key, key, key)
+num_updates = NUM_ROWS * 3 + 7
+for num in range(num_updates):
+    query.update(num % NUM_ROWS, None, num, None, None)
+table.bp.pool.flusher.flush(force=True) # so the reclaimed pages have extents to give back
+num_tail_pages = len(tail_columns(table))
+
+MergeJob(table).run()
+reclaimed = table.last_reclaimed
+results['reclaimed records'] = reclaimed['tail_records'] == num_updates and len(table.page_directory) == NUM_ROWS
+results['reclaimed pages'] = reclaimed['tail_pages'] > 0 and reclaimed['disk_bytes'] > 0 and \
+    sum(len(page_range.free_tail_pages) for page_range in table.page_ranges) == reclaimed['tail_pages']
+results['reclaimed rows kept'] = all(query.select(key, 0, [1, 1, 1, 1])[0].columns == [key, key + NUM_ROWS * 3 if key < 7 else key + NUM_ROWS * 2, key, key]
+    for key in range(NUM_ROWS))
+
+# A merge with nothing new reclaims nothing, new updates reuse the freed slots
+MergeJob(table).run()
+results['nothing to reclaim'] = table.last_reclaimed.get('tail_records', 0) == 0 and table.reclaimed['tail_records'] == num_updates
+num_free = sum(len(page_range.free_tail_pages) for page_range in table.page_ranges)
+for num in range(NUM_ROWS * 3):
+    query.update(num % NUM_ROWS, None, None, num, None)
+results['freed slots reused'] = len(tail_columns(table)) == num_tail_pages and \
+    sum(len(page_range.free_tail_pages) for page_range in table.page_ranges) < num_free and \
+    query.select(3, 0, [1, 1, 1, 1])[0].columns == [3, 3 + NUM_ROWS * 3, 3 + NUM_ROWS * 2, 3]
+db.close()
+shutil.rmtree(folder)
+
+print(results)
+sys.exit(0 if all(results.values()) else 1)
@@ -1,4 +1,6 @@
 from config import *
+from contextlib import contextmanager
+
 import threading
 
 ### Utility functions for the database innerworkings ###
@@ -49,18 +51,7 @@ def itb(data):
 #    Inner_index = 1 for 1, 4, 7
 #    Inner_index = 2 for 2, 5, 6
 def get_inner_index_from_outer_index(outer_index, container_size):
-
-    if outer_index < container_size:
-        return outer_index
-
-    for i in range(container_size):
-        base_index = i
-        mult = (outer_index - base_index) / (container_size)  # type: float
-
-        if mult.is_integer():
-            break
-
-    return base_index
+    return outer_index % container_size
 
 # Gets a latch to lock a variable
 def acquire_latch(lock):
@@ -168,5 +159,47 @@ class Counter:
             return self.val
 
 
+### Lock many threads can hold shared or one thread exclusive ###
+# Unlike the 2PL locks of sxlock.py it blocks until it is granted
+# A thread waiting for it exclusive keeps new shared holders out, so it isn't starved
+class SharedLock:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.num_shared = 0
+        self.is_exclusive = False
+        self.waiting = 0
+
+    # Holds the lock shared for the length of a block
+    @contextmanager
+    def shared(self):
+        with self.cond:
+            self.cond.wait_for(lambda: not self.is_exclusive and self.waiting == 0)
+            self.num_shared += 1
+
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.num_shared -= 1
+                if self.num_shared == 0:
+                    self.cond.notify_all()
+
+    # Holds the lock exclusive for the length of a block
+    @contextmanager
+    def exclusive(self):
+        with self.cond:
+            self.waiting += 1
+            self.cond.wait_for(lambda: not self.is_exclusive and self.num_shared == 0)
+            self.waiting -= 1
+            self.is_exclusive = True
+
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.is_exclusive = False
+                self.cond.notify_all()
+
+
 if __name__ == '__main__':
     test()